@@ -0,0 +1,164 @@
+"""
+Recall versus latency of the vector indexes of the index policy, against a running Milvus server.
+
+Inserts synthetic clustered vectors into a scratch collection per index type, computes the exact
+nearest neighbours with numpy, then sweeps the search parameters of each index (nprobe for IVF,
+ef for HNSW) and reports recall@k and per-query latency percentiles as JSON, together with the
+index the policy picks for that collection size and the estimated index memory.
+
+Usage (from the repository root):
+    python -m benchmarks.index_recall --host 127.0.0.1 --port 19530 --rows 200000 --dim 256 --queries 200
+        [--index-type HNSW --index-type IVF_FLAT ...] [--memory-budget-mb 512] [--output recall.json]
+"""
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections, utility
+
+from benchmarks.stand_ins import StageTimer
+from utils import IndexPolicy
+
+
+def make_vectors(num_rows, num_queries, dim, num_clusters=256, seed=0):
+    """
+    Build clustered vectors, closer to embeddings than uniform noise, and queries drawn from the same clusters.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dim)).astype(np.float32)
+
+    def sample(count):
+        points = centers[rng.integers(num_clusters, size=count)] + 0.3 * rng.normal(size=(count, dim)).astype(np.float32)
+        return points.astype(np.float32)
+
+    return sample(num_rows), sample(num_queries)
+
+
+def exact_neighbours(vectors, queries, top_k, batch_size=64):
+    """Ids of the top_k nearest vectors (L2) of each query, by brute force."""
+    squared_norms = (vectors ** 2).sum(axis=1)
+    neighbours = []
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        distances = squared_norms[None, :] - 2 * batch @ vectors.T
+        nearest = np.argpartition(distances, top_k, axis=1)[:, :top_k]
+        neighbours.extend(set(row.tolist()) for row in nearest)
+    return neighbours
+
+
+def sweep_values(index_type, policy, index_params, top_k):
+    """Search parameters tried for an index: the policy's own choice first, then a sweep around it."""
+    default = policy.search_params(index_params, top_k)
+    if index_type in IndexPolicy.IVF_INDEXES:
+        nlist = index_params["params"]["nlist"]
+        return [default] + [policy.search_params(index_params, top_k, nprobe=nprobe)
+                            for nprobe in (1, 4, 8, 16, 32, 64, 128, 256) if nprobe <= nlist]
+    if index_type == "HNSW":
+        return [default] + [policy.search_params(index_params, top_k, ef=ef) for ef in (16, 32, 64, 128, 256, 512)]
+    return [default]
+
+
+def build_collection(name, vectors, dim, index_params, batch_size=5000):
+    """(Re)create a scratch collection holding the vectors, indexed and loaded."""
+    if utility.has_collection(name):
+        utility.drop_collection(name)
+    fields = [
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True),
+        FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=dim),
+    ]
+    collection = Collection(name=name, schema=CollectionSchema(fields, description="Index recall benchmark"))
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        collection.insert([list(range(start, start + len(batch))), batch.tolist()])
+    collection.flush()
+
+    start = time.perf_counter()
+    collection.create_index(field_name="vector", index_params=index_params)
+    utility.wait_for_index_building_complete(name)
+    build_seconds = time.perf_counter() - start
+    collection.load()
+    return collection, build_seconds
+
+
+def bench_index(index_type, policy, vectors, queries, neighbours, top_k, collection_prefix):
+    """Build one index type and measure recall and latency for each search parameter of the sweep."""
+    num_rows, dim = vectors.shape
+    index_params = policy.build_index_params(index_type, num_rows)
+    collection, build_seconds = build_collection(f"{collection_prefix}_{index_type.lower()}", vectors, dim, index_params)
+
+    runs = []
+    try:
+        for search_params in sweep_values(index_type, policy, index_params, top_k):
+            timer = StageTimer()
+            hits = 0
+            for query, expected in zip(queries, neighbours):
+                start = time.perf_counter()
+                result = collection.search(data=[query.tolist()], anns_field="vector", param=search_params, limit=top_k)
+                timer.record("search", time.perf_counter() - start)
+                hits += len(expected.intersection(hit.id for hit in result[0]))
+            latency = timer.summary()["search"]
+            runs.append({
+                "search_params": search_params["params"],
+                "recall": round(hits / (len(queries) * top_k), 4),
+                "p50_ms": latency["p50_ms"],
+                "p95_ms": latency["p95_ms"],
+                "p99_ms": latency["p99_ms"],
+            })
+    finally:
+        utility.drop_collection(collection.name)
+
+    return {
+        "index_params": index_params,
+        "build_seconds": round(build_seconds, 3),
+        "estimated_memory_mb": round(policy.estimate_memory(index_type, num_rows) / 2**20, 1),
+        "runs": runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recall versus latency of the index policy's indexes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", default="19530")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--index-type", action="append", choices=IndexPolicy.INDEX_LADDER,
+                        help="Index type to benchmark (repeatable, all by default).")
+    parser.add_argument("--memory-budget-mb", type=int, help="Index memory budget used for the policy's choice.")
+    parser.add_argument("--collection-prefix", default="bench_index_recall")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    connections.connect(host=args.host, port=args.port)
+
+    policy = IndexPolicy(dim=args.dim,
+                         memory_budget_bytes=args.memory_budget_mb * 2**20 if args.memory_budget_mb else None)
+    vectors, queries = make_vectors(args.rows, args.queries, args.dim, seed=args.seed)
+    neighbours = exact_neighbours(vectors, queries, args.top_k)
+
+    results = {}
+    for index_type in args.index_type or IndexPolicy.INDEX_LADDER:
+        logging.info(f"Benchmarking {index_type} on {args.rows} rows.")
+        results[index_type] = bench_index(index_type, policy, vectors, queries, neighbours, args.top_k,
+                                          args.collection_prefix)
+
+    report = {
+        "config": vars(args),
+        "policy_choice": policy.choose(args.rows),
+        "indexes": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Offline benchmark of the ingestion and query paths.
+
+Drives DocumentGenerator.generate_documents, upload_pdf_endpoint with its ingestion workers,
+and query_documents on synthetic PDFs, with deterministic fake embeddings, a fake LLM and the
+embedded vector store instead of OpenAI and Milvus, and reports throughput, per-stage latency percentiles and peak
+RSS as JSON. The tiktoken encodings must be available locally (see TIKTOKEN_CACHE_DIR).
+
+Usage (from the repository root):
+    python -m benchmarks.run --documents 3 --pages 100 --queries 200 --output bench.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks.stand_ins import FakeEmbeddings, FakeLLM, StageTimer
+from benchmarks.synthetic_pdf import make_pdf, make_text_lines
+
+
+def load_app(args, timer, work_dir):
+    """
+    Import main.py with the local stand-ins in place of OpenAI, and the embedded vector store in place of Milvus.
+    """
+    os.environ["EMBEDDING_PROVIDER"] = "fake"
+    os.environ["EMBEDDING_CACHE_PATH"] = ""  # memory-only embedding cache
+    os.environ["INGESTION_DB_PATH"] = os.path.join(work_dir, "ingestion_jobs.sqlite3")
+    os.environ["INGESTION_SPOOL_DIR"] = os.path.join(work_dir, "ingestion_spool")
+    os.environ["FILE_MANIFEST_PATH"] = os.path.join(work_dir, "file_manifest.sqlite3")
+    os.environ["LEXICAL_INDEX_DIR"] = os.path.join(work_dir, "lexical_index")
+    os.environ["EMBEDDED_VECTOR_DIR"] = os.path.join(work_dir, "vector_store")
+    os.environ["VECTOR_BACKEND"] = "embedded"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # ChatOpenAI validates the key on construction
+
+    import utils
+    import main
+    # Keep benchmark runs out of app.log
+    logging.getLogger().setLevel(logging.WARNING)
+
+    milvus_manager = main.milvus_manager
+    if args.search_latency_ms:
+        # search and search_with_filter go through search_batch, so they are slowed down once
+        search_batch = milvus_manager.search_batch
+
+        def slow_search_batch(*args_, **kwargs):
+            time.sleep(args.search_latency_ms / 1000)
+            return search_batch(*args_, **kwargs)
+
+        milvus_manager.search_batch = slow_search_batch
+    for method in ("insert_data", "filename_exists", "search", "search_with_filter", "search_batch"):
+        setattr(milvus_manager, method, timer.wrap(f"milvus.{method}", getattr(milvus_manager, method)))
+
+    embedder = FakeEmbeddings(latency=args.embed_latency_ms / 1000)
+    embedder.embed_documents = timer.wrap("embedding.embed_documents", embedder.embed_documents)
+    embedder.embed_query = timer.wrap("embedding.embed_query", embedder.embed_query)
+    main.cached_embeddings.embedder = embedder
+
+    llm = FakeLLM(latency=args.llm_latency_ms / 1000)
+    generate = llm.ainvoke
+
+    async def timed_ainvoke(messages):
+        start = time.perf_counter()
+        try:
+            return await generate(messages)
+        finally:
+            timer.record("llm.ainvoke", time.perf_counter() - start)
+
+    llm.ainvoke = timed_ainvoke
+    main.llm = llm
+
+    main.document_generator = utils.DocumentGenerator(max_workers=args.workers)
+    if args.no_semantic_cache:
+        main.semantic_cache.similarity_threshold = 2.0
+    return main
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its (joined) worker processes, in MiB."""
+    to_mb = 1 / 1024 if sys.platform != "darwin" else 1 / (1024 * 1024)
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * to_mb, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * to_mb, 1),
+    }
+
+
+def bench_generate_documents(main, pdfs, timer):
+    """Parse, clean and split each PDF with DocumentGenerator.generate_documents."""
+    pages = 0
+    chunks = 0
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        for i, (num_pages, pdf) in enumerate(pdfs):
+            path = os.path.join(directory, f"doc_{i}.pdf")
+            with open(path, "wb") as f:
+                f.write(pdf)
+            documents = timer.wrap("pdf.generate_documents", main.document_generator.generate_documents)(file=path, file_name=f"doc_{i}")
+            pages += num_pages
+            chunks += len(documents)
+    elapsed = time.perf_counter() - start
+    return {"documents": len(pdfs), "pages": pages, "chunks": chunks, "seconds": round(elapsed, 3),
+            "pages_per_second": round(pages / elapsed, 2), "chunks_per_second": round(chunks / elapsed, 2)}
+
+
+async def bench_upload(main, tenant_id, pdfs, timer):
+    """Queue each PDF through upload_pdf_endpoint and wait for the ingestion workers to finish them."""
+    from fastapi import UploadFile
+
+    start = time.perf_counter()
+    job_ids = []
+    for i, (_, pdf) in enumerate(pdfs):
+        upload = UploadFile(file=io.BytesIO(pdf), filename=f"doc_{i}.pdf")
+        upload_start = time.perf_counter()
+        response = await main.upload_pdf_endpoint(file=upload, uuid=tenant_id)
+        timer.record("endpoint.upload_pdf", time.perf_counter() - upload_start)
+        job_ids.append(json.loads(response.body)["id"])
+
+    for job_id in job_ids:
+        while True:
+            job = main.ingestion_queue.get(job_id, tenant_id)
+            if job["status"] in main.IngestionQueue.FINISHED_STATUSES:
+                break
+            await asyncio.sleep(0.01)
+        if job["status"] != main.IngestionQueue.STATUS_SUCCEEDED:
+            raise Exception(f"Ingestion job {job_id} {job['status']}: {job['error'] or job['message']}")
+        timer.record("ingestion.job", job["updated_at"] - job["created_at"])
+    elapsed = time.perf_counter() - start
+
+    chunks = sum(file["chunks"] for file in main.milvus_manager.list_file_details(tenant_id))
+    return {"documents": len(pdfs), "chunks": chunks, "seconds": round(elapsed, 3),
+            "documents_per_second": round(len(pdfs) / elapsed, 2), "chunks_per_second": round(chunks / elapsed, 2)}
+
+
+async def bench_queries(main, tenant_id, queries, concurrency, top_k, timer, mode="vector"):
+    """Run queries through query_documents with bounded concurrency."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_query(query):
+        async with semaphore:
+            query_start = time.perf_counter()
+            await main.query_documents(query=query, uuid=tenant_id, top_k=top_k, mode=mode)
+            timer.record("endpoint.query", time.perf_counter() - query_start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[run_query(query) for query in queries])
+    elapsed = time.perf_counter() - start
+    return {"queries": len(queries), "mode": mode, "concurrency": concurrency, "seconds": round(elapsed, 3),
+            "queries_per_second": round(len(queries) / elapsed, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the ingestion and query paths.")
+    parser.add_argument("--documents", type=int, default=3, help="Number of synthetic PDFs.")
+    parser.add_argument("--pages", type=int, default=50, help="Pages per PDF.")
+    parser.add_argument("--lines-per-page", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent queries.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--mode", choices=["vector", "hybrid"], default="vector", help="Retrieval mode of the queries.")
+    parser.add_argument("--workers", type=int, default=None, help="DocumentGenerator worker processes (0 = in process).")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Simulated latency per embedding request.")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency per LLM generation.")
+    parser.add_argument("--search-latency-ms", type=float, default=0.0, help="Simulated latency per vector search.")
+    parser.add_argument("--no-semantic-cache", action="store_true", help="Disable the semantic answer cache.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    timer = StageTimer()
+    work_dir = tempfile.TemporaryDirectory()
+    import_start = time.perf_counter()
+    app = load_app(args, timer, work_dir.name)
+    import_seconds = time.perf_counter() - import_start
+
+    pdfs = [(args.pages, make_pdf(args.pages, args.lines_per_page, seed=args.seed + i)) for i in range(args.documents)]
+    queries = make_text_lines(random.Random(args.seed), args.queries, words_per_line=8)
+
+    async def run():
+        # The lifespan starts the ingestion workers and the warm-up, and closes the stores on exit
+        async with app.lifespan(app.app):
+            tenant_id = (await app.create_token())["token"]
+            upload = await bench_upload(app, tenant_id, pdfs, timer)
+            query = await bench_queries(app, tenant_id, queries, args.concurrency, args.top_k, timer,
+                                        mode=args.mode)
+        return upload, query
+
+    generate = bench_generate_documents(app, pdfs, timer)
+    upload, query = asyncio.run(run())
+    work_dir.cleanup()
+
+    report = {
+        "config": vars(args),
+        "import_seconds": round(import_seconds, 3),
+        "throughput": {"generate_documents": generate, "upload_pdf": upload, "query": query},
+        "stages": timer.summary(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Local stand-ins for the external services used by the app: deterministic embeddings and a fake
+chat model. The benchmarks run on the embedded vector store in place of Milvus.
+"""
+import asyncio
+import hashlib
+import re
+import threading
+import time
+
+import numpy as np
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class FakeEmbeddings:
+    """
+    Deterministic embeddings derived from a hash of the text, with optional simulated latency.
+    """
+
+    def __init__(self, size=1536, latency=0.0):
+        """
+        :param size: Embedding dimension.
+        :param latency: Seconds slept per embedding request.
+        """
+        self.size = size
+        self.latency = latency
+        self.model = f"fake-{size}"
+
+    def _embed(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.size).tolist()
+
+    def embed_documents(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class FakeLLM:
+    """
+    Chat model stand-in exposing the ainvoke / astream methods used by the app.
+    """
+
+    def __init__(self, latency=0.0, response_words=60):
+        """
+        :param latency: Seconds spent per generation, spread over the streamed words.
+        :param response_words: Number of words in each response.
+        """
+        self.latency = latency
+        self.response_words = response_words
+
+    def _words(self, messages):
+        prompt = messages[-1].content
+        words = re.findall(r"\w+", prompt)[-self.response_words:]
+        return [word + " " for word in words]
+
+    async def ainvoke(self, messages):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return AIMessage(content="".join(self._words(messages)))
+
+    async def astream(self, messages):
+        words = self._words(messages)
+        for word in words:
+            if self.latency:
+                await asyncio.sleep(self.latency / max(len(words), 1))
+            yield AIMessageChunk(content=word)
+
+
+class StageTimer:
+    """
+    Collects per-stage latencies and summarises them as percentiles.
+    """
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, func):
+        """Wrap a blocking callable so that each call is recorded under stage."""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        """Return count, mean and p50/p95/p99/max latencies in milliseconds per stage."""
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+        summary = {}
+        for stage, values in sorted(samples.items()):
+            values_ms = np.asarray(values) * 1000
+            summary[stage] = {
+                "count": len(values),
+                "total_ms": round(float(values_ms.sum()), 3),
+                "mean_ms": round(float(values_ms.mean()), 3),
+                "p50_ms": round(float(np.percentile(values_ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(values_ms, 95)), 3),
+                "p99_ms": round(float(np.percentile(values_ms, 99)), 3),
+                "max_ms": round(float(values_ms.max()), 3),
+            }
+        return summary
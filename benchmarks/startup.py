@@ -0,0 +1,126 @@
+"""
+Cold start benchmark of the API: how long a new worker takes before it can serve.
+
+Each run starts a fresh Python process that imports main.py, starts the app through its lifespan,
+waits for /health/ready and sends its first requests (a token creation, then a query), with
+deterministic fake embeddings, a fake LLM and the embedded vector store so that no external service
+is needed (the warm-up still creates the OpenAI chat model, which is never called). The report gives
+the percentiles over the runs of the import time, lifespan startup, time to ready and first request
+latencies, plus the wall time of the whole process, as JSON. The tiktoken encodings must be available locally (see TIKTOKEN_CACHE_DIR).
+
+Usage (from the repository root):
+    python -m benchmarks.startup --runs 10 [--vector-backend embedded|milvus] [--no-wait-ready] [--output startup.json]
+
+With --vector-backend milvus, the app connects to the Milvus server at 127.0.0.1:19530.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stand_ins import StageTimer
+
+
+def run_child(args):
+    """
+    Measure the startup of the app in this process, and print the timings as one JSON line.
+    """
+    work_dir = tempfile.TemporaryDirectory()
+    os.environ["EMBEDDING_PROVIDER"] = "fake"
+    os.environ["EMBEDDING_CACHE_PATH"] = ""  # memory-only embedding cache
+    os.environ["INGESTION_DB_PATH"] = os.path.join(work_dir.name, "ingestion_jobs.sqlite3")
+    os.environ["INGESTION_SPOOL_DIR"] = os.path.join(work_dir.name, "ingestion_spool")
+    os.environ["FILE_MANIFEST_PATH"] = os.path.join(work_dir.name, "file_manifest.sqlite3")
+    os.environ["LEXICAL_INDEX_DIR"] = os.path.join(work_dir.name, "lexical_index")
+    os.environ["EMBEDDED_VECTOR_DIR"] = os.path.join(work_dir.name, "vector_store")
+    os.environ["VECTOR_BACKEND"] = args.vector_backend
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # ChatOpenAI validates the key on construction
+    timings = {}
+
+    start = time.perf_counter()
+    import main
+    timings["import"] = time.perf_counter() - start
+
+    from fastapi.testclient import TestClient
+    from benchmarks.stand_ins import FakeLLM
+
+    if args.no_wait_ready:
+        # The first query may run before the warm-up, which must not create the OpenAI chat model then
+        main.llm = FakeLLM()
+
+    start = time.perf_counter()
+    with TestClient(main.app) as client:
+        timings["lifespan_startup"] = time.perf_counter() - start
+
+        if not args.no_wait_ready:
+            deadline = time.monotonic() + args.ready_timeout
+            while client.get("/health/ready").status_code != 200:
+                if time.monotonic() > deadline:
+                    raise SystemExit(f"The app was not ready after {args.ready_timeout} seconds.")
+                time.sleep(0.01)
+            timings["time_to_ready"] = time.perf_counter() - start
+            # The warm-up created the OpenAI chat model; answers come from the fake LLM
+            main.llm = FakeLLM()
+
+        request_start = time.perf_counter()
+        response = client.get("/create-user-token")
+        response.raise_for_status()
+        timings["first_request"] = time.perf_counter() - request_start
+
+        request_start = time.perf_counter()
+        response = client.post("/query", params={"query": "What does the warranty cover?"},
+                               headers={"uuid": response.json()["token"]})
+        response.raise_for_status()
+        timings["first_query"] = time.perf_counter() - request_start
+
+    work_dir.cleanup()
+    print(json.dumps({stage: round(seconds, 6) for stage, seconds in timings.items()}), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark of the API.")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh processes started.")
+    parser.add_argument("--vector-backend", choices=["embedded", "milvus"], default="embedded")
+    parser.add_argument("--no-wait-ready", action="store_true",
+                        help="Send the first requests right after startup instead of waiting for /health/ready.")
+    parser.add_argument("--ready-timeout", type=float, default=60.0, help="Seconds to wait for /health/ready.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    timer = StageTimer()
+    command = [sys.executable, "-m", "benchmarks.startup", "--child", "--vector-backend", args.vector_backend,
+               "--ready-timeout", str(args.ready_timeout)] + (["--no-wait-ready"] if args.no_wait_ready else [])
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        result = subprocess.run(command, capture_output=True, text=True)
+        wall_seconds = time.perf_counter() - start
+        if result.returncode != 0:
+            raise SystemExit(f"Startup run failed:\n{result.stderr}")
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        for stage, seconds in timings.items():
+            timer.record(stage, seconds)
+        timer.record("process_wall", wall_seconds)
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "child"},
+        "python": sys.version.split()[0],
+        "stages": timer.summary(),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
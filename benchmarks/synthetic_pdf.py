@@ -0,0 +1,63 @@
+"""
+Deterministic synthetic PDFs for the benchmarks, written without any PDF library.
+"""
+import random
+
+WORDS = (
+    "policy coverage claim insured premium deductible damage liability vehicle property accident "
+    "section clause exclusion endorsement beneficiary payment period renewal notice contract terms "
+    "the a of to and in for with on by is are be may shall not any all this that which under"
+).split()
+
+
+def make_text_lines(rng, num_lines, words_per_line=14):
+    """Generate lines of pseudo manual text with occasional part numbers and error codes."""
+    lines = []
+    for _ in range(num_lines):
+        words = [rng.choice(WORDS) for _ in range(words_per_line)]
+        if rng.random() < 0.2:
+            words.insert(rng.randrange(len(words)), f"PN-{rng.randrange(10000):04d}")
+        if rng.random() < 0.1:
+            words[0] = words[0].capitalize()
+        lines.append(" ".join(words) + ".")
+    return lines
+
+
+def _escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(num_pages, lines_per_page=50, seed=0):
+    """
+    Build a PDF with num_pages pages of text.
+
+    :param num_pages: Number of pages.
+    :param lines_per_page: Number of text lines per page.
+    :param seed: Seed of the text generator.
+    :return: The PDF file content as bytes.
+    """
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{4 + 2 * i} 0 R' for i in range(num_pages))}] /Count {num_pages} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i in range(num_pages):
+        operations = ["BT", "/F1 9 Tf", "11 TL", "36 806 Td"]
+        operations += [f"({_escape(line)}) Tj T*" for line in make_text_lines(rng, lines_per_page)]
+        operations.append("ET")
+        stream = "\n".join(operations).encode("latin-1")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {5 + 2 * i} 0 R >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(pdf)
@@ -1,27 +1,52 @@
-from fastapi import FastAPI, File, UploadFile, Header, HTTPException, Response, status
+from fastapi import Body, FastAPI, File, UploadFile, Header, HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import tempfile
-import shutil
+from starlette.routing import Match
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import zipfile
 import logging
+import time
 import traceback
-from typing import Dict
-from utils import MilvusManager, DocumentGenerator  # Assuming this is in your utils.py file
-from pymilvus import FieldSchema, DataType
-from langchain_community.embeddings import OpenAIEmbeddings
+from contextlib import asynccontextmanager
+from typing import Dict, List, Literal, Optional
+# pymilvus, langchain, PyPDF2 and tiktoken are imported where they are first used (or by the warm-up), so that importing
+# the app stays fast
+from utils import AsyncMilvusManager, DocumentGenerator, EmbeddingService, EmbeddingCache, CachedEmbeddings, SemanticCache, Metrics, TraceIdLogFilter, IngestionQueue, FileManifest, LexicalIndex, IndexPolicy, ContextBuilder, VectorStorage  # Assuming this is in your utils.py file
 # from langchain_community.embeddings import OpenAIEmbeddings
 import uuid
 # from langchain_community.llms import OpenAI
-from langchain.chat_models import ChatOpenAI
-from langchain.schema import HumanMessage
 
-from langchain.prompts import PromptTemplate
 
 # Initialize OpenAI LLM via LangChain
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the ingestion workers and the background warm-up when the worker starts, and stops them and
+    flushes the stores on shutdown. Startup does not wait for Milvus or the models, so the worker starts
+    (and reports it is not ready on /health/ready) while they are unavailable.
+    """
+    await start_ingestion_workers()
+    warm_up_task = asyncio.create_task(warm_up())
+    try:
+        yield
+    finally:
+        warm_up_task.cancel()
+        await asyncio.gather(warm_up_task, return_exceptions=True)
+        await stop_ingestion_workers()
+        flush_pending_inserts()
+
 # FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
-logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(trace_id)s] %(message)s', force=True)
+# Prefix every log line with the trace id of the request it belongs to
+for log_handler in logging.getLogger().handlers:
+    log_handler.addFilter(TraceIdLogFilter())
 
 # CORS settings
 origins = ["*"]  # Update based on your specific needs
@@ -33,18 +58,221 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["POST"],  # Limited to POST requests
     allow_headers=["Authorization", "Content-Type"],
+    expose_headers=["X-Trace-Id"],
 )
 
+# Stage latency histograms exported on /metrics; METRICS_TENANT_LABELS=1 also labels them by tenant
+metrics = Metrics(tenant_labels=os.getenv("METRICS_TENANT_LABELS", "0") == "1")
+
 # Initialize required classes
 # embedding_model = EmbeddingModel()
-document_generator = DocumentGenerator()
+document_generator = DocumentGenerator(metrics=metrics)
         # Initialize OpenAI embeddings via LangChain
 OPENAI_API_KEY = ''
-llm = ChatOpenAI(model_name='gpt-4o-mini',temperature=0.4, openai_api_key=OPENAI_API_KEY)
-openai_embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+# The chat model and the OpenAI clients are created on first use (see get_llm and build_embedder), so that importing
+# the app stays fast
+llm = None
+EMBEDDING_DIM = 1536
+# EMBEDDING_PROVIDER=fake swaps OpenAI for deterministic local embeddings (testing without API access)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+# Model name in the embedding cache keys
+EMBEDDING_MODEL = "DeterministicFakeEmbedding" if EMBEDDING_PROVIDER == "fake" else "text-embedding-ada-002"
+
+def build_embedder():
+    """
+    Creates the embedding model on first use.
+
+    Returns:
+    - The OpenAI embeddings, or deterministic fake embeddings with EMBEDDING_PROVIDER=fake.
+    """
+    if EMBEDDING_PROVIDER == "fake":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        return DeterministicFakeEmbedding(size=EMBEDDING_DIM)
+    from langchain_community.embeddings import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=EMBEDDING_MODEL, openai_api_key=OPENAI_API_KEY)
+
+# Content-addressed cache so re-uploaded chunks and repeated questions are embedded only once
+embedding_cache = EmbeddingCache(path=os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3"))
+cached_embeddings = CachedEmbeddings(None, embedding_cache, model_name=EMBEDDING_MODEL, embedder_factory=build_embedder)
+# Async, batched access to the embeddings so that embedding never blocks the event loop
+embedding_service = EmbeddingService(cached_embeddings, metrics=metrics)
 # embeddings.embed_documents(texts)
 # Instantiate the MilvusManager class globally
-milvus_manager = MilvusManager(host="127.0.0.1", port="19530")
+# Per-tenant list of stored files, maintained on insert and delete so listing files does not scan chunks
+file_manifest = FileManifest(path=os.getenv("FILE_MANIFEST_PATH", "file_manifest.sqlite3"))
+# Storage of new collections: MILVUS_VECTOR_TYPE=float16 halves the vectors, MILVUS_VECTOR_DIM keeps only their leading
+# dimensions and MILVUS_TEXT_COMPRESSION=zlib compresses the chunk texts (check the recall with tools.compact_storage_recall)
+vector_storage = VectorStorage(vector_type=os.getenv("MILVUS_VECTOR_TYPE", "float32"), embedding_dim=EMBEDDING_DIM,
+                               dim=int(os.getenv("MILVUS_VECTOR_DIM", "0")) or None,
+                               text_compression=os.getenv("MILVUS_TEXT_COMPRESSION") or None)
+# Index type per collection size: exact search for small tenants, HNSW, then IVF within the index memory budget;
+# MILVUS_INDEX_QUANTIZATION=SQ8 or PQ uses quantized IVF indexes past the exact search instead
+index_policy = IndexPolicy(dim=vector_storage.dim, bytes_per_dim=vector_storage.bytes_per_dim,
+                           memory_budget_bytes=int(os.getenv("MILVUS_INDEX_MEMORY_BUDGET_MB", "0")) * 2**20 or None,
+                           quantization=os.getenv("MILVUS_INDEX_QUANTIZATION") or None)
+# VECTOR_BACKEND=embedded stores the vectors in-process (memory-mapped files under EMBEDDED_VECTOR_DIR) instead of
+# in a Milvus server, for single-node and test deployments; MILVUS_STORAGE_MODE=partition_key keeps all tenants in
+# one Milvus collection partitioned by tenant id. MILVUS_MIGRATION_LOCK_DIR holds the locks letting one worker at a
+# time migrate the index of a collection; workers on several hosts need a directory they all share
+if os.getenv("VECTOR_BACKEND", "milvus") == "embedded":
+    from utils import EmbeddedVectorStore
+    milvus_manager = EmbeddedVectorStore(directory=os.getenv("EMBEDDED_VECTOR_DIR", "vector_store"))
+else:
+    from utils import MilvusManager
+    milvus_manager = MilvusManager(host="127.0.0.1", port="19530",
+                                   storage_mode=os.getenv("MILVUS_STORAGE_MODE", MilvusManager.STORAGE_MODE_COLLECTION),
+                                   metrics=metrics, file_manifest=file_manifest, index_policy=index_policy,
+                                   vector_storage=vector_storage, migration_lock_dir=os.getenv("MILVUS_MIGRATION_LOCK_DIR") or None)
+# Endpoints reach Milvus through a bounded thread pool so blocking pymilvus calls never stall the event loop
+async_milvus_manager = AsyncMilvusManager(milvus_manager, max_workers=int(os.getenv("MILVUS_MAX_CONCURRENCY", "8")),
+                                          timeout=float(os.getenv("MILVUS_TIMEOUT", "30")), metrics=metrics)
+# Limits for the LLM: concurrent generations per worker and seconds before a generation is abandoned
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+llm_semaphore = None
+# Per-tenant cache of answers to repeated and near-duplicate questions, invalidated when the tenant's files change
+semantic_cache = SemanticCache(similarity_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+                               ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "3600")))
+# Per-tenant BM25 index of the chunk texts for the hybrid retrieval mode, kept on disk and memory-mapped
+lexical_index = LexicalIndex(directory=os.getenv("LEXICAL_INDEX_DIR", "lexical_index"))
+# In hybrid mode each retriever returns HYBRID_CANDIDATES_FACTOR * top_k candidates to the fusion
+HYBRID_CANDIDATES_FACTOR = 4
+RRF_K = 60
+# Token budget of the LLM context, and optional local reranker ("lexical" or "cross_encoder") over a wider candidate set
+context_builder = ContextBuilder(max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "3000")),
+                                 encoding_name=os.getenv("CONTEXT_ENCODING", "o200k_base"),
+                                 reranker=os.getenv("CONTEXT_RERANKER") or None,
+                                 cross_encoder_model=os.getenv("CONTEXT_CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"))
+CONTEXT_RERANK_CANDIDATES_FACTOR = 4
+# /query-batch: maximum queries per request, and LLM calls of one batch running at the same time
+QUERY_BATCH_MAX_QUERIES = int(os.getenv("QUERY_BATCH_MAX_QUERIES", "1000"))
+QUERY_BATCH_LLM_CONCURRENCY = int(os.getenv("QUERY_BATCH_LLM_CONCURRENCY", "4"))
+# Number of chunks handed to the embedding service at a time while a PDF is being parsed
+EMBEDDING_BATCH_SIZE = 256
+# Uploads are spooled to disk and ingested by a bounded pool of background workers
+ingestion_queue = IngestionQueue(path=os.getenv("INGESTION_DB_PATH", "ingestion_jobs.sqlite3"),
+                                 spool_dir=os.getenv("INGESTION_SPOOL_DIR", "ingestion_spool"),
+                                 max_attempts=int(os.getenv("INGESTION_MAX_ATTEMPTS", "3")))
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+# Queued files of one tenant ingested together by a worker, and files of such a group parsed at the same time
+INGESTION_BATCH_SIZE = int(os.getenv("INGESTION_BATCH_SIZE", "16"))
+INGESTION_PARSE_CONCURRENCY = int(os.getenv("INGESTION_PARSE_CONCURRENCY", "4"))
+# Maximum number of PDFs accepted by one bulk upload
+BULK_UPLOAD_MAX_FILES = 5000
+# Maximum decompressed size of one PDF of a zip archive, and of all the PDFs of the archives of one bulk upload
+BULK_UPLOAD_MAX_MEMBER_BYTES = int(os.getenv("BULK_UPLOAD_MAX_MEMBER_MB", "100")) * 2**20
+BULK_UPLOAD_MAX_EXTRACTED_BYTES = int(os.getenv("BULK_UPLOAD_MAX_EXTRACTED_MB", "2048")) * 2**20
+# Seconds an idle worker waits before looking for jobs whose retry became due
+INGESTION_POLL_INTERVAL = 1.0
+ingestion_workers = []
+ingestion_wakeup = None
+# Set when the background warm-up started by the lifespan is over
+warm_up_done = False
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """
+    Times every request and attributes the work done for it to its endpoint, tenant and trace id.
+    The trace id is taken from a traceparent or X-Request-ID header when present and returned as X-Trace-Id.
+    """
+    # Label by route template; unknown paths share one label to keep the number of series bounded
+    endpoint = "other"
+    for route in app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            endpoint = route.path
+            break
+    trace_id = Metrics.parse_trace_id(request.headers.get("traceparent"), request.headers.get("x-request-id"))
+    token = Metrics.set_request_context(endpoint, tenant_id=request.headers.get("uuid"), trace_id=trace_id)
+    start = time.perf_counter()
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Trace-Id"] = trace_id
+        return response
+    finally:
+        metrics.observe_request(endpoint, request.method, status_code, time.perf_counter() - start)
+        Metrics.reset_request_context(token)
+
+async def start_ingestion_workers():
+    """
+    Starts the background workers that process queued uploads.
+    """
+    global ingestion_wakeup
+    ingestion_wakeup = asyncio.Event()
+    for _ in range(INGESTION_WORKERS):
+        ingestion_workers.append(asyncio.create_task(run_ingestion_worker()))
+
+async def stop_ingestion_workers():
+    """
+    Stops the ingestion workers; the jobs they were running go back to the queue.
+    """
+    for task in ingestion_workers:
+        task.cancel()
+    await asyncio.gather(*ingestion_workers, return_exceptions=True)
+    ingestion_workers.clear()
+
+def flush_pending_inserts():
+    """
+    Flushes inserts that are still waiting for a batched flush and stops the PDF worker processes before the worker exits.
+    """
+    async_milvus_manager.close()
+    milvus_manager.flush_pending()
+    milvus_manager.close()
+    document_generator.close()
+    embedding_cache.close()
+    ingestion_queue.close()
+    file_manifest.close()
+    lexical_index.close()
+
+async def warm_up():
+    """
+    Prepares in the background what the first requests would otherwise wait for: the connection to the
+    vector backend, the collection schema, the LLM and embedding clients and the tiktoken encodings, along
+    with the libraries behind them. A failed step is logged and left to the first request that needs it.
+    """
+    global warm_up_done
+    steps = [
+        ("vector backend", async_milvus_manager.check_health),
+        ("collection schema", lambda: asyncio.to_thread(build_collection_fields)),
+        ("LLM", lambda: asyncio.to_thread(get_llm)),
+        ("embeddings", lambda: asyncio.to_thread(lambda: cached_embeddings.embedder)),
+        ("text chunker", lambda: asyncio.to_thread(document_generator.warm_up)),
+        ("context tokenizer", lambda: asyncio.to_thread(context_builder.count_tokens, "")),
+    ]
+
+    async def run_step(name, step):
+        start = time.perf_counter()
+        try:
+            await step()
+            logging.info(f"Warm-up of the {name} took {time.perf_counter() - start:.2f}s.")
+        except Exception as e:
+            logging.error(f"Warm-up of the {name} failed: {e}")
+
+    # The steps run concurrently, so a slow Milvus connection does not delay the rest
+    await asyncio.gather(*(run_step(name, step) for name, step in steps))
+    warm_up_done = True
+
+def build_collection_fields() -> list:
+    """
+    Builds the schema of the collection of a new tenant.
+
+    Returns:
+    - The list of FieldSchema objects of the collection.
+    """
+    from pymilvus import FieldSchema, DataType
+
+    return [
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+        vector_storage.vector_field(name="vector"),  # OpenAI embeddings, as float32 or float16
+        FieldSchema(name="filename", dtype=DataType.VARCHAR, max_length=255),  # Filename
+        vector_storage.text_field(name="text"),  # Adding text content field, optionally compressed
+        # Chunk hash, page and position within the page, used to diff updated documents
+        FieldSchema(name="chunk_hash", dtype=DataType.VARCHAR, max_length=64),
+        FieldSchema(name="page_number", dtype=DataType.INT64),
+        FieldSchema(name="chunk_index", dtype=DataType.INT64)
+    ]
 
 @app.get("/create-user-token")
 async def create_token():
@@ -55,36 +283,404 @@ async def create_token():
     - token: The unique token (UUID) assigned to the user.
     """
     try:
-        # Define Milvus collection schema
-        fields = [
-            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-            FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=1536),  # OpenAI embeddings
-            FieldSchema(name="filename", dtype=DataType.VARCHAR, max_length=255),  # Filename
-            FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=5000)  # Adding text content field
-        ]
+        fields = build_collection_fields()
 
         # Generate a unique UUID
         tenant_id = str(uuid.uuid4())
 
         # Create a collection for the UUID in Milvus
-        token = milvus_manager.create_tenant_collection(tenant_id=tenant_id, fields=fields)
+        token = await async_milvus_manager.create_tenant_collection(tenant_id=tenant_id, fields=fields)
 
         return {"token": token}
 
     except Exception as e:
         return {"error": f"Failed to create user token. Error: {str(e)}"}
 
-@app.post("/upload-pdf")
+async def embed_pdfs(files: List[tuple], on_progress=None, embed: bool = True) -> dict:
+    """
+    Parses PDFs into chunks and embeds them. Files are parsed concurrently, page by page, and their
+    chunks are pooled into shared embedding batches that are embedded while parsing continues.
+
+    Args:
+    - files: List of (key, path, file_name) tuples.
+    - on_progress: Optional coroutine function called with (key, stage, number of chunks) after each parsed batch.
+    - embed: Set to False to only parse the files (the embeddings are then None).
+
+    Returns:
+    - Dict of key -> (texts, embeddings, page numbers), or key -> the exception that stopped the parsing of that file.
+    """
+    parse_semaphore = asyncio.Semaphore(INGESTION_PARSE_CONCURRENCY)
+    texts = {key: [] for key, _, _ in files}
+    page_numbers = {key: [] for key, _, _ in files}
+    # Chunks waiting for a full embedding batch, as (key, index) references, and the batches sent so far
+    pending = []
+    embedding_batches = []
+
+    def send_embedding_batches(final: bool = False):
+        while len(pending) >= EMBEDDING_BATCH_SIZE or (final and pending):
+            refs = pending[:EMBEDDING_BATCH_SIZE]
+            del pending[:EMBEDDING_BATCH_SIZE]
+            task = asyncio.create_task(embedding_service.embed_documents([texts[key][index] for key, index in refs]))
+            embedding_batches.append((refs, task))
+
+    async def parse(key, path: str, file_name: str):
+        async with parse_semaphore:
+            documents = document_generator.iter_documents(file=path, file_name=file_name)
+            while True:
+                batch = await asyncio.to_thread(lambda: list(itertools.islice(documents, EMBEDDING_BATCH_SIZE)))
+                if not batch:
+                    break
+                start = len(texts[key])
+                texts[key].extend(doc.page_content for doc in batch)  # Extracting the text from the Document instances
+                page_numbers[key].extend(doc.metadata["page_number"] for doc in batch)
+                if embed:
+                    pending.extend((key, index) for index in range(start, len(texts[key])))
+                    send_embedding_batches()
+                if on_progress is not None:
+                    await on_progress(key, "embedding" if embed else "parsing", len(texts[key]))
+
+    try:
+        parse_results = await asyncio.gather(*[parse(key, path, file_name) for key, path, file_name in files],
+                                             return_exceptions=True)
+        send_embedding_batches(final=True)
+        embedded_batches = await asyncio.gather(*[task for _, task in embedding_batches])
+    except BaseException:
+        for _, task in embedding_batches:
+            task.cancel()
+        raise
+
+    embeddings = {key: [None] * len(key_texts) for key, key_texts in texts.items()}
+    for (refs, _), batch_embeddings in zip(embedding_batches, embedded_batches):
+        for (key, index), embedding in zip(refs, batch_embeddings):
+            embeddings[key][index] = embedding
+
+    return {
+        key: error if isinstance(error, BaseException) else (texts[key], embeddings[key], page_numbers[key])
+        for (key, _, _), error in zip(files, parse_results)
+    }
+
+def chunk_metadata(texts: List[str], page_numbers: List[int]) -> tuple:
+    """
+    Computes the per-chunk fields stored with the vectors of a file.
+
+    Args:
+    - texts: The chunk texts of the file, in order.
+    - page_numbers: The page number of each chunk.
+
+    Returns:
+    - Tuple of (SHA-256 hex digest of each chunk text, position of each chunk within its page).
+    """
+    chunk_hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+    chunk_indexes = []
+    for i, page_number in enumerate(page_numbers):
+        chunk_indexes.append(chunk_indexes[-1] + 1 if i and page_numbers[i - 1] == page_number else 0)
+    return chunk_hashes, chunk_indexes
+
+async def ingest_pdfs(tenant_id: str, files: List[tuple], on_progress=None, content_hashes: Optional[dict] = None) -> dict:
+    """
+    Parses, embeds and inserts PDFs into the tenant's collection in one pass: a single query checks
+    which filenames already exist, the chunks of all files share embedding batches and all rows are
+    inserted with one insert (and at most one flush).
+
+    Args:
+    - tenant_id: The tenant UUID for identifying the collection.
+    - files: List of (key, path, file_name) tuples.
+    - on_progress: Optional coroutine function called with (key, stage, number of chunks) as the files are processed.
+    - content_hashes: Optional dict of key -> content hash of the file, recorded in the filename index.
+
+    Returns:
+    - Dict of key -> (True if the file was inserted, message for the client), or key -> the exception
+      that stopped the processing of that file.
+    """
+    outcomes = {}
+
+    # Check which filenames already exist in the tenant's collection before parsing anything
+    existing = await async_milvus_manager.existing_filenames(tenant_id=tenant_id, filenames=[file_name for _, _, file_name in files])
+    accepted = []
+    for key, path, file_name in files:
+        if file_name in existing:
+            outcomes[key] = (False, f"Filename '{file_name}' already exists. Upload aborted.")
+        elif any(file_name == accepted_name for _, _, accepted_name in accepted):
+            outcomes[key] = (False, f"Filename '{file_name}' appears more than once in the upload. Upload aborted.")
+        else:
+            accepted.append((key, path, file_name))
+
+    parsed = await embed_pdfs(accepted, on_progress=on_progress)
+
+    # Prepare data for insertion: the embeddings as vectors, the filename of each chunk, the chunk text,
+    # and the hash, page number and position of each chunk
+    vectors, filenames, chunk_texts, chunk_hashes, chunk_pages, chunk_indexes = [], [], [], [], [], []
+    inserted = []
+    file_sizes = {}
+    for key, path, file_name in accepted:
+        if isinstance(parsed[key], BaseException):
+            outcomes[key] = parsed[key]
+            continue
+        texts, embedded_docs, page_numbers = parsed[key]
+        if len(embedded_docs) != len(texts):
+            raise ValueError(f"Mismatch between number of embeddings and texts. {len(embedded_docs)}, {len(texts)}")
+        logging.info(f"file name : {file_name}")
+        vectors.extend(embedded_docs)
+        filenames.extend([file_name] * len(embedded_docs))
+        chunk_texts.extend(texts)
+        hashes, indexes = chunk_metadata(texts, page_numbers)
+        chunk_hashes.extend(hashes)
+        chunk_pages.extend(page_numbers)
+        chunk_indexes.extend(indexes)
+        inserted.append((key, file_name, len(texts)))
+        file_sizes[file_name] = os.path.getsize(path)
+
+    if inserted:
+        if on_progress is not None:
+            for key, _, num_chunks in inserted:
+                await on_progress(key, "inserting", num_chunks)
+        # A failed insert rolls its rows back, so the retry of the jobs starts from a clean slate
+        ids = await async_milvus_manager.insert_data(tenant_id=tenant_id,
+                                                     data=[vectors, filenames, chunk_texts, chunk_hashes, chunk_pages, chunk_indexes],
+                                                     content_hashes={file_name: (content_hashes or {}).get(key) for key, file_name, _ in inserted},
+                                                     file_sizes=file_sizes)
+        semantic_cache.invalidate(tenant_id)
+        try:
+            with metrics.span("lexical.index"):
+                await asyncio.to_thread(lexical_index.add_documents, tenant_id, ids, filenames, chunk_texts)
+        except Exception as e:
+            # The chunks are stored; they are only missing from the lexical side of hybrid queries
+            logging.error(f"Failed to add {len(ids)} chunks to the lexical index of UUID {tenant_id}: {e}, traceback: {traceback.format_exc()}")
+
+    for key, file_name, _ in inserted:
+        logging.info(f"File {file_name} uploaded and processed successfully for UUID {tenant_id}.")
+        outcomes[key] = (True, f"File {file_name} uploaded and processed successfully.")
+    return outcomes
+
+def diff_chunks(chunk_hashes: List[str], chunk_pages: List[int], chunk_indexes: List[int], stored: List[dict]) -> tuple:
+    """
+    Matches the chunks of an updated file against its stored chunks by chunk hash. A stored chunk
+    at the same page and position is preferred when the same text appears several times.
+
+    Args:
+    - chunk_hashes, chunk_pages, chunk_indexes: Hash, page number and position of each new chunk.
+    - stored: Stored chunk rows with "id", "chunk_hash", "page_number" and "chunk_index".
+
+    Returns:
+    - Tuple of (positions of the new chunks that are unchanged, as (position, stored id) pairs;
+      positions of the chunks whose text is stored under another page or position, as (position, stored id)
+      pairs; positions of the chunks that are new; ids of the stored chunks that are gone).
+    """
+    stored_by_hash = {}
+    for row in stored:
+        stored_by_hash.setdefault(row["chunk_hash"], []).append(row)
+
+    kept, moved, new = [], [], []
+    for i, chunk_hash in enumerate(chunk_hashes):
+        candidates = stored_by_hash.get(chunk_hash)
+        if not candidates:
+            new.append(i)
+            continue
+        location = (chunk_pages[i], chunk_indexes[i])
+        row = next((row for row in candidates if (row["page_number"], row["chunk_index"]) == location), candidates[0])
+        candidates.remove(row)
+        if (row["page_number"], row["chunk_index"]) == location:
+            kept.append((i, row["id"]))
+        else:
+            moved.append((i, row["id"]))
+    removed_ids = [row["id"] for rows in stored_by_hash.values() for row in rows]
+    return kept, moved, new, removed_ids
+
+async def update_pdf(tenant_id: str, key, path: str, file_name: str, on_progress=None, content_hash: Optional[str] = None) -> tuple:
+    """
+    Replaces the stored chunks of a file with the chunks of its new version. Only the chunks whose text
+    is new are embedded; chunks found at another page or position are re-inserted with their stored
+    vectors, and chunks that are gone are deleted. Collections created before chunk hashes were stored
+    have all chunks of the new version inserted before the old ones are deleted (unchanged chunks still
+    hit the embedding cache).
+
+    Args:
+    - tenant_id: The tenant UUID for identifying the collection.
+    - key: Key of the file passed to on_progress.
+    - path: Path of the new version of the file.
+    - file_name: Name the chunks are stored under.
+    - on_progress: Optional coroutine function called with (key, stage, number of chunks) as the file is processed.
+    - content_hash: Optional content hash of the new version, recorded in the filename index.
+
+    Returns:
+    - Tuple of (True, message for the client).
+    """
+    parsed = (await embed_pdfs([(key, path, file_name)], on_progress=on_progress, embed=False))[key]
+    if isinstance(parsed, BaseException):
+        raise parsed
+    texts, _, page_numbers = parsed
+    chunk_hashes, chunk_indexes = chunk_metadata(texts, page_numbers)
+
+    if await async_milvus_manager.has_chunk_fields(tenant_id=tenant_id):
+        stored = await async_milvus_manager.get_file_chunks(tenant_id=tenant_id, filename=file_name)
+        kept, moved, new, removed_ids = diff_chunks(chunk_hashes, page_numbers, chunk_indexes, stored)
+    else:
+        # Every chunk is re-inserted; the old ones are deleted by id once the new version is stored
+        stored = await async_milvus_manager.get_file_chunks(tenant_id=tenant_id, filename=file_name, output_fields=("id",))
+        kept, moved, new, removed_ids = [], [], list(range(len(texts))), [row["id"] for row in stored]
+
+    if on_progress is not None:
+        await on_progress(key, "embedding", len(new))
+    vectors = dict(zip(new, await embedding_service.embed_documents([texts[i] for i in new])))
+    if moved:
+        stored_vectors = await async_milvus_manager.get_vectors(tenant_id=tenant_id, ids=[stored_id for _, stored_id in moved])
+        vectors.update((i, stored_vectors[stored_id]) for i, stored_id in moved)
+        removed_ids += [stored_id for _, stored_id in moved]
+
+    # Insert the new and moved chunks before deleting the old ones, so the file never disappears from searches
+    positions = sorted(vectors)
+    ids = []
+    if positions:
+        if on_progress is not None:
+            await on_progress(key, "inserting", len(positions))
+        ids = await async_milvus_manager.insert_data(
+            tenant_id=tenant_id,
+            data=[[vectors[i] for i in positions], [file_name] * len(positions), [texts[i] for i in positions],
+                  [chunk_hashes[i] for i in positions], [page_numbers[i] for i in positions], [chunk_indexes[i] for i in positions]],
+            content_hashes={file_name: content_hash}, file_sizes={file_name: os.path.getsize(path)}
+        )
+    await async_milvus_manager.delete_chunks(tenant_id=tenant_id, filename=file_name, ids=removed_ids, content_hash=content_hash)
+    semantic_cache.invalidate(tenant_id)
+
+    try:
+        with metrics.span("lexical.index"):
+            await asyncio.to_thread(lexical_index.delete_file, tenant_id, file_name)
+            await asyncio.to_thread(lexical_index.add_documents, tenant_id, [stored_id for _, stored_id in kept] + ids,
+                                    [file_name] * (len(kept) + len(ids)), [texts[i] for i, _ in kept] + [texts[i] for i in positions])
+    except Exception as e:
+        logging.error(f"Failed to update the lexical index of file {file_name} for UUID {tenant_id}: {e}, traceback: {traceback.format_exc()}")
+
+    logging.info(f"File {file_name} updated for UUID {tenant_id}: {len(new)} new, {len(moved)} moved, "
+                 f"{len(removed_ids) - len(moved)} removed and {len(kept)} unchanged chunks.")
+    return True, (f"File {file_name} updated successfully: {len(new)} new, {len(removed_ids) - len(moved)} removed "
+                  f"and {len(kept) + len(moved)} unchanged chunks.")
+
+async def renew_ingestion_lease(lease_token: str):
+    """
+    Renews the lease of a claim of ingestion jobs until cancelled, so a long stage does not let another worker take them.
+
+    Args:
+    - lease_token: The lease token returned with the claimed jobs.
+    """
+    while True:
+        await asyncio.sleep(ingestion_queue.lease_seconds / 3)
+        try:
+            if not await asyncio.to_thread(ingestion_queue.renew_lease, lease_token):
+                logging.warning(f"Lease {lease_token} of ingestion jobs is no longer held by this worker.")
+                return
+        except Exception as e:
+            logging.error(f"Failed to renew the lease {lease_token} of ingestion jobs: {e}")
+
+async def process_ingestion_jobs(jobs: List[dict]):
+    """
+    Ingests a group of claimed jobs of one tenant and records their outcomes; failed attempts are retried by the queue.
+    """
+    tenant_id = jobs[0]["tenant_id"]
+    attempts = {job["id"]: job["attempts"] for job in jobs}
+    lease_token = jobs[0]["lease_token"]
+    heartbeat = asyncio.create_task(renew_ingestion_lease(lease_token))
+    # Attribute the work to the ingestion workers in the metrics, traced by the id of the first job
+    token = Metrics.set_request_context("ingestion", tenant_id=tenant_id, trace_id=jobs[0]["id"])
+    try:
+        async def report_progress(job_id: str, stage: str, chunks: Optional[int]):
+            await asyncio.to_thread(ingestion_queue.update_progress, job_id, lease_token, stage, chunks)
+
+        for job in jobs:
+            await report_progress(job["id"], "parsing", 0)
+        uploads = [job for job in jobs if job["operation"] != IngestionQueue.OPERATION_UPDATE]
+        outcomes = {}
+        if uploads:
+            outcomes = await ingest_pdfs(tenant_id, [(job["id"], job["file_path"], job["filename"]) for job in uploads],
+                                         on_progress=report_progress,
+                                         content_hashes={job["id"]: job["content_hash"] for job in uploads})
+        # Updates are rare and replace chunks of stored files, so they run one file at a time
+        for job in jobs:
+            if job["operation"] == IngestionQueue.OPERATION_UPDATE:
+                try:
+                    outcomes[job["id"]] = await update_pdf(tenant_id, job["id"], job["file_path"], job["filename"],
+                                                           on_progress=report_progress, content_hash=job["content_hash"])
+                except Exception as e:
+                    outcomes[job["id"]] = e
+    except asyncio.CancelledError:
+        # The worker is stopping: let another worker pick the jobs up right away
+        for job in jobs:
+            ingestion_queue.release(job["id"], lease_token)
+        raise
+    except Exception as e:
+        logging.error(f"Ingestion of {len(jobs)} file(s) for UUID {tenant_id} failed: {e}, traceback: {traceback.format_exc()}")
+        outcomes = {job["id"]: e for job in jobs}
+    finally:
+        heartbeat.cancel()
+        Metrics.reset_request_context(token)
+
+    for job_id, outcome in outcomes.items():
+        if isinstance(outcome, BaseException):
+            logging.error(f"Ingestion job {job_id} failed (attempt {attempts[job_id]}): {outcome}")
+            await asyncio.to_thread(ingestion_queue.fail, job_id, lease_token, str(outcome))
+        else:
+            ingested, message = outcome
+            status_name = IngestionQueue.STATUS_SUCCEEDED if ingested else IngestionQueue.STATUS_REJECTED
+            await asyncio.to_thread(ingestion_queue.complete, job_id, lease_token, message, status_name)
+
+async def run_ingestion_worker():
+    """
+    Claims queued ingestion jobs, a group of the same tenant at a time, and processes them until cancelled.
+    """
+    while True:
+        try:
+            jobs = await asyncio.to_thread(ingestion_queue.claim, INGESTION_BATCH_SIZE)
+        except Exception as e:
+            logging.error(f"Failed to claim ingestion jobs: {e}")
+            jobs = []
+
+        if not jobs:
+            # Sleep until a new upload is queued, polling for retries that became due
+            try:
+                await asyncio.wait_for(ingestion_wakeup.wait(), timeout=INGESTION_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            ingestion_wakeup.clear()
+            continue
+
+        await process_ingestion_jobs(jobs)
+
+def check_duplicate_upload(fileobj, tenant_id: str, file_name: str, stored_hash: Optional[str]) -> tuple:
+    """
+    Duplicate check of an upload whose filename is already stored: the upload is hashed and compared
+    with the stored version. Runs in a worker thread.
+
+    Args:
+    - fileobj: The uploaded file, positioned at its start.
+    - tenant_id: The tenant UUID.
+    - file_name: Name the chunks would be stored under.
+    - stored_hash: Content hash of the stored file (None for files stored before hashes were kept).
+
+    Returns:
+    - A tuple of (job that stored the same content, message rejecting the upload); the job is None
+      when no job of this content is known, and the upload is rejected when another content is stored.
+    """
+    content_hash = IngestionQueue.hash_content(fileobj)
+    if stored_hash != content_hash:
+        # Including older versions replaced by /update-pdf since: their job no longer describes the stored file
+        return None, f"Filename '{file_name}' already exists. Upload aborted."
+    previous_job = ingestion_queue.find(tenant_id, file_name, content_hash)
+    if previous_job is not None:
+        return previous_job, None
+    return None, f"File '{file_name}' was already uploaded."
+
+@app.post("/upload-pdf", status_code=status.HTTP_202_ACCEPTED)
 async def upload_pdf_endpoint(file: UploadFile = File(...), uuid: str = Header(...)):
     """
-    Handles the upload and vectorization of a PDF file for a given UUID.
+    Queues the vectorization of a PDF file for a given UUID. The file is processed by a background
+    worker; poll /ingestion-jobs/{job_id} for its progress.
 
     Args:
     - file: UploadFile to be processed.
     - uuid: Header identifier for creating/updating vector store.
 
     Returns:
-    - Success message upon successful upload and processing.
+    - The ingestion job (202), or the existing job when the same file was already submitted (200).
+      Another file stored under the same name is rejected (409).
     """
     if not file.filename.endswith('.pdf'):
         error_msg = "Invalid file type. Only PDF is accepted."
@@ -92,59 +688,280 @@ async def upload_pdf_endpoint(file: UploadFile = File(...), uuid: str = Header(.
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=error_msg)
 
     try:
-        with tempfile.NamedTemporaryFile(delete=True) as temp_file:
-            # Save the uploaded file to a temporary location
-            shutil.copyfileobj(file.file, temp_file)
-            file_name = file.filename.split('.')[0]
+        file_name = file.filename.split('.')[0]
+
+        # Answer duplicates before anything is spooled, parsed or embedded; the upload is only hashed when its name is stored
+        previous_job, duplicate_message = None, None
+        exists, stored_hash = await async_milvus_manager.get_file_hash(tenant_id=uuid, filename=file_name)
+        if exists:
+            previous_job, duplicate_message = await asyncio.to_thread(check_duplicate_upload, file.file, uuid, file_name,
+                                                                      stored_hash)
+    except Exception as e:
+        logging.error(f"Error occurred during processing: {e}, traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Something went wrong! Please try again.")
+    if previous_job is not None:
+        return JSONResponse(content=IngestionQueue.public_view(previous_job), status_code=status.HTTP_200_OK)
+    if duplicate_message is not None:
+        logging.info(duplicate_message)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=duplicate_message)
 
-            # Generate documents (using your custom document generator logic)
-            docs = document_generator.generate_documents(file=str(temp_file.name), file_name=file_name)
+    try:
+        # Save the upload to the spool directory, hashing it on the way, and queue it
+        spooled_path, content_hash = await asyncio.to_thread(ingestion_queue.spool, file.file)
+        job, created = await asyncio.to_thread(ingestion_queue.submit, uuid, file_name, content_hash, spooled_path)
+        if created:
+            ingestion_wakeup.set()
+            logging.info(f"Queued ingestion job {job['id']} for file {file_name} and UUID {uuid}.")
 
-            # Ensure that data is written before proceeding
-            temp_file.flush()
+        return JSONResponse(content=IngestionQueue.public_view(job),
+                            status_code=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
 
+    except Exception as e:
+        logging.error(f"Error occurred during processing: {e}, traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Something went wrong! Please try again.")
 
+@app.post("/update-pdf", status_code=status.HTTP_202_ACCEPTED)
+async def update_pdf_endpoint(file: UploadFile = File(...), uuid: str = Header(...)):
+    """
+    Queues the update of a stored PDF with a new version of the file. The background worker only embeds
+    the chunks whose text changed and deletes the chunks that are gone; poll /ingestion-jobs/{job_id}
+    for its progress.
 
-        logging.info(f"file name : {file_name}")
+    Args:
+    - file: The new version of the file, uploaded under the stored name.
+    - uuid: Header identifier for the vector store.
 
-        # Extract text and generate embeddings
-        texts = [doc.page_content for doc in docs]  # Extracting the text from the Document instances
-        embedded_docs = openai_embeddings.embed_documents(texts)
+    Returns:
+    - The ingestion job (202), or the existing job when the same version was already submitted (200).
+      A file identical to the stored one is answered with a message (200); an unknown file is rejected (404).
+    """
+    if not file.filename.endswith('.pdf'):
+        error_msg = "Invalid file type. Only PDF is accepted."
+        logging.error(error_msg)
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=error_msg)
 
-        if len(embedded_docs) != len(texts):
-            raise ValueError(f"Mismatch between number of embeddings and texts. {len(embedded_docs)}, {len(texts)}")
-        # Check if the filename already exists in the tenant's collection
-        if milvus_manager.filename_exists(tenant_id=uuid, filename=file_name):
-            error_msg = f"Filename '{file_name}' already exists. Upload aborted."
-            return Response(content=error_msg, status_code=status.HTTP_200_OK)
-
-            # logging.error(error_msg)
-            # raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=error_msg)
-
-        # Prepare data for insertion
-        data_to_insert = [
-            # Embeddings as vectors
-            embedded_docs,
-            # Repeating filename for each embedding
-            [file_name] * len(embedded_docs),
-            # The actual text content to be inserted
-            texts
-        ]
-
-        # Ensure all data lists are the same length before inserting
-        if any(len(lst) != len(embedded_docs) for lst in data_to_insert):
-            raise ValueError("Data fields are not of the same length.")
-
-        milvus_manager.insert_data(tenant_id=uuid, data=data_to_insert)
-
-  
-        logging.info(f"File {file_name} uploaded and processed successfully for UUID {uuid}.")
-        return Response(content=f"File {file_name} uploaded and processed successfully.", status_code=status.HTTP_200_OK)
+    try:
+        file_name = file.filename.split('.')[0]
+        exists, stored_hash = await async_milvus_manager.get_file_hash(tenant_id=uuid, filename=file_name)
+    except Exception as e:
+        logging.error(f"Error occurred during processing: {e}, traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Something went wrong! Please try again.")
+    if not exists:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File '{file_name}' not found. Use /upload-pdf to add it.")
+
+    try:
+        spooled_path, content_hash = await asyncio.to_thread(ingestion_queue.spool, file.file)
+        if content_hash == stored_hash:
+            await asyncio.to_thread(os.remove, spooled_path)
+            return JSONResponse(content={"message": f"File '{file_name}' is unchanged."}, status_code=status.HTTP_200_OK)
+
+        job, created = await asyncio.to_thread(ingestion_queue.submit, uuid, file_name, content_hash, spooled_path,
+                                               operation=IngestionQueue.OPERATION_UPDATE)
+        if created:
+            ingestion_wakeup.set()
+            logging.info(f"Queued update job {job['id']} for file {file_name} and UUID {uuid}.")
+
+        return JSONResponse(content=IngestionQueue.public_view(job),
+                            status_code=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
 
     except Exception as e:
         logging.error(f"Error occurred during processing: {e}, traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Something went wrong! Please try again.")
 
+def queue_bulk_upload(files: List[UploadFile], tenant_id: str, stored_files: dict) -> tuple:
+    """
+    Spools the PDFs of a bulk upload, expanding zip archives, and queues one ingestion job per PDF
+    under a common batch id. Runs in a worker thread.
+
+    Args:
+    - files: PDF files and/or zip archives containing PDF files.
+    - tenant_id: The tenant UUID.
+    - stored_files: Dict of filename -> content hash of the files the tenant has stored.
+
+    Returns:
+    - A tuple of (batch id, list of (job, created) tuples, names of the entries that are not PDFs,
+      PDFs rejected because another file is stored under their name).
+    """
+    def is_pdf_member(member: zipfile.ZipInfo) -> bool:
+        # Skip folders and the resource forks macOS adds to archives
+        return not member.is_dir() and member.filename.endswith('.pdf') and not member.filename.startswith('__MACOSX/')
+
+    archives = {}
+    num_pdfs = 0
+    extracted_bytes = 0
+    for upload in files:
+        if upload.filename.endswith('.zip'):
+            archives[id(upload)] = zipfile.ZipFile(upload.file)
+            for member in archives[id(upload)].infolist():
+                if not is_pdf_member(member):
+                    continue
+                # zipfile stops reading a member at its declared size, so the sizes bound what gets spooled
+                if member.file_size > BULK_UPLOAD_MAX_MEMBER_BYTES:
+                    raise ValueError(f"{member.filename} is too large once decompressed "
+                                     f"({member.file_size} bytes, at most {BULK_UPLOAD_MAX_MEMBER_BYTES}).")
+                num_pdfs += 1
+                extracted_bytes += member.file_size
+        elif upload.filename.endswith('.pdf'):
+            num_pdfs += 1
+    if num_pdfs > BULK_UPLOAD_MAX_FILES:
+        raise ValueError(f"Too many PDF files in one upload ({num_pdfs}, at most {BULK_UPLOAD_MAX_FILES}).")
+    if extracted_bytes > BULK_UPLOAD_MAX_EXTRACTED_BYTES:
+        raise ValueError(f"The zip archives are too large once decompressed "
+                         f"({extracted_bytes} bytes, at most {BULK_UPLOAD_MAX_EXTRACTED_BYTES}).")
+
+    batch_id = uuid.uuid4().hex
+    queued = []
+    skipped = []
+    rejected = []
+
+    def queue(fileobj, name: str):
+        file_name = os.path.basename(name).split('.')[0]
+        previous_job, duplicate_message = None, None
+        if file_name in stored_files:
+            previous_job, duplicate_message = check_duplicate_upload(fileobj, tenant_id, file_name, stored_files[file_name])
+        if previous_job is not None:
+            queued.append((previous_job, False))
+        elif duplicate_message is not None:
+            rejected.append({"filename": name, "detail": duplicate_message})
+        else:
+            path, content_hash = ingestion_queue.spool(fileobj)
+            queued.append(ingestion_queue.submit(tenant_id, file_name, content_hash, path, batch_id=batch_id))
+
+    for upload in files:
+        if id(upload) in archives:
+            with archives[id(upload)] as archive:
+                for member in archive.infolist():
+                    if is_pdf_member(member):
+                        with archive.open(member) as member_file:
+                            queue(member_file, member.filename)
+                    elif not member.is_dir():
+                        skipped.append(member.filename)
+        elif upload.filename.endswith('.pdf'):
+            queue(upload.file, upload.filename)
+        else:
+            skipped.append(upload.filename)
+
+    return batch_id, queued, skipped, rejected
+
+@app.post("/upload-pdfs", status_code=status.HTTP_202_ACCEPTED)
+async def bulk_upload_endpoint(files: List[UploadFile] = File(...), uuid: str = Header(...)):
+    """
+    Queues the vectorization of many PDF files at once, sent as PDFs and/or zip archives of PDFs.
+    The background workers ingest the files of a tenant together: one filename check, shared
+    embedding batches and one insert per group of files. Poll /ingestion-jobs/?batch_id=... for progress.
+
+    Args:
+    - files: PDF files and/or zip archives containing PDF files.
+    - uuid: Header identifier for creating/updating vector store.
+
+    Returns:
+    - The batch id, the ingestion job of every PDF, the names of the entries that were skipped and the
+      PDFs rejected because their filename is already stored.
+    """
+    try:
+        stored_files = {file["filename"]: file["content_hash"] for file in await async_milvus_manager.list_file_details(tenant_id=uuid)}
+        batch_id, queued, skipped, rejected = await asyncio.to_thread(queue_bulk_upload, files, uuid, stored_files)
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid zip archive: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error occurred during bulk upload: {e}, traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Something went wrong! Please try again.")
+
+    created = any(job_created for _, job_created in queued)
+    if created:
+        ingestion_wakeup.set()
+    logging.info(f"Queued bulk upload {batch_id} with {len(queued)} file(s) for UUID {uuid}.")
+
+    return JSONResponse(
+        content={"batch_id": batch_id, "jobs": [IngestionQueue.public_view(job) for job, _ in queued], "skipped": skipped,
+                 "rejected": rejected},
+        status_code=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
+    )
+
+@app.get("/ingestion-jobs/{job_id}")
+async def get_ingestion_job(job_id: str, uuid: str = Header(...)):
+    """
+    Returns the status and progress of an ingestion job.
+
+    Args:
+    - job_id: The id returned by /upload-pdf.
+    - uuid: The tenant UUID the job belongs to.
+
+    Returns:
+    - The job: status (queued, running, succeeded, rejected or failed), stage, chunks processed, attempts and outcome.
+    """
+    job = await asyncio.to_thread(ingestion_queue.get, job_id, uuid)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ingestion job not found.")
+    return IngestionQueue.public_view(job)
+
+@app.get("/ingestion-jobs/")
+async def list_ingestion_jobs(uuid: str = Header(...), limit: int = 100, batch_id: Optional[str] = None):
+    """
+    Lists the most recent ingestion jobs of a tenant, newest first.
+
+    Args:
+    - uuid: The tenant UUID.
+    - limit: Maximum number of jobs returned.
+    - batch_id: Optional id of a bulk upload to list the jobs of.
+
+    Returns:
+    - The jobs.
+    """
+    jobs = await asyncio.to_thread(ingestion_queue.list_jobs, uuid, limit, batch_id)
+    return {"jobs": [IngestionQueue.public_view(job) for job in jobs]}
+
+def get_llm():
+    """
+    Returns the chat model, created on first use so that importing the app does not load the OpenAI client.
+    """
+    global llm
+    if llm is None:
+        from langchain.chat_models import ChatOpenAI
+        llm = ChatOpenAI(model_name='gpt-4o-mini',temperature=0.4, openai_api_key=OPENAI_API_KEY)
+    return llm
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """
+    Returns the semaphore bounding concurrent LLM calls, created on first use inside the running event loop.
+    """
+    global llm_semaphore
+    if llm_semaphore is None:
+        llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return llm_semaphore
+
+def build_llm_messages(query: str, context: str) -> list:
+    """
+    Builds the chat messages sent to the LLM for a query and its search context.
+
+    Args:
+    - query: The original query.
+    - context: The search result context to pass to the LLM.
+
+    Returns:
+    - The list of messages for ChatOpenAI.
+    """
+    from langchain.prompts import PromptTemplate
+    from langchain.schema import HumanMessage
+
+    # Create a combined prompt template
+    prompt_template = PromptTemplate(
+        input_variables=["context", "query"],
+        template="Context:\n{context}\n\nQuestion:\n{query}"
+    )
+
+    # Format the prompt using the context and query
+    # prompt_text = prompt_template.format(context=context, query=query)
+    prompt_text = f"Context:\n{context}\n\nQuestion:\n{query}"
+
+    # # Generate a response using the LLM
+    # response = llm(prompt_text)
+
+    # Wrap the input in a HumanMessage object (required by ChatOpenAI)
+    return [HumanMessage(content=prompt_text)]
+
 async def call_openai_llm_via_langchain(query: str, context: str) -> str:
     """
     Calls the OpenAI LLM via LangChain to generate a response based on the query and search context.
@@ -157,24 +974,12 @@ async def call_openai_llm_via_langchain(query: str, context: str) -> str:
     - The generated response from the LLM.
     """
     try:
-        # Create a combined prompt template
-        prompt_template = PromptTemplate(
-            input_variables=["context", "query"],
-            template="Context:\n{context}\n\nQuestion:\n{query}"
-        )
+        messages = build_llm_messages(query, context)
 
-        # Format the prompt using the context and query
-        # prompt_text = prompt_template.format(context=context, query=query)
-        prompt_text = f"Context:\n{context}\n\nQuestion:\n{query}"
-
-        # # Generate a response using the LLM
-        # response = llm(prompt_text)
-
-        # Wrap the input in a HumanMessage object (required by ChatOpenAI)
-        messages = [HumanMessage(content=prompt_text)]
-
-        # Generate a response using the ChatOpenAI model
-        response = llm(messages)  # llm should be a ChatOpenAI instance
+        # Generate a response using the ChatOpenAI model without blocking the event loop
+        async with get_llm_semaphore():
+            with metrics.span("llm"):
+                response = await asyncio.wait_for(get_llm().ainvoke(messages), timeout=LLM_TIMEOUT)  # llm should be a ChatOpenAI instance
 
         # Return the response as plain text
         return response.content.strip()
@@ -183,40 +988,310 @@ async def call_openai_llm_via_langchain(query: str, context: str) -> str:
         logging.error(f"Error occurred while calling OpenAI LLM: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="LLM call failed.")
 
+async def stream_openai_llm_via_langchain(query: str, context: str):
+    """
+    Streams the OpenAI LLM response via LangChain token by token.
 
-@app.post("/query")
-async def query_documents(query: str, uuid: str = Header(...), top_k: int = 5):
+    Args:
+    - query: The original query.
+    - context: The search result context to pass to the LLM.
+
+    Yields:
+    - Pieces of the generated response as they arrive.
     """
-    Queries the document embeddings in the Milvus vector store using OpenAI embeddings and returns the closest matches.
+    messages = build_llm_messages(query, context)
+
+    async with get_llm_semaphore():
+        stream = get_llm().astream(messages)
+        start = time.perf_counter()
+        first_token = True
+        try:
+            with metrics.span("llm.stream"):
+                while True:
+                    try:
+                        # LLM_TIMEOUT bounds the wait for each piece rather than the whole generation
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=LLM_TIMEOUT)
+                    except StopAsyncIteration:
+                        break
+                    if chunk.content:
+                        if first_token:
+                            metrics.observe_stage("llm.first_token", time.perf_counter() - start)
+                            first_token = False
+                        yield chunk.content
+        finally:
+            # Stops the upstream generation when the client disconnects or an error occurs
+            await stream.aclose()
+
+def reciprocal_rank_fusion(result_lists: List[list], top_k: int) -> list:
+    """
+    Fuses ranked result lists with reciprocal rank fusion: each result scores the sum of 1 / (RRF_K + rank)
+    over the lists it appears in, so results found by several retrievers rise to the top.
+
+    Args:
+    - result_lists: Ranked lists of results with an "id" key, best first.
+    - top_k: Number of results to return.
+
+    Returns:
+    - The fused results, best first, each with its "rrf_score".
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            entry = fused.setdefault(result["id"], {**result, "rrf_score": 0.0})
+            entry["rrf_score"] += 1.0 / (RRF_K + rank)
+    return sorted(fused.values(), key=lambda result: result["rrf_score"], reverse=True)[:top_k]
+
+async def retrieve_context_batch(queries: List[str], query_embeddings: List[List[float]], uuid: str, top_k: int,
+                                 file_names: Optional[List[str]] = None, mode: str = "vector") -> List[list]:
+    """
+    Searches the tenant's collection for many queries at once, optionally restricted to some files. The
+    vector searches go to Milvus in one request. In "hybrid" mode the BM25 searches run concurrently
+    and the results of each query are fused by reciprocal rank.
+
+    Args:
+    - queries: The query texts.
+    - query_embeddings: The embedded queries, in the order of queries.
+    - uuid: The tenant UUID for identifying the collection.
+    - top_k: Number of top results to return per query.
+    - file_names: Optional list of filenames to filter the queries.
+    - mode: "vector" or "hybrid".
+
+    Returns:
+    - One list of search results, including text and filename, per query.
+    """
+    if mode == "hybrid":
+        num_candidates = top_k * HYBRID_CANDIDATES_FACTOR
+        filenames = set(file_names) if file_names else None
+        with metrics.span("retrieval.hybrid"):
+            vector_results, lexical_results = await asyncio.gather(
+                retrieve_context_batch(queries, query_embeddings, uuid, num_candidates, file_names),
+                asyncio.to_thread(lambda: [lexical_index.search(uuid, query, num_candidates, filenames) for query in queries])
+            )
+            return [reciprocal_rank_fusion([vector, lexical], top_k) for vector, lexical in zip(vector_results, lexical_results)]
+
+    # Search parameters (nprobe / ef) follow the index the index policy picked for the collection
+    return await async_milvus_manager.search_batch(
+        tenant_id=uuid, query_vectors=query_embeddings, top_k=top_k,
+        filter_expr=f"filename in {file_names}" if file_names else None
+    )
+
+async def retrieve_context(query: str, query_embedding: List[float], uuid: str, top_k: int,
+                           file_names: Optional[List[str]] = None, mode: str = "vector") -> list:
+    """
+    Searches the tenant's collection for a query, optionally restricted to some files (see retrieve_context_batch).
+
+    Returns:
+    - The search results including text and filename.
+    """
+    return (await retrieve_context_batch([query], [query_embedding], uuid, top_k, file_names, mode))[0]
+
+def get_num_candidates(top_k: int) -> int:
+    """
+    Number of search results to retrieve for a query: a wider candidate set when the context builder reranks.
+    """
+    return top_k * CONTEXT_RERANK_CANDIDATES_FACTOR if context_builder.reranker else top_k
+
+async def build_context(query: str, results: list, top_k: int) -> tuple:
+    """
+    Builds the LLM context of a query from its search results in a worker thread: optional reranking,
+    merging of overlapping chunks, near-duplicate removal and packing into the token budget.
+
+    Returns:
+    - Tuple of (context text, search results in the context).
+    """
+    with metrics.span("context.build"):
+        return await asyncio.to_thread(context_builder.build, query, results, top_k)
+
+def get_semantic_cache_scope(top_k: int, file_names: Optional[List[str]] = None, mode: str = "vector") -> tuple:
+    """
+    Describes the search options a cached answer is valid for.
+    """
+    return (top_k, tuple(sorted(file_names or [])), mode)
+
+async def get_files_revision(tenant_id: str) -> Optional[int]:
+    """
+    Returns the revision of a tenant's files in the file manifest, shared by the workers, that cached
+    answers are checked against (None when the manifest does not track the tenant).
+    """
+    return await asyncio.to_thread(file_manifest.get_revision, tenant_id)
+
+async def answer_query(query: str, uuid: str, top_k: int, file_names: Optional[List[str]] = None, mode: str = "vector") -> dict:
+    """
+    Answers a query from the semantic cache, or by searching Milvus and calling the LLM.
 
     Args:
     - query: The query text.
     - uuid: The tenant UUID for identifying the collection.
     - top_k: Number of top results to return.
+    - file_names: Optional list of filenames to filter the query.
+    - mode: Retrieval mode, "vector" or "hybrid".
 
     Returns:
-    - A list of documents most similar to the query, including text and filename.
+    - The LLM response and the relevant context from the vector DB.
+    """
+    # Embed the query using OpenAI
+    query_embedding = await embedding_service.embed_query(query)
+
+    # Serve repeated and near-duplicate questions from the tenant's semantic cache
+    scope = get_semantic_cache_scope(top_k, file_names, mode)
+    revision = await get_files_revision(uuid)
+    cached_answer = semantic_cache.lookup(uuid, query_embedding, scope, revision)
+    if cached_answer is not None:
+        logging.info(f"Semantic cache hit for UUID {uuid}.")
+        return cached_answer
+    generation = semantic_cache.get_generation(uuid)
+
+    # Perform the search in Milvus
+    results = await retrieve_context(query, query_embedding, uuid, get_num_candidates(top_k), file_names, mode)
+    # Merge, deduplicate and pack the search results into the context's token budget
+    context, results = await build_context(query, results, top_k)
+
+    # Call the LLM using the query and context via LangChain
+    llm_response = await call_openai_llm_via_langchain(query, context)
+
+    # Return the formatted results including text, filename, and LLM response
+    answer = {
+        "llm_response": llm_response,
+        "relevant_context_from_vector_db": results
+    }
+    semantic_cache.store(uuid, query_embedding, answer, scope, generation, revision)
+    return answer
+
+async def answer_query_batch(queries: List[str], uuid: str, top_k: int, file_names: Optional[List[str]] = None,
+                             mode: str = "vector", generate: bool = True) -> List[dict]:
+    """
+    Answers many queries of a tenant: the queries are embedded in one call and searched in one Milvus
+    request, then the answers not found in the semantic cache are generated with at most
+    QUERY_BATCH_LLM_CONCURRENCY LLM calls at a time, leaving LLM capacity to the interactive queries.
+
+    Args:
+    - queries: The query texts.
+    - uuid: The tenant UUID for identifying the collection.
+    - top_k: Number of top results to return per query.
+    - file_names: Optional list of filenames to filter the queries.
+    - mode: Retrieval mode, "vector" or "hybrid".
+    - generate: Whether to call the LLM; only the relevant context is returned otherwise.
+
+    Returns:
+    - One result per query, in the order of queries, with the query, the relevant context and, when
+      generating, the LLM response or the error that prevented it.
+    """
+    query_embeddings = await embedding_service.embed_documents(queries)
+    scope = get_semantic_cache_scope(top_k, file_names, mode)
+    answers = [None] * len(queries)
+    revision = await get_files_revision(uuid)
+    if generate:
+        answers = [semantic_cache.lookup(uuid, query_embedding, scope, revision) for query_embedding in query_embeddings]
+    generation = semantic_cache.get_generation(uuid)
+
+    # Search the queries that were not answered from the cache
+    pending = [i for i, answer in enumerate(answers) if answer is None]
+    if pending:
+        results = await retrieve_context_batch([queries[i] for i in pending], [query_embeddings[i] for i in pending],
+                                               uuid, get_num_candidates(top_k), file_names, mode)
+        contexts = await asyncio.gather(*[build_context(queries[i], query_results, top_k)
+                                          for i, query_results in zip(pending, results)])
+        results = [query_results for _, query_results in contexts]
+    else:
+        contexts = results = []
+
+    if not generate:
+        return [{"query": query, "relevant_context_from_vector_db": query_results}
+                for query, query_results in zip(queries, results)]
+
+    llm_semaphore = asyncio.Semaphore(QUERY_BATCH_LLM_CONCURRENCY)
+
+    async def generate_answer(i, context, query_results):
+        async with llm_semaphore:
+            try:
+                llm_response = await call_openai_llm_via_langchain(queries[i], context)
+            except HTTPException as e:
+                answers[i] = {"error": e.detail, "relevant_context_from_vector_db": query_results}
+                return
+        answers[i] = {"llm_response": llm_response, "relevant_context_from_vector_db": query_results}
+        semantic_cache.store(uuid, query_embeddings[i], answers[i], scope, generation, revision)
+
+    await asyncio.gather(*[generate_answer(i, context, query_results) for i, (context, query_results) in zip(pending, contexts)])
+    return [{"query": query, **answer} for query, answer in zip(queries, answers)]
+
+def format_sse(event: str, data) -> str:
+    """
+    Formats a Server-Sent Event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_query_response(request: Request, query: str, uuid: str, top_k: int, file_names: Optional[List[str]] = None,
+                                mode: str = "vector") -> StreamingResponse:
+    """
+    Retrieves the context for a query and streams it, followed by the LLM tokens, as Server-Sent Events:
+    a "context" event with the search results, "token" events with pieces of the response and a final
+    "done" event with the full response (or an "error" event if generation fails).
     """
     try:
-        # Embed the query using OpenAI
-        query_embedding = openai_embeddings.embed_query(query)
+        query_embedding = await embedding_service.embed_query(query)
+        scope = get_semantic_cache_scope(top_k, file_names, mode)
+        revision = await get_files_revision(uuid)
+        cached_answer = semantic_cache.lookup(uuid, query_embedding, scope, revision)
+        generation = semantic_cache.get_generation(uuid)
+        if cached_answer is None:
+            results = await retrieve_context(query, query_embedding, uuid, get_num_candidates(top_k), file_names, mode)
+            context, results = await build_context(query, results, top_k)
+        else:
+            results = cached_answer["relevant_context_from_vector_db"]
+    except Exception as e:
+        logging.error(f"Error occurred during query: {e}, traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error occurred during query.")
 
-        # Define search parameters
-        search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
+    async def event_stream():
+        yield format_sse("context", {"relevant_context_from_vector_db": results})
 
-        # Perform the search in Milvus
-        results = milvus_manager.search(tenant_id=uuid, query_vectors=[query_embedding], top_k=top_k, search_params=search_params)
-        # Extract the text from the search results to build the context
-        context = "\n".join([result['text'] for result in results])
+        # Replay a cached answer as a single token
+        if cached_answer is not None:
+            yield format_sse("token", {"text": cached_answer["llm_response"]})
+            yield format_sse("done", {"llm_response": cached_answer["llm_response"]})
+            return
 
-        # Call the LLM using the query and context via LangChain
-        llm_response = await call_openai_llm_via_langchain(query, context)
+        # Do not start a generation for a client that is already gone
+        if await request.is_disconnected():
+            return
 
-        # Return the formatted results including text, filename, and LLM response
-        return {
-            "llm_response": llm_response,
-            "relevant_context_from_vector_db": results
-        }
+        pieces = []
+        try:
+            async for piece in stream_openai_llm_via_langchain(query, context):
+                pieces.append(piece)
+                yield format_sse("token", {"text": piece})
+        except asyncio.CancelledError:
+            logging.info(f"Client disconnected during streaming query for UUID {uuid}.")
+            raise
+        except Exception as e:
+            logging.error(f"Error occurred while streaming OpenAI LLM response: {e}")
+            yield format_sse("error", {"detail": "LLM call failed."})
+            return
+
+        llm_response = "".join(pieces).strip()
+        semantic_cache.store(uuid, query_embedding, {"llm_response": llm_response, "relevant_context_from_vector_db": results}, scope, generation, revision)
+        yield format_sse("done", {"llm_response": llm_response})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/query")
+async def query_documents(query: str, uuid: str = Header(...), top_k: int = 5, mode: Literal["vector", "hybrid"] = "vector"):
+    """
+    Queries the document embeddings in the Milvus vector store using OpenAI embeddings and returns the closest matches.
+
+    Args:
+    - query: The query text.
+    - uuid: The tenant UUID for identifying the collection.
+    - top_k: Number of top results to return.
+    - mode: "vector" for vector search, "hybrid" to fuse it with BM25 keyword search (part numbers, error codes).
+
+    Returns:
+    - A list of documents most similar to the query, including text and filename.
+    """
+    try:
+        # Embed the query, perform the search in Milvus and call the LLM (unless the answer is cached)
+        return await answer_query(query, uuid, top_k, mode=mode)
 
         # Return the formatted results including text and filename
         # return {"results": results}
@@ -226,14 +1301,13 @@ async def query_documents(query: str, uuid: str = Header(...), top_k: int = 5):
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error occurred during query.")
 
 
-from typing import List, Optional
-
 @app.post("/query-with-selected-files")
 async def query_documents_with_file(
     query: str, 
     uuid: str = Header(...), 
     top_k: int = 5, 
-    file_names: Optional[List[str]] = None  # New optional parameter for filenames
+    file_names: Optional[List[str]] = None,  # New optional parameter for filenames
+    mode: Literal["vector", "hybrid"] = "vector"
 ):
     """
     Queries the document embeddings in the Milvus vector store using OpenAI embeddings and returns the closest matches.
@@ -243,46 +1317,98 @@ async def query_documents_with_file(
     - uuid: The tenant UUID for identifying the collection.
     - top_k: Number of top results to return.
     - file_names: Optional list of filenames to filter the query.
+    - mode: "vector" for vector search, "hybrid" to fuse it with BM25 keyword search.
 
     Returns:
     - A list of documents most similar to the query, including text and filename.
     """
     try:
-        # Embed the query using OpenAI
-        query_embedding = openai_embeddings.embed_query(query)
-
-        # Define search parameters
-        search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
-
-        # If file_names is provided, filter the documents by filename
-        if file_names:
-            # Generate an expression to filter by the provided filenames
-            file_filter_expr = f"filename in {file_names}"
-            results = milvus_manager.search_with_filter(
-                tenant_id=uuid, query_vectors=[query_embedding], top_k=top_k, 
-                search_params=search_params, filter_expr=file_filter_expr
-            )
-        else:
-            # No filenames provided, query all documents
-            results = milvus_manager.search(
-                tenant_id=uuid, query_vectors=[query_embedding], top_k=top_k, search_params=search_params
-            )
+        # Embed the query, search (filtering by file_names when provided) and call the LLM unless the answer is cached
+        return await answer_query(query, uuid, top_k, file_names, mode)
 
-        # Extract the text from the search results to build the context
-        context = "\n".join([result['text'] for result in results])
+    except Exception as e:
+        logging.error(f"Error occurred during query: {e}, traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error occurred during query.")
 
-        # Call the LLM using the query and context via LangChain
-        llm_response = await call_openai_llm_via_langchain(query, context)
+@app.post("/query-batch")
+async def query_documents_batch(
+    queries: List[str] = Body(..., embed=True),
+    uuid: str = Header(...),
+    top_k: int = 5,
+    file_names: Optional[List[str]] = Body(None, embed=True),
+    mode: Literal["vector", "hybrid"] = "vector",
+    generate: bool = True
+):
+    """
+    Answers many queries of a tenant in one call, e.g. for evaluation runs: the queries are embedded
+    together, searched in one Milvus request, and answered with bounded LLM concurrency.
 
-        # Return the formatted results including text, filename, and LLM response
-        return {
-            "llm_response": llm_response,
-            "relevant_context_from_vector_db": results
-        }
+    Args:
+    - queries: The query texts (at most QUERY_BATCH_MAX_QUERIES).
+    - uuid: The tenant UUID for identifying the collection.
+    - top_k: Number of top results to return per query.
+    - file_names: Optional list of filenames to filter the queries.
+    - mode: "vector" for vector search, "hybrid" to fuse it with BM25 keyword search.
+    - generate: Set to false to only retrieve the relevant context, without calling the LLM.
+
+    Returns:
+    - {"results": [...]} with one entry per query, in order: the query, the relevant context and,
+      when generating, the LLM response (or an "error" when the LLM call for that query failed).
+    """
+    if not queries:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No queries given.")
+    if len(queries) > QUERY_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Too many queries in one batch ({len(queries)}, at most {QUERY_BATCH_MAX_QUERIES}).")
+
+    try:
+        return {"results": await answer_query_batch(queries, uuid, top_k, file_names, mode, generate)}
 
     except Exception as e:
-        logging.error(f"Error occurred during query: {e}, traceback: {traceback.format_exc()}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error occurred during query.")
+        logging.error(f"Error occurred during batch query: {e}, traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error occurred during batch query.")
+
+@app.post("/query/stream")
+async def query_documents_stream(request: Request, query: str, uuid: str = Header(...), top_k: int = 5,
+                                 mode: Literal["vector", "hybrid"] = "vector"):
+    """
+    Streaming variant of /query: sends the relevant context as soon as Milvus returns, then the LLM
+    response token by token as Server-Sent Events.
+
+    Args:
+    - query: The query text.
+    - uuid: The tenant UUID for identifying the collection.
+    - top_k: Number of top results to return.
+    - mode: "vector" for vector search, "hybrid" to fuse it with BM25 keyword search.
+
+    Returns:
+    - A text/event-stream response with "context", "token" and "done" events.
+    """
+    return await stream_query_response(request, query, uuid, top_k, mode=mode)
+
+@app.post("/query-with-selected-files/stream")
+async def query_documents_with_file_stream(
+    request: Request,
+    query: str,
+    uuid: str = Header(...),
+    top_k: int = 5,
+    file_names: Optional[List[str]] = None,
+    mode: Literal["vector", "hybrid"] = "vector"
+):
+    """
+    Streaming variant of /query-with-selected-files.
+
+    Args:
+    - query: The query text.
+    - uuid: The tenant UUID for identifying the collection.
+    - top_k: Number of top results to return.
+    - file_names: Optional list of filenames to filter the query.
+    - mode: "vector" for vector search, "hybrid" to fuse it with BM25 keyword search.
+
+    Returns:
+    - A text/event-stream response with "context", "token" and "done" events.
+    """
+    return await stream_query_response(request, query, uuid, top_k, file_names, mode)
 
 @app.get("/list-files/")
 async def list_files(uuid: str = Header(...)):
@@ -293,21 +1419,69 @@ async def list_files(uuid: str = Header(...)):
     - uuid: The tenant UUID for identifying the collection.
 
     Returns:
-    - A list of filenames in the collection.
+    - A list of filenames in the collection, and the chunk count, size, upload time and content hash
+      of each file (unknown for files uploaded before the file manifest was backfilled).
     """
     try:
-        # Call the MilvusManager method to list all files
-        filenames = milvus_manager.list_files(tenant_id=uuid)
-        if not filenames:
+        # Read from the file manifest: one row per file, not per chunk
+        files = await async_milvus_manager.list_file_details(tenant_id=uuid)
+        if not files:
             return {"message": "No files found in the collection."}
         
         logging.info(f"Files listed successfully for UUID {uuid}.")
-        return {"filenames": filenames}
+        return {"filenames": [file["filename"] for file in files], "files": files}
 
     except Exception as e:
         logging.error(f"Error occurred while listing files: {e}")
         raise HTTPException(status_code=500, detail=f"Error occurred while listing files: {e}")
 
+@app.get("/embedding-cache/stats")
+async def embedding_cache_stats():
+    """
+    Returns the hit/miss counters of the embedding cache.
+
+    Returns:
+    - Memory and disk hits, misses, hit rate and the number of embeddings held in memory.
+    """
+    return embedding_cache.stats()
+
+@app.get("/metrics")
+async def export_metrics():
+    """
+    Exports the request and stage latency histograms in the Prometheus text format.
+
+    Returns:
+    - The metrics of this worker process.
+    """
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/live")
+async def liveness():
+    """
+    Liveness probe: answers as soon as the worker serves requests, whatever the state of Milvus.
+
+    Returns:
+    - The status of the worker.
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """
+    Readiness probe: OK once the startup warm-up is over and the vector backend answers.
+
+    Returns:
+    - The status of the worker, with a 503 status code while it cannot serve queries.
+    """
+    if not warm_up_done:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "starting"})
+    try:
+        await async_milvus_manager.check_health()
+    except Exception as e:
+        logging.error(f"Readiness check of the vector backend failed: {e}")
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "vector backend unavailable"})
+    return {"status": "ready"}
+
 @app.delete("/delete-file/")
 async def delete_file(uuid: str = Header(...), filename: str = Header(...)):
     """
@@ -322,7 +1496,11 @@ async def delete_file(uuid: str = Header(...), filename: str = Header(...)):
     """
     try:
         # Call the MilvusManager method to delete the file by filename
-        delete_message = milvus_manager.delete_file_by_filename(tenant_id=uuid, filename=filename)
+        delete_message = await async_milvus_manager.delete_file_by_filename(tenant_id=uuid, filename=filename)
+        semantic_cache.invalidate(uuid)
+        await asyncio.to_thread(lexical_index.delete_file, uuid, filename)
+        # Allow the same file to be uploaded again
+        await asyncio.to_thread(ingestion_queue.forget, uuid, filename)
         logging.info(f"File '{filename}' deleted successfully for UUID {uuid}.")
         return {"message": delete_message}
 
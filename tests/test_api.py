@@ -0,0 +1,115 @@
+import importlib
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from benchmarks.synthetic_pdf import make_pdf
+
+
+@pytest.fixture(scope="module")
+def main(tmp_path_factory):
+    """Import main.py on the embedded vector store with fake embeddings, keeping its files in a temporary directory."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(tmp_path_factory.mktemp("app"))
+        monkeypatch.setenv("VECTOR_BACKEND", "embedded")
+        monkeypatch.setenv("EMBEDDING_PROVIDER", "fake")
+        monkeypatch.setenv("EMBEDDING_CACHE_PATH", "")  # memory-only embedding cache
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+        main = importlib.import_module("main")
+        main.llm = FakeListChatModel(responses=["The warranty covers parts."])
+        yield main
+
+
+@pytest.fixture(scope="module")
+def client(main):
+    # The lifespan closes the stores on exit, so the app is started once per module
+    with TestClient(main.app) as client:
+        yield client
+
+
+def wait_for_job(client, tenant_id, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/ingestion-jobs/{job_id}", headers={"uuid": tenant_id}).json()
+        if job["status"] in ("succeeded", "failed", "rejected") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_upload_query_and_delete(client):
+    tenant_id = client.get("/create-user-token").json()["token"]
+
+    response = client.post("/upload-pdf", files={"file": ("manual.pdf", make_pdf(3, lines_per_page=20))},
+                           headers={"uuid": tenant_id})
+    assert response.status_code == 202
+    assert wait_for_job(client, tenant_id, response.json()["id"])["status"] == "succeeded"
+    [file] = client.get("/list-files/", headers={"uuid": tenant_id}).json()["files"]
+    assert file["filename"] == "manual" and file["chunks"] > 0
+
+    response = client.post("/query", params={"query": "What does the warranty cover?", "top_k": 3},
+                           headers={"uuid": tenant_id})
+    assert response.status_code == 200
+    answer = response.json()
+    assert answer["llm_response"] == "The warranty covers parts."
+    assert 0 < len(answer["relevant_context_from_vector_db"]) <= 3
+    assert {hit["filename"] for hit in answer["relevant_context_from_vector_db"]} == {"manual"}
+
+    response = client.delete("/delete-file/", headers={"uuid": tenant_id, "filename": "manual"})
+    assert response.status_code == 200
+    assert client.get("/list-files/", headers={"uuid": tenant_id}).json() == {"message": "No files found in the collection."}
+    response = client.post("/query", params={"query": "What does the warranty cover?", "top_k": 3},
+                           headers={"uuid": tenant_id})
+    assert response.json()["relevant_context_from_vector_db"] == []
+
+
+def test_reupload_of_a_replaced_version_is_rejected(client):
+    tenant_id = client.get("/create-user-token").json()["token"]
+    first, second = make_pdf(2, lines_per_page=20, seed=1), make_pdf(2, lines_per_page=20, seed=2)
+
+    response = client.post("/upload-pdf", files={"file": ("notes.pdf", first)}, headers={"uuid": tenant_id})
+    assert wait_for_job(client, tenant_id, response.json()["id"])["status"] == "succeeded"
+    response = client.post("/upload-pdf", files={"file": ("notes.pdf", first)}, headers={"uuid": tenant_id})
+    assert response.status_code == 200 and response.json()["operation"] == "upload"
+
+    response = client.post("/update-pdf", files={"file": ("notes.pdf", second)}, headers={"uuid": tenant_id})
+    assert wait_for_job(client, tenant_id, response.json()["id"])["status"] == "succeeded"
+    # The job of the first version no longer describes the stored file
+    response = client.post("/upload-pdf", files={"file": ("notes.pdf", first)}, headers={"uuid": tenant_id})
+    assert response.status_code == 409
+    response = client.post("/upload-pdf", files={"file": ("notes.pdf", second)}, headers={"uuid": tenant_id})
+    assert response.status_code == 200 and response.json()["operation"] == "update"
+
+    response = client.post("/upload-pdfs", files=[("files", ("notes.pdf", first)), ("files", ("other.pdf", second))],
+                           headers={"uuid": tenant_id})
+    assert [rejected["filename"] for rejected in response.json()["rejected"]] == ["notes.pdf"]
+    assert [job["filename"] for job in response.json()["jobs"]] == ["other"]
+
+
+def test_diff_chunks_matches_stored_chunks_by_hash(main):
+    stored = [
+        {"id": 1, "chunk_hash": "a", "page_number": 1, "chunk_index": 0},
+        {"id": 2, "chunk_hash": "b", "page_number": 1, "chunk_index": 1},
+        {"id": 3, "chunk_hash": "c", "page_number": 2, "chunk_index": 0},
+        {"id": 4, "chunk_hash": "a", "page_number": 2, "chunk_index": 1},
+    ]
+    # "b" moved to page 2, "c" is gone, "d" is new and "a" still appears twice
+    kept, moved, new, removed_ids = main.diff_chunks(["a", "d", "b", "a"], [1, 1, 2, 2], [0, 1, 0, 1], stored)
+
+    assert kept == [(0, 1), (3, 4)]
+    assert moved == [(2, 2)]
+    assert new == [1]
+    assert removed_ids == [3]
+
+
+def test_diff_chunks_prefers_the_chunk_at_the_same_location(main):
+    stored = [
+        {"id": 1, "chunk_hash": "a", "page_number": 1, "chunk_index": 0},
+        {"id": 2, "chunk_hash": "a", "page_number": 3, "chunk_index": 0},
+    ]
+    kept, moved, new, removed_ids = main.diff_chunks(["a"], [3], [0], stored)
+
+    assert kept == [(0, 2)]
+    assert moved == [] and new == []
+    assert removed_ids == [1]
@@ -0,0 +1,51 @@
+from utils import ContextBuilder
+
+
+class WordCountingBuilder(ContextBuilder):
+    """Counts one token per word, so the budgets of the tests do not depend on the tokenizer."""
+
+    def count_tokens(self, text):
+        return len(text.split())
+
+
+def hit(chunk_id, text, filename="manual"):
+    return {"id": chunk_id, "text": text, "filename": filename}
+
+
+def test_pack_keeps_the_best_hits_within_the_budget():
+    builder = WordCountingBuilder(max_tokens=10, separator="\n")
+    hits = [hit(1, "one two three four"), hit(2, "one two three four five six seven"), hit(3, "one two"), hit(4, "one two three")]
+
+    # The second hit does not fit after the first, smaller lower ranked hits still do
+    packed = builder.pack(hits)
+    assert [packed_hit["id"] for packed_hit in packed] == [1, 3, 4]
+    assert sum(builder.count_tokens(packed_hit["text"]) for packed_hit in packed) <= builder.max_tokens
+
+
+def test_pack_counts_the_separators():
+    builder = WordCountingBuilder(max_tokens=6, separator=" | ")
+    packed = builder.pack([hit(1, "one two three"), hit(2, "one two three")])
+    # 3 + 1 separator token + 3 exceeds the budget
+    assert [packed_hit["id"] for packed_hit in packed] == [1]
+
+
+def test_build_merges_overlapping_chunks_and_drops_duplicates():
+    builder = WordCountingBuilder(max_tokens=100, min_overlap_chars=10)
+    hits = [
+        hit(1, "the pump must be primed before the first start"),
+        hit(2, "before the first start, open the inlet valve"),
+        hit(3, "the pump must be primed before the first start", filename="copy"),
+        hit(4, "replace the filter every six months", filename="guide"),
+    ]
+
+    context, packed = builder.build("how do I start the pump", hits)
+    assert [packed_hit["ids"] for packed_hit in packed] == [[1, 2], [4]]
+    assert packed[0]["text"] == "the pump must be primed before the first start, open the inlet valve"
+    assert context == "\n".join(packed_hit["text"] for packed_hit in packed)
+
+
+def test_build_limits_the_number_of_hits():
+    builder = WordCountingBuilder(max_tokens=100)
+    hits = [hit(i, f"distinct chunk number {i} about topic {i}", filename=f"file{i}") for i in range(5)]
+    _, packed = builder.build("topic", hits, max_hits=2)
+    assert [packed_hit["id"] for packed_hit in packed] == [0, 1]
@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+import pytest
+from pymilvus import DataType, FieldSchema
+
+from utils import EmbeddedVectorStore
+
+TENANT_ID = "0b6f3c52-3f0e-4d4a-9f5e-2f4b1c9d7a10"
+DIM = 4
+
+
+def vector(seed):
+    return np.random.default_rng(seed).random(DIM, dtype=np.float32).tolist()
+
+
+def insert_file(store, filename, seeds):
+    return store.insert_data(TENANT_ID, [[vector(seed) for seed in seeds], [filename] * len(seeds),
+                                         [f"{filename} chunk {seed}" for seed in seeds]])
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    stores = []
+
+    def open_store(**kwargs):
+        store = EmbeddedVectorStore(directory=str(tmp_path), **kwargs)
+        store.create_tenant_collection(TENANT_ID, [FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=DIM)])
+        stores.append(store)
+        return store
+
+    yield open_store
+    for store in stores:
+        store.close()
+
+
+def test_insert_and_search(open_store):
+    store = open_store()
+    a_ids = insert_file(store, "a", [0, 1, 2])
+    b_ids = insert_file(store, "b", [3, 4])
+
+    [hit] = store.search(TENANT_ID, [vector(4)], top_k=1)
+    assert hit["id"] == b_ids[1]
+    assert hit["distance"] == pytest.approx(0, abs=1e-6)
+    assert (hit["text"], hit["filename"]) == ("b chunk 4", "b")
+
+    hits = store.search_with_filter(TENANT_ID, [vector(4)], top_k=5, filter_expr='filename in ["a"]')
+    assert sorted(hit["id"] for hit in hits) == sorted(a_ids)
+    assert [[hit["id"] for hit in hits] for hits in store.search_batch(TENANT_ID, [vector(0), vector(3)], top_k=1)] == [[a_ids[0]], [b_ids[0]]]
+    assert [(file["filename"], file["chunks"]) for file in store.list_file_details(TENANT_ID)] == [("a", 3), ("b", 2)]
+
+
+def test_delete(open_store):
+    store = open_store()
+    a_ids = insert_file(store, "a", [0, 1, 2])
+    b_ids = insert_file(store, "b", [3, 4])
+
+    assert store.delete_chunks(TENANT_ID, "a", [a_ids[0]], content_hash="new") == 1
+    assert [row["id"] for row in store.get_file_chunks(TENANT_ID, "a", output_fields=("id",))] == a_ids[1:]
+    assert store.get_file_hash(TENANT_ID, "a") == (True, "new")
+
+    store.delete_file_by_filename(TENANT_ID, "a")
+    assert store.list_files(TENANT_ID) == ["b"]
+    assert not store.filename_exists(TENANT_ID, "a")
+    assert {hit["id"] for hit in store.search(TENANT_ID, [vector(0)], top_k=5)} == set(b_ids)
+
+
+def test_compaction(open_store, tmp_path):
+    store = open_store(min_compact_rows=2)
+    insert_file(store, "a", [0, 1, 2])
+    b_ids = insert_file(store, "b", [3, 4])
+    store.delete_file_by_filename(TENANT_ID, "a")
+    # The vector file is rewritten under the next generation without the deleted rows
+    assert [name for name in os.listdir(tmp_path) if name.startswith("tenant_")] == [f"tenant_{TENANT_ID.replace('-', '_')}.1.f32"]
+    assert os.path.getsize(tmp_path / f"tenant_{TENANT_ID.replace('-', '_')}.1.f32") == 2 * DIM * 4
+    assert store.get_vectors(TENANT_ID, b_ids) == {b_ids[0]: pytest.approx(vector(3)), b_ids[1]: pytest.approx(vector(4))}
+    assert [hit["id"] for hit in store.search(TENANT_ID, [vector(4)], top_k=1)] == [b_ids[1]]
+
+    [c_id] = insert_file(store, "c", [5])
+    assert [hit["id"] for hit in store.search(TENANT_ID, [vector(5)], top_k=1)] == [c_id]
+
+
+def test_reload(open_store):
+    store = open_store(min_compact_rows=2)
+    a_ids = insert_file(store, "a", [0, 1, 2])
+    b_ids = insert_file(store, "b", [3, 4])
+    store.delete_chunks(TENANT_ID, "a", a_ids[:2])
+    store.flush(TENANT_ID)
+    store.close()
+
+    reopened = open_store()
+    assert reopened.get_vectors(TENANT_ID, [a_ids[2]] + b_ids) == {
+        a_ids[2]: pytest.approx(vector(2)), b_ids[0]: pytest.approx(vector(3)), b_ids[1]: pytest.approx(vector(4))}
+    assert [hit["id"] for hit in reopened.search(TENANT_ID, [vector(2)], top_k=1)] == [a_ids[2]]
+    assert {hit["id"] for hit in reopened.search(TENANT_ID, [vector(0)], top_k=5)} == {a_ids[2]} | set(b_ids)
+    assert [(file["filename"], file["chunks"]) for file in reopened.list_file_details(TENANT_ID)] == [("a", 1), ("b", 2)]
+
+
+def test_failed_insert_leaves_no_orphaned_vectors(open_store):
+    store = open_store()
+    insert_file(store, "a", [0])
+    # The NULL text fails the metadata transaction after the vector was appended
+    with pytest.raises(Exception):
+        store.insert_data(TENANT_ID, [[vector(1)], ["b"], [None]])
+    [new_id] = insert_file(store, "c", [2])
+
+    assert store.get_vectors(TENANT_ID, [new_id])[new_id] == pytest.approx(vector(2))
+    assert [hit["id"] for hit in store.search(TENANT_ID, [vector(2)], top_k=1)] == [new_id]
+    assert store.list_files(TENANT_ID) == ["a", "c"]
+
+    store.close()
+    reopened = open_store()
+    assert reopened.get_vectors(TENANT_ID, [new_id])[new_id] == pytest.approx(vector(2))
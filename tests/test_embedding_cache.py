@@ -0,0 +1,72 @@
+from utils import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbedder:
+    model = "counting-model"
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return [float(len(text)), 1.0]
+
+
+def test_each_distinct_text_is_embedded_once():
+    embedder = CountingEmbedder()
+    embeddings = CachedEmbeddings(embedder, EmbeddingCache(path=None))
+
+    first = embeddings.embed_documents(["alpha", "beta", "alpha"])
+    second = embeddings.embed_documents(["beta", "  alpha\n"])
+    # Queries share the entries of identical document texts
+    query = embeddings.embed_query("beta")
+
+    assert embedder.embedded == ["alpha", "beta"]
+    assert first == [[5.0, 1.0], [4.0, 1.0], [5.0, 1.0]]
+    assert second == [[4.0, 1.0], [5.0, 1.0]]
+    assert query == [4.0, 1.0]
+
+
+def test_entries_survive_a_restart_and_are_per_model(tmp_path):
+    path = str(tmp_path / "embedding_cache.sqlite3")
+    cache = EmbeddingCache(path=path)
+    CachedEmbeddings(CountingEmbedder(), cache).embed_documents(["alpha"])
+    cache.close()
+
+    cache = EmbeddingCache(path=path)
+    embedder = CountingEmbedder()
+    assert CachedEmbeddings(embedder, cache).embed_documents(["alpha"]) == [[5.0, 1.0]]
+    assert embedder.embedded == []
+    assert cache.stats()["disk_hits"] == 1
+
+    CachedEmbeddings(embedder, cache, model_name="other-model").embed_documents(["alpha"])
+    assert embedder.embedded == ["alpha"]
+    cache.close()
+
+
+def test_memory_tier_evicts_the_least_recently_used_entries():
+    cache = EmbeddingCache(path=None, max_memory_entries=2)
+    cache.set_many({"a": [1.0], "b": [2.0]})
+    cache.get_many(["a"])
+    cache.set_many({"c": [3.0]})
+
+    assert cache.get_many(["a", "b", "c"]) == {"a": [1.0], "c": [3.0]}
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_embedder_is_built_on_first_use():
+    built = []
+
+    def factory():
+        built.append(True)
+        return CountingEmbedder()
+
+    embeddings = CachedEmbeddings(None, EmbeddingCache(path=None), model_name="counting-model", embedder_factory=factory)
+    assert built == []
+    embeddings.embed_query("alpha")
+    embeddings.embed_query("alpha")
+    assert built == [True]
@@ -0,0 +1,53 @@
+import pytest
+
+from utils import FileManifest
+
+TENANT_ID = "0b6f3c52-3f0e-4d4a-9f5e-2f4b1c9d7a10"
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = FileManifest(path=str(tmp_path / "file_manifest.sqlite3"))
+    yield manifest
+    manifest.close()
+
+
+def test_every_change_to_the_files_bumps_the_revision(manifest):
+    assert manifest.get_revision(TENANT_ID) is None
+    manifest.track_tenant(TENANT_ID)
+    assert manifest.get_revision(TENANT_ID) == 0
+
+    manifest.record_files(TENANT_ID, {"manual": {"chunks": 3, "content_hash": "abc"}})
+    assert manifest.get_revision(TENANT_ID) == 1
+    manifest.record_files(TENANT_ID, {"manual": {"chunks": 2}})
+    assert manifest.get_revision(TENANT_ID) == 2
+    manifest.remove_file(TENANT_ID, "manual")
+    assert manifest.get_revision(TENANT_ID) == 3
+    manifest.backfill(TENANT_ID, {"guide": 4}, scan_started_at=0)
+    assert manifest.get_revision(TENANT_ID) == 4
+
+    # Tracking a tenant again does not reset its revision
+    manifest.track_tenant(TENANT_ID)
+    assert manifest.get_revision(TENANT_ID) == 4
+
+
+def test_revision_is_shared_by_the_workers_of_a_database(manifest):
+    other_worker = FileManifest(path=manifest.path)
+    try:
+        manifest.track_tenant(TENANT_ID)
+        other_worker.record_files(TENANT_ID, {"manual": {"chunks": 3}})
+        assert manifest.get_revision(TENANT_ID) == 1
+        assert [file["filename"] for file in manifest.list_files(TENANT_ID)] == ["manual"]
+    finally:
+        other_worker.close()
+
+
+def test_untracked_tenants_are_not_listed(manifest):
+    manifest.record_files(TENANT_ID, {"manual": {"chunks": 3}})
+    assert manifest.list_files(TENANT_ID) is None
+    assert manifest.get_revision(TENANT_ID) is None
+
+    manifest.backfill(TENANT_ID, {"manual": 3}, scan_started_at=0)
+    assert manifest.list_files(TENANT_ID)[0]["chunks"] == 3
+    manifest.drop_tenant(TENANT_ID)
+    assert manifest.list_files(TENANT_ID) is None
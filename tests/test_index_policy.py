@@ -0,0 +1,61 @@
+import pytest
+
+from utils import IndexPolicy
+
+
+def index_type(policy, num_rows):
+    return policy.choose(num_rows)["index_type"]
+
+
+def test_collections_move_up_the_ladder_at_the_thresholds():
+    policy = IndexPolicy(dim=8, flat_max_rows=100, hnsw_max_rows=1000)
+    assert index_type(policy, 0) == "FLAT"
+    assert index_type(policy, 99) == "FLAT"
+    assert index_type(policy, 100) == "HNSW"
+    assert index_type(policy, 999) == "HNSW"
+    assert index_type(policy, 1000) == "IVF_FLAT"
+
+
+def test_memory_budget_skips_indexes_that_do_not_fit():
+    policy = IndexPolicy(dim=8, flat_max_rows=100, hnsw_max_rows=1000, memory_budget_bytes=20_000)
+    # HNSW: 500 * (8 * 4 + 16 * 2 * 4) = 80000 bytes, IVF_FLAT: 500 * 8 * 4 = 16000 bytes
+    assert index_type(policy, 500) == "IVF_FLAT"
+    # IVF_FLAT needs 32000 bytes, the most compact index is used
+    assert index_type(policy, 1000) == "IVF_SQ8"
+
+
+@pytest.mark.parametrize("quantization, expected", [("SQ8", "IVF_SQ8"), ("PQ", "IVF_PQ")])
+def test_quantized_collections_skip_hnsw(quantization, expected):
+    policy = IndexPolicy(dim=16, flat_max_rows=100, quantization=quantization)
+    assert index_type(policy, 99) == "FLAT"
+    assert index_type(policy, 100) == expected
+    if quantization == "PQ":
+        assert policy.choose(100)["params"]["m"] == 2
+
+
+def test_nlist_grows_with_the_collection():
+    policy = IndexPolicy(flat_max_rows=0, hnsw_max_rows=0)
+    assert policy.choose(50_000)["params"]["nlist"] == 128
+    assert policy.choose(100_000)["params"]["nlist"] == 1024
+    assert policy.choose(5_000_000)["params"]["nlist"] == 4096
+
+
+def test_existing_indexes_further_up_the_ladder_are_kept():
+    policy = IndexPolicy(flat_max_rows=100, hnsw_max_rows=1000)
+    ivf = {"index_type": "IVF_FLAT", "metric_type": "L2", "params": {"nlist": 128}}
+    # As reported by Milvus: flat and as strings
+    reported_ivf = {"index_type": "IVF_FLAT", "metric_type": "L2", "nlist": "128"}
+
+    assert policy.is_compatible(reported_ivf, policy.choose(10))
+    assert policy.is_compatible(reported_ivf, ivf)
+    assert not policy.is_compatible(reported_ivf, policy.build_index_params("IVF_FLAT", 100_000))
+    assert not policy.is_compatible({"index_type": "FLAT", "metric_type": "L2"}, policy.choose(500))
+    assert not policy.is_compatible(dict(reported_ivf, metric_type="IP"), ivf)
+
+
+def test_search_params_match_the_index():
+    policy = IndexPolicy(min_nprobe=16, min_ef=64)
+    assert policy.search_params({"index_type": "FLAT", "metric_type": "L2"}) == {"metric_type": "L2", "params": {}}
+    assert policy.search_params({"index_type": "HNSW", "metric_type": "L2"}, top_k=100)["params"] == {"ef": 100}
+    assert policy.search_params({"index_type": "IVF_FLAT", "metric_type": "L2", "nlist": "4096"})["params"] == {"nprobe": 128}
+    assert policy.search_params({"index_type": "IVF_FLAT", "metric_type": "L2", "nlist": "8"})["params"] == {"nprobe": 8}
@@ -0,0 +1,78 @@
+import io
+import os
+import time
+
+import pytest
+
+from utils import IngestionQueue
+
+TENANT_ID = "0b6f3c52-3f0e-4d4a-9f5e-2f4b1c9d7a10"
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = IngestionQueue(path=str(tmp_path / "ingestion_jobs.sqlite3"), spool_dir=str(tmp_path / "spool"))
+    yield queue
+    queue.close()
+
+
+def submit(queue, filename, content, tenant_id=TENANT_ID):
+    path, content_hash = queue.spool(io.BytesIO(content))
+    return queue.submit(tenant_id, filename, content_hash, path)
+
+
+def test_resubmitting_a_file_returns_the_existing_job(queue):
+    job, created = submit(queue, "manual", b"version 1")
+    again, created_again = submit(queue, "manual", b"version 1")
+
+    assert created and not created_again
+    assert again["id"] == job["id"]
+    assert os.listdir(queue.spool_dir) == [os.path.basename(job["file_path"])]
+
+
+def test_expired_lease_is_claimed_by_another_worker(queue):
+    queue.lease_seconds = 0.05
+    job, _ = submit(queue, "manual", b"version 1")
+    [stale] = queue.claim()
+    time.sleep(0.1)
+
+    [current] = queue.claim()
+    assert current["id"] == job["id"]
+    assert current["lease_token"] != stale["lease_token"]
+    assert current["attempts"] == 2
+
+    # The outcome of the worker that lost the lease is ignored and the spooled file is kept
+    assert not queue.complete(job["id"], stale["lease_token"], "done")
+    assert not queue.fail(job["id"], stale["lease_token"], "boom")
+    queue.release(job["id"], stale["lease_token"])
+    assert queue.get(job["id"], TENANT_ID)["status"] == IngestionQueue.STATUS_RUNNING
+    assert os.path.exists(job["file_path"])
+
+    assert queue.complete(job["id"], current["lease_token"], "done")
+    assert queue.get(job["id"], TENANT_ID)["status"] == IngestionQueue.STATUS_SUCCEEDED
+    assert not os.path.exists(job["file_path"])
+
+
+def test_renewed_lease_is_not_claimed_again(queue):
+    queue.lease_seconds = 0.2
+    submit(queue, "manual", b"version 1")
+    [job] = queue.claim()
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.renew_lease(job["lease_token"]) == 1
+
+    assert queue.claim() == []
+
+
+def test_versions_of_a_file_are_claimed_one_at_a_time(queue):
+    first, _ = submit(queue, "manual", b"version 1")
+    second, _ = submit(queue, "manual", b"version 2")
+    other, _ = submit(queue, "guide", b"guide")
+
+    claimed = queue.claim(max_jobs=10)
+    assert [job["id"] for job in claimed] == [first["id"], other["id"]]
+    # Another worker does not get the second version while the first one runs
+    assert queue.claim(max_jobs=10) == []
+
+    queue.complete(first["id"], claimed[0]["lease_token"], "done")
+    assert [job["id"] for job in queue.claim(max_jobs=10)] == [second["id"]]
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from utils import LexicalIndex
+
+TENANT_ID = "0b6f3c52-3f0e-4d4a-9f5e-2f4b1c9d7a10"
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LexicalIndex(directory=str(tmp_path / "lexical_index"), max_segments=4)
+    yield index
+    index.close()
+
+
+def segment_names(index):
+    return sorted(name for name in os.listdir(os.path.join(index.directory, TENANT_ID)) if name.startswith("segment_"))
+
+
+def test_deleting_a_file_removes_its_chunks_from_every_segment(index):
+    index.add_documents(TENANT_ID, [1, 2], ["manual", "guide"], ["error code E42 pump", "pump maintenance guide"])
+    index.add_documents(TENANT_ID, [3], ["manual"], ["replace the E42 sensor"])
+    assert {result["id"] for result in index.search(TENANT_ID, "E42")} == {1, 3}
+
+    index.delete_file(TENANT_ID, "manual")
+    assert index.search(TENANT_ID, "E42") == []
+    assert [result["id"] for result in index.search(TENANT_ID, "pump")] == [2]
+    # The second segment only held the deleted file
+    assert segment_names(index) == ["segment_00000000"]
+
+    # A new version of the file is found, the chunks of the deleted one are not
+    index.add_documents(TENANT_ID, [4], ["manual"], ["error code E43 valve"])
+    assert [result["id"] for result in index.search(TENANT_ID, "error code")] == [4]
+
+
+def test_merging_segments_drops_the_chunks_of_deleted_files(index):
+    for chunk_id in range(1, 5):
+        index.add_documents(TENANT_ID, [chunk_id], [f"file{chunk_id}"], [f"shared term {chunk_id}"])
+    index.add_documents(TENANT_ID, [10], ["other"], ["other shared"])
+    index.delete_file(TENANT_ID, "other")
+    index.add_documents(TENANT_ID, [5], ["file5"], ["shared term 5"])
+
+    assert len(segment_names(index)) <= index.max_segments
+    assert {result["id"] for result in index.search(TENANT_ID, "shared", top_k=10)} == {1, 2, 3, 4, 5}
+
+
+def test_other_processes_see_the_changes(index):
+    other_process = LexicalIndex(directory=index.directory)
+    try:
+        index.add_documents(TENANT_ID, [1], ["manual"], ["error code E42"])
+        assert [result["id"] for result in other_process.search(TENANT_ID, "E42")] == [1]
+        index.delete_file(TENANT_ID, "manual")
+        assert other_process.search(TENANT_ID, "E42") == []
+    finally:
+        other_process.close()
+
+
+def test_search_can_be_restricted_to_filenames(index):
+    index.add_documents(TENANT_ID, [1, 2], ["manual", "guide"], ["pump E42", "pump E42 guide"])
+    assert [result["filename"] for result in index.search(TENANT_ID, "E42", filenames=["manual"])] == ["manual"]
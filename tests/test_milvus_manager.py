@@ -0,0 +1,303 @@
+import itertools
+import json
+import re
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from pymilvus import DataType, FieldSchema
+
+from utils import FileManifest, IndexPolicy, MilvusManager
+
+TENANT_ID = "0b6f3c52-3f0e-4d4a-9f5e-2f4b1c9d7a10"
+FIELDS = [
+    FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+    FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=4),
+    FieldSchema(name="filename", dtype=DataType.VARCHAR, max_length=255),
+    FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
+]
+
+
+@pytest.fixture
+def shared_collection(monkeypatch):
+    """The shared collection, as a mock standing in for the Milvus server."""
+    module = sys.modules[MilvusManager.__module__]
+    collection = MagicMock()
+    collection.name = "tenants_shared"
+    collection.describe.return_value = {"collection_name": "tenants_shared"}
+    collection.query.return_value = []
+    collection.insert.side_effect = lambda data: SimpleNamespace(primary_keys=list(range(len(data[0]))))
+    monkeypatch.setattr(module.connections, "connect", lambda **kwargs: None)
+    monkeypatch.setattr(module.utility, "has_collection", lambda name, using=None: name == collection.name)
+    monkeypatch.setattr(module, "Collection", lambda *args, **kwargs: collection)
+    return collection
+
+
+@pytest.fixture
+def manager(shared_collection, tmp_path):
+    manager = MilvusManager(storage_mode=MilvusManager.STORAGE_MODE_PARTITION_KEY,
+                            file_manifest=FileManifest(path=str(tmp_path / "file_manifest.sqlite3")))
+    shared_collection.schema = manager.get_shared_schema(FIELDS)
+    yield manager
+    manager.close()
+    manager.file_manifest.close()
+
+
+def test_partition_key_tenants_list_files_from_the_manifest(manager, shared_collection):
+    manager.create_tenant_collection(TENANT_ID, FIELDS)
+    assert manager.file_manifest.get_revision(TENANT_ID) is not None
+    assert manager.list_files(TENANT_ID) == []
+
+    manager.insert_data(TENANT_ID, [[[0.1] * 4] * 3, ["a", "a", "b"], ["x", "y", "z"]],
+                        content_hashes={"a": "hash-a"}, file_sizes={"a": 10})
+    assert [(file["filename"], file["chunks"], file["content_hash"]) for file in manager.list_file_details(TENANT_ID)] == [
+        ("a", 2, "hash-a"), ("b", 1, None)]
+    assert manager.get_file_hash(TENANT_ID, "a") == (True, "hash-a")
+    # Only the registration looked at the collection: listings and duplicate checks do not scan it
+    assert shared_collection.query.call_count == 1
+
+
+def test_partition_key_tenant_with_rows_is_left_to_the_backfill(manager, shared_collection):
+    shared_collection.query.return_value = [{"id": 1}]
+    manager.create_tenant_collection(TENANT_ID, FIELDS)
+    assert manager.file_manifest.get_revision(TENANT_ID) is None
+
+
+class FakeMilvus:
+    """A Milvus server holding collections, aliases, rows and indexes in memory, for index migrations."""
+
+    def __init__(self):
+        self.collections = {}  # name -> SimpleNamespace(schema, rows, index, loaded)
+        self.aliases = {}
+        self.searches = []  # (collection name, search parameters)
+        self.on_index_build = None
+        self.on_alias = None
+        self._next_id = itertools.count(1)
+
+    def resolve(self, name):
+        return self.aliases.get(name, name)
+
+    def has_collection(self, name, using=None):
+        return self.resolve(name) in self.collections
+
+    def list_collections(self, using=None):
+        return list(self.collections)
+
+    def drop_collection(self, name, using=None):
+        assert name not in self.aliases.values(), "collections with an alias cannot be dropped"
+        del self.collections[name]
+
+    def rename_collection(self, old_name, new_name, using=None):
+        self.collections[new_name] = self.collections.pop(old_name)
+
+    def create_alias(self, collection_name, alias, using=None):
+        assert alias not in self.collections and alias not in self.aliases
+        self.aliases[alias] = collection_name
+        if self.on_alias:
+            self.on_alias()
+
+    def alter_alias(self, collection_name, alias, using=None):
+        self.aliases[alias] = collection_name
+        if self.on_alias:
+            self.on_alias()
+
+    def drop_alias(self, alias, using=None):
+        del self.aliases[alias]
+
+    def wait_for_index_building_complete(self, name, using=None):
+        if self.on_index_build:
+            self.on_index_build()
+
+
+class FakeCollection:
+    def __init__(self, milvus, name, schema=None, using=None, num_partitions=None):
+        self.milvus = milvus
+        self.name = name
+        self._using = using
+        if schema is not None and not milvus.has_collection(name):
+            milvus.collections[name] = SimpleNamespace(schema=schema, rows={}, index=None, loaded=False)
+        assert milvus.has_collection(name)
+
+    @property
+    def data(self):
+        return self.milvus.collections[self.milvus.resolve(self.name)]
+
+    @property
+    def schema(self):
+        return self.data.schema
+
+    @property
+    def num_entities(self):
+        return len(self.data.rows)
+
+    @property
+    def partitions(self):
+        return []
+
+    def describe(self):
+        return {"collection_name": self.milvus.resolve(self.name)}
+
+    def has_index(self):
+        return self.data.index is not None
+
+    def index(self):
+        return SimpleNamespace(params=self.data.index)
+
+    def create_index(self, field_name, index_params):
+        self.data.index = index_params
+
+    def load(self):
+        self.data.loaded = True
+
+    def release(self):
+        self.data.loaded = False
+
+    def flush(self):
+        pass
+
+    def insert(self, columns):
+        fields = [field for field in self.schema.fields if not (field.is_primary and field.auto_id)]
+        rows = [dict(zip([field.name for field in fields], values)) for values in zip(*columns)]
+        for row in rows:
+            row.setdefault("id", next(self.milvus._next_id))
+            self.data.rows[row["id"]] = row
+        return SimpleNamespace(primary_keys=[row["id"] for row in rows])
+
+    @staticmethod
+    def matches(row, expr):
+        for field, value in re.findall(r'(\w+) (?:==|in) ("[^"]*"|\[[^\]]*\])', expr or ""):
+            value = json.loads(value)
+            if row[field] not in (value if isinstance(value, list) else [value]):
+                return False
+        return True
+
+    def query(self, expr, output_fields, limit=None, consistency_level=None):
+        rows = [row for row in self.data.rows.values() if self.matches(row, expr)][:limit]
+        return [{field: row[field] for field in output_fields} for row in rows]
+
+    def query_iterator(self, batch_size, expr, output_fields, consistency_level=None):
+        batches = iter([self.query(expr, output_fields), []])
+        return SimpleNamespace(next=lambda: next(batches), close=lambda: None)
+
+    def delete(self, expr):
+        ids = [row_id for row_id, row in self.data.rows.items() if self.matches(row, expr)]
+        for row_id in ids:
+            del self.data.rows[row_id]
+        return SimpleNamespace(delete_count=len(ids))
+
+    def search(self, data, anns_field, param, limit, expr, output_fields):
+        assert self.data.loaded, "collection not loaded"
+        self.milvus.searches.append((self.milvus.resolve(self.name), param))
+        return [[] for _ in data]
+
+
+@pytest.fixture
+def milvus(monkeypatch):
+    milvus = FakeMilvus()
+    module = sys.modules[MilvusManager.__module__]
+    monkeypatch.setattr(module.connections, "connect", lambda **kwargs: None)
+    for name in ("has_collection", "list_collections", "drop_collection", "rename_collection", "create_alias",
+                 "alter_alias", "drop_alias", "wait_for_index_building_complete"):
+        monkeypatch.setattr(module.utility, name, getattr(milvus, name))
+    monkeypatch.setattr(module, "Collection", lambda *args, **kwargs: FakeCollection(milvus, *args, **kwargs))
+    return milvus
+
+
+def make_manager(tmp_path, **kwargs):
+    # Migrations swap at once, and every call checks which collection the name points to
+    return MilvusManager(index_policy=IndexPolicy(dim=4, flat_max_rows=5, hnsw_max_rows=8), migration_grace_period=0,
+                         alias_check_interval=0, migration_lock_dir=str(tmp_path / "locks"), **kwargs)
+
+
+def chunks(filename, count):
+    return [[[0.1] * 4] * count, [filename] * count, ["text"] * count]
+
+
+def wait_for_migrations(manager):
+    manager._migration_executor.submit(lambda: None).result()
+
+
+def test_shared_collection_keeps_serving_during_its_index_migration(milvus, tmp_path):
+    manager = make_manager(tmp_path, storage_mode=MilvusManager.STORAGE_MODE_PARTITION_KEY)
+    other_worker = make_manager(tmp_path, storage_mode=MilvusManager.STORAGE_MODE_PARTITION_KEY)
+    manager.create_tenant_collection(TENANT_ID, FIELDS)
+    ids = manager.insert_data(TENANT_ID, chunks("a", 4), flush=True)
+    other_worker.search(TENANT_ID, [[0.1] * 4])
+
+    def during_index_build():
+        # The collection is neither released nor missing its index: other workers search and write as usual
+        assert milvus.collections["tenants_shared"].loaded
+        other_worker.search(TENANT_ID, [[0.1] * 4])
+        ids.extend(other_worker.insert_data(TENANT_ID, chunks("b", 1)))
+        other_worker.delete_chunks(TENANT_ID, "a", ids[:2])
+
+    milvus.on_index_build = during_index_build
+    ids.extend(manager.insert_data(TENANT_ID, chunks("c", 2), flush=True))
+    wait_for_migrations(manager)
+
+    assert milvus.aliases == {"tenants_shared": "tenants_shared__v1"}
+    assert list(milvus.collections) == ["tenants_shared__v1"]
+    migrated = milvus.collections["tenants_shared__v1"]
+    assert migrated.index["index_type"] == "HNSW"
+    # Rows keep their ids; the writes made during the copy are carried over
+    assert set(migrated.rows) == set(ids[2:])
+    assert {row["tenant_id"] for row in migrated.rows.values()} == {manager._get_tenant_key(TENANT_ID)}
+
+    # The other worker moves to the new collection and its index
+    other_worker.search(TENANT_ID, [[0.1] * 4])
+    assert milvus.searches[-1][0] == "tenants_shared__v1"
+    assert "ef" in milvus.searches[-1][1]["params"]
+    # New rows get ids of their own, the collection no longer generates them
+    new_ids = other_worker.insert_data(TENANT_ID, chunks("d", 2))
+    assert len(set(new_ids) | set(ids)) == len(ids) + 2
+    assert manager.list_collections() == ["tenants_shared"]
+
+
+def test_writes_to_the_previous_collection_are_carried_over(milvus, tmp_path):
+    manager = make_manager(tmp_path)
+    manager.create_tenant_collection(TENANT_ID, FIELDS)
+    collection_name = manager._get_collection_name(TENANT_ID)
+    ids = manager.insert_data(TENANT_ID, chunks("a", 4), flush=True)
+
+    def stale_worker_writes():
+        # A worker still holding the previous collection writes to it after the swap
+        previous = FakeCollection(milvus, next(name for name in milvus.collections if name != milvus.aliases[collection_name]))
+        columns = chunks("b", 1) if previous.schema.auto_id else [[next(milvus._next_id)]] + chunks("b", 1)
+        ids.extend(previous.insert(columns).primary_keys)
+        previous.delete(expr=f"id in [{ids.pop(0)}]")
+
+    milvus.on_alias = stale_worker_writes
+    ids.extend(manager.insert_data(TENANT_ID, chunks("c", 1), flush=True))
+    wait_for_migrations(manager)
+    assert milvus.aliases == {collection_name: f"{collection_name}__v1"}
+    assert set(milvus.collections[f"{collection_name}__v1"].rows) == set(ids)
+
+    # Later migrations move the alias to the next version
+    ids.extend(manager.insert_data(TENANT_ID, chunks("d", 3), flush=True))
+    wait_for_migrations(manager)
+    assert milvus.aliases == {collection_name: f"{collection_name}__v2"}
+    assert list(milvus.collections) == [f"{collection_name}__v2"]
+    assert milvus.collections[f"{collection_name}__v2"].index["index_type"] == "IVF_FLAT"
+    assert set(milvus.collections[f"{collection_name}__v2"].rows) == set(ids)
+
+    manager.drop_tenant_collection(TENANT_ID)
+    assert milvus.collections == {} and milvus.aliases == {}
+
+
+def test_one_process_at_a_time_migrates_an_index(milvus, tmp_path):
+    manager = make_manager(tmp_path)
+    other_process = make_manager(tmp_path)
+    manager.create_tenant_collection(TENANT_ID, FIELDS)
+    collection_name = manager._get_collection_name(TENANT_ID)
+
+    with other_process._migration_file_lock(collection_name) as locked:
+        assert locked
+        manager.insert_data(TENANT_ID, chunks("a", 5), flush=True)
+        wait_for_migrations(manager)
+        assert list(milvus.collections) == [collection_name] and milvus.aliases == {}
+
+    # The next flush migrates once the lock is free
+    manager.flush(TENANT_ID)
+    wait_for_migrations(manager)
+    assert milvus.aliases == {collection_name: f"{collection_name}__v1"}
@@ -0,0 +1,38 @@
+from utils import SemanticCache
+
+TENANT_ID = "0b6f3c52-3f0e-4d4a-9f5e-2f4b1c9d7a10"
+QUERY = [1.0, 0.0, 0.0]
+SIMILAR_QUERY = [0.99, 0.05, 0.0]
+
+
+def test_lookup_matches_similar_queries_of_the_same_scope():
+    cache = SemanticCache(similarity_threshold=0.95)
+    cache.store(TENANT_ID, QUERY, "answer", scope=(5,))
+    assert cache.lookup(TENANT_ID, SIMILAR_QUERY, scope=(5,)) == "answer"
+    assert cache.lookup(TENANT_ID, SIMILAR_QUERY, scope=(3,)) is None
+    assert cache.lookup(TENANT_ID, [0.0, 1.0, 0.0], scope=(5,)) is None
+
+
+def test_invalidate_and_generation():
+    cache = SemanticCache()
+    generation = cache.get_generation(TENANT_ID)
+    cache.store(TENANT_ID, QUERY, "answer", generation=generation)
+    cache.invalidate(TENANT_ID)
+    assert cache.lookup(TENANT_ID, QUERY) is None
+    # Computed before the invalidation
+    cache.store(TENANT_ID, QUERY, "stale", generation=generation)
+    assert cache.lookup(TENANT_ID, QUERY) is None
+
+
+def test_answers_of_another_revision_are_dropped():
+    # Another worker changed the files: the manifest revision moved from 3 to 4
+    cache = SemanticCache()
+    cache.store(TENANT_ID, QUERY, "answer", revision=3)
+    assert cache.lookup(TENANT_ID, QUERY, revision=3) == "answer"
+    assert cache.lookup(TENANT_ID, QUERY, revision=4) is None
+    assert cache.lookup(TENANT_ID, QUERY, revision=3) is None
+
+    cache.store(TENANT_ID, QUERY, "new answer", revision=4)
+    # An answer computed before the change does not replace the newer entries
+    cache.store(TENANT_ID, SIMILAR_QUERY, "stale", revision=3)
+    assert cache.lookup(TENANT_ID, SIMILAR_QUERY, revision=4) == "new answer"
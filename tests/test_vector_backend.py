@@ -0,0 +1,12 @@
+import pytest
+
+from utils import VectorBackend
+
+
+def test_backend_missing_a_method_cannot_be_created():
+    class PartialBackend(VectorBackend):
+        def create_tenant_collection(self, tenant_id, fields):
+            return tenant_id
+
+    with pytest.raises(TypeError, match="search_batch"):
+        PartialBackend()
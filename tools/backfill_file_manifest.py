@@ -0,0 +1,144 @@
+"""
+Build the file manifest of tenants whose collections were created before the manifest existed,
+so that listing their files reads one row per file instead of scanning their chunks.
+
+Usage (from the repository root):
+    python -m tools.backfill_file_manifest --host 127.0.0.1 --port 19530 [--manifest-path file_manifest.sqlite3]
+        [--storage-mode collection|partition_key] [--tenant TENANT_ID ...] [--dry-run]
+
+Re-running the tool is safe: the chunk counts of the scanned tenants are replaced, sizes, hashes
+and upload times already recorded are kept, and files uploaded while the scan ran are kept.
+Sizes and hashes of files uploaded before the manifest existed stay unknown.
+"""
+import argparse
+import json
+import logging
+import re
+import time
+from collections import Counter, defaultdict
+
+from pymilvus import Collection
+
+from utils import FileManifest, MilvusManager
+
+# Collection names and partition keys hold the tenant UUID with its hyphens replaced by underscores
+_SANITIZED_UUID_PATTERN = re.compile(r"^[0-9a-f]{8}_[0-9a-f]{4}_[0-9a-f]{4}_[0-9a-f]{4}_[0-9a-f]{12}$")
+
+
+def tenant_id_from_key(key):
+    """
+    Recover the tenant id the API uses from a sanitized collection suffix or partition key.
+    """
+    return key.replace("_", "-") if _SANITIZED_UUID_PATTERN.match(key) else key
+
+
+def count_chunks(collection, expr="", group_field=None, batch_size=1000):
+    """
+    Count the chunks of each file in a collection.
+
+    :param collection: The loaded Collection.
+    :param expr: Filter expression restricting the scanned rows.
+    :param group_field: Optional field the counts are grouped by (the tenant field of a shared collection).
+    :param batch_size: Number of rows read per batch.
+    :return: Dict of group value -> {filename: chunk count}, with a single None group when group_field is not set.
+    """
+    counts = defaultdict(Counter)
+    output_fields = ["filename"] + ([group_field] if group_field else [])
+    iterator = collection.query_iterator(batch_size=batch_size, expr=expr, output_fields=output_fields)
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            for row in rows:
+                counts[row[group_field] if group_field else None][row["filename"]] += 1
+    finally:
+        iterator.close()
+    return counts
+
+
+def backfill_tenant_collections(milvus_manager, manifest, tenant_ids=None, batch_size=1000, dry_run=False):
+    """
+    Backfill the manifest from the tenant_* collections ("collection" storage mode).
+
+    :return: Number of tenants backfilled.
+    """
+    collection_names = sorted(name for name in milvus_manager.list_collections() if name.startswith("tenant_"))
+    backfilled = 0
+    for collection_name in collection_names:
+        tenant_id = tenant_id_from_key(collection_name[len("tenant_"):])
+        if tenant_ids and tenant_id not in tenant_ids:
+            continue
+        if dry_run:
+            logging.info(f"Would backfill tenant {tenant_id} from {collection_name}.")
+            continue
+
+        scan_started_at = time.time()
+        collection = Collection(collection_name)
+        collection.load()
+        chunk_counts = count_chunks(collection, batch_size=batch_size).get(None, {})
+        manifest.backfill(tenant_id, dict(chunk_counts), scan_started_at)
+        backfilled += 1
+        logging.info(f"Backfilled {len(chunk_counts)} files of tenant {tenant_id}.")
+    return backfilled
+
+
+def backfill_shared_collection(milvus_manager, manifest, tenant_ids=None, batch_size=1000, dry_run=False):
+    """
+    Backfill the manifest from the shared collection ("partition_key" storage mode) in one scan.
+
+    :return: Number of tenants backfilled.
+    """
+    expr = ""
+    if tenant_ids:
+        keys = [milvus_manager._get_tenant_key(tenant_id) for tenant_id in tenant_ids]
+        expr = f"{MilvusManager.TENANT_FIELD} in {json.dumps(keys)}"
+
+    scan_started_at = time.time()
+    collection = Collection(milvus_manager.shared_collection_name)
+    collection.load()
+    counts = count_chunks(collection, expr=expr, group_field=MilvusManager.TENANT_FIELD, batch_size=batch_size)
+
+    for tenant_key, chunk_counts in sorted(counts.items()):
+        tenant_id = tenant_id_from_key(tenant_key)
+        if dry_run:
+            logging.info(f"Would backfill {len(chunk_counts)} files of tenant {tenant_id}.")
+            continue
+        manifest.backfill(tenant_id, dict(chunk_counts), scan_started_at)
+        logging.info(f"Backfilled {len(chunk_counts)} files of tenant {tenant_id}.")
+    return 0 if dry_run else len(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the file manifest of existing tenant collections.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", default="19530")
+    parser.add_argument("--manifest-path", default="file_manifest.sqlite3")
+    parser.add_argument("--storage-mode", default=MilvusManager.STORAGE_MODE_COLLECTION,
+                        choices=[MilvusManager.STORAGE_MODE_COLLECTION, MilvusManager.STORAGE_MODE_PARTITION_KEY])
+    parser.add_argument("--shared-collection", default="tenants_shared")
+    parser.add_argument("--tenant", action="append", help="Only backfill this tenant (repeatable).")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Only list the tenants that would be backfilled.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    milvus_manager = MilvusManager(host=args.host, port=args.port, storage_mode=args.storage_mode,
+                                   shared_collection_name=args.shared_collection)
+    milvus_manager.connect()
+    manifest = FileManifest(path=args.manifest_path)
+    try:
+        if args.storage_mode == MilvusManager.STORAGE_MODE_PARTITION_KEY:
+            backfilled = backfill_shared_collection(milvus_manager, manifest, tenant_ids=args.tenant,
+                                                    batch_size=args.batch_size, dry_run=args.dry_run)
+        else:
+            backfilled = backfill_tenant_collections(milvus_manager, manifest, tenant_ids=args.tenant,
+                                                     batch_size=args.batch_size, dry_run=args.dry_run)
+        logging.info(f"Backfilled the file manifest of {backfilled} tenants.")
+    finally:
+        manifest.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Measure the recall and memory of compact storage settings on a tenant's own chunks, before switching
+MILVUS_VECTOR_TYPE, MILVUS_VECTOR_DIM, MILVUS_INDEX_QUANTIZATION or MILVUS_TEXT_COMPRESSION.
+
+A sample of the tenant's chunks is held out as queries. Their exact nearest neighbours among the
+other chunks are computed with numpy on the stored vectors; then, for every combination of vector
+type, dimension and quantization, the chunks are copied into a scratch collection with that storage
+and the index the policy would build, and the same queries are searched there. The report gives
+recall@k against the exact neighbours and the estimated memory of the loaded collection, plus the
+size of the tenant's texts with and without compression.
+
+Usage (from the repository root):
+    python -m tools.compact_storage_recall --host 127.0.0.1 --port 19530 --tenant TENANT_ID
+        [--vector-type float32 --vector-type float16] [--dim 1536 --dim 512] [--quantization none --quantization SQ8]
+        [--storage-mode collection|partition_key] [--queries 200] [--top-k 10] [--output report.json]
+
+Quantized indexes are built whatever the tenant's size; IVF_PQ needs a few thousand chunks to train.
+"""
+import argparse
+import itertools
+import json
+import logging
+
+import numpy as np
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+from utils import IndexPolicy, MilvusManager, VectorStorage
+
+
+def read_tenant_chunks(milvus_manager, tenant_id, batch_size=1000):
+    """
+    Read the vectors and texts of all the chunks of a tenant.
+
+    :return: Tuple of (float32 array of the vectors, list of the texts).
+    """
+    rows = milvus_manager._query_all(tenant_id, "", ["id", "vector", "text"], batch_size=batch_size)
+    vectors = np.array([VectorStorage.decode_vector(row["vector"]) for row in rows], dtype=np.float32)
+    return vectors, [VectorStorage.decode_text(row["text"]) for row in rows]
+
+
+def exact_neighbours(vectors, queries, top_k, batch_size=64):
+    """Indexes of the top_k nearest vectors (L2) of each query, by brute force."""
+    squared_norms = (vectors ** 2).sum(axis=1)
+    neighbours = []
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        distances = squared_norms[None, :] - 2 * batch @ vectors.T
+        nearest = np.argpartition(distances, top_k, axis=1)[:, :top_k]
+        neighbours.extend(set(row.tolist()) for row in nearest)
+    return neighbours
+
+
+def measure_storage(name, storage, policy, index_type, corpus, queries, neighbours, top_k, batch_size=2000):
+    """
+    Copy the corpus into a scratch collection with the given storage and index, and measure the recall
+    of the queries against their exact neighbours.
+
+    :return: Dict with the index parameters, recall and estimated memory.
+    """
+    if utility.has_collection(name):
+        utility.drop_collection(name)
+    fields = [FieldSchema(name="id", dtype=DataType.INT64, is_primary=True), storage.vector_field(name="vector")]
+    collection = Collection(name=name, schema=CollectionSchema(fields, description="Compact storage recall"))
+    vector_field = VectorStorage.get_vector_field(collection.schema)
+    index_params = policy.build_index_params(index_type, len(corpus))
+    try:
+        for start in range(0, len(corpus), batch_size):
+            batch = corpus[start:start + batch_size]
+            collection.insert([list(range(start, start + len(batch))), storage.encode_vectors(list(batch), vector_field)])
+        collection.flush()
+        collection.create_index(field_name="vector", index_params=index_params)
+        utility.wait_for_index_building_complete(name)
+        collection.load()
+
+        hits = 0
+        search_params = policy.search_params(index_params, top_k)
+        for start in range(0, len(queries), batch_size):
+            results = collection.search(data=storage.encode_vectors(list(queries[start:start + batch_size]), vector_field),
+                                        anns_field="vector", param=search_params, limit=top_k)
+            for result, expected in zip(results, neighbours[start:start + batch_size]):
+                hits += len(expected.intersection(hit.id for hit in result))
+    finally:
+        utility.drop_collection(name)
+
+    return {
+        "index_params": index_params,
+        "recall": round(hits / (len(queries) * top_k), 4),
+        "estimated_vector_memory_mb": round(policy.estimate_memory(index_type, len(corpus)) / 2**20, 2),
+    }
+
+
+def measure_texts(texts):
+    """Total size of the texts as stored plainly and zlib-compressed."""
+    compressed = VectorStorage(text_compression="zlib")
+    plain_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    compressed_bytes = sum(len(compressed.encode_text(text).encode("utf-8")) for text in texts)
+    return {
+        "plain_mb": round(plain_bytes / 2**20, 2),
+        "zlib_mb": round(compressed_bytes / 2**20, 2),
+        "ratio": round(plain_bytes / compressed_bytes, 2) if compressed_bytes else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the recall of compact storage settings on a tenant's chunks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", default="19530")
+    parser.add_argument("--tenant", required=True, help="Tenant whose chunks are measured.")
+    parser.add_argument("--storage-mode", default=MilvusManager.STORAGE_MODE_COLLECTION,
+                        choices=[MilvusManager.STORAGE_MODE_COLLECTION, MilvusManager.STORAGE_MODE_PARTITION_KEY])
+    parser.add_argument("--shared-collection", default="tenants_shared")
+    parser.add_argument("--vector-type", action="append", choices=list(VectorStorage.VECTOR_TYPES),
+                        help="Vector type to measure (repeatable, float32 and float16 by default).")
+    parser.add_argument("--dim", action="append", type=int,
+                        help="Stored dimension to measure (repeatable, the full dimension by default).")
+    parser.add_argument("--quantization", action="append", choices=["none"] + list(IndexPolicy.QUANTIZED_INDEXES),
+                        help="Index quantization to measure (repeatable, none by default).")
+    parser.add_argument("--queries", type=int, default=200, help="Number of chunks held out as queries.")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--collection-prefix", default="compact_storage_recall")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    milvus_manager = MilvusManager(host=args.host, port=args.port, storage_mode=args.storage_mode,
+                                   shared_collection_name=args.shared_collection)
+    milvus_manager.connect()
+    vectors, texts = read_tenant_chunks(milvus_manager, args.tenant)
+    if len(vectors) <= args.queries + args.top_k:
+        raise SystemExit(f"Tenant {args.tenant} has {len(vectors)} chunks, too few for {args.queries} queries.")
+    embedding_dim = vectors.shape[1]
+    logging.info(f"Read {len(vectors)} chunks of dimension {embedding_dim} of tenant {args.tenant}.")
+
+    order = np.random.default_rng(args.seed).permutation(len(vectors))
+    queries, corpus = vectors[order[:args.queries]], vectors[order[args.queries:]]
+    neighbours = exact_neighbours(corpus, queries, args.top_k)
+
+    results = []
+    combinations = itertools.product(args.vector_type or ["float32", "float16"], args.dim or [embedding_dim],
+                                     args.quantization or ["none"])
+    for i, (vector_type, dim, quantization) in enumerate(combinations):
+        setting = {"vector_type": vector_type, "dim": dim, "quantization": quantization}
+        storage = VectorStorage(vector_type=vector_type, embedding_dim=embedding_dim, dim=dim)
+        policy = IndexPolicy(dim=storage.dim, bytes_per_dim=storage.bytes_per_dim,
+                             quantization=None if quantization == "none" else quantization)
+        index_type = (IndexPolicy.QUANTIZED_INDEXES[quantization] if quantization != "none"
+                      else policy.choose(len(corpus))["index_type"])
+        logging.info(f"Measuring {setting} with {index_type}.")
+        try:
+            setting.update(measure_storage(f"{args.collection_prefix}_{i}", storage, policy, index_type,
+                                           corpus, queries, neighbours, args.top_k))
+        except Exception as e:
+            logging.error(f"Measuring {setting} failed: {e}")
+            setting["error"] = str(e)
+        results.append(setting)
+
+    report = {
+        "config": vars(args),
+        "tenant_chunks": len(vectors),
+        "embedding_dim": embedding_dim,
+        "settings": results,
+        "texts": measure_texts(texts),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Move tenant_* collections into the shared partition-key collection used by
+MilvusManager(storage_mode="partition_key").
+
+Usage (from the repository root):
+    python -m tools.migrate_to_partition_key --host 127.0.0.1 --port 19530 [--drop-source] [--dry-run]
+
+Re-running the tool is safe: rows a tenant already has in the shared collection are
+deleted before its collection is copied again.
+"""
+import argparse
+import logging
+
+from pymilvus import Collection
+
+from utils import MilvusManager
+
+
+def migrate_collection(milvus_manager, source_name, batch_size=1000, drop_source=False):
+    """
+    Copy one tenant collection into the shared collection and verify the row count.
+
+    :param milvus_manager: MilvusManager in "partition_key" mode.
+    :param source_name: Name of the tenant_* collection.
+    :param batch_size: Number of rows copied per batch.
+    :param drop_source: Drop the source collection once the copy is verified.
+    :return: Number of rows copied.
+    """
+    tenant_id = source_name[len("tenant_"):]
+    source = Collection(source_name)
+    source.load()
+
+    # The first migrated collection defines the shared schema
+    copied_fields = [field for field in source.schema.fields if not field.auto_id]
+    milvus_manager.create_tenant_collection(tenant_id=tenant_id, fields=source.schema.fields)
+    shared, _ = milvus_manager._get_collection(tenant_id)
+
+    # Start from a clean slate in case a previous run was interrupted
+    shared.delete(expr=milvus_manager._tenant_filter(tenant_id))
+
+    copied = 0
+    iterator = source.query_iterator(batch_size=batch_size, expr="", output_fields=[field.name for field in copied_fields])
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            milvus_manager.insert_data(tenant_id=tenant_id, data=[[row[field.name] for row in rows] for field in copied_fields])
+            copied += len(rows)
+    finally:
+        iterator.close()
+
+    milvus_manager.flush(tenant_id)
+    # Strong consistency, so the counts see the delete and inserts above
+    expected = source.query(expr="", output_fields=["count(*)"], consistency_level="Strong")[0]["count(*)"]
+    migrated = shared.query(expr=milvus_manager._tenant_filter(tenant_id), output_fields=["count(*)"],
+                            consistency_level="Strong")[0]["count(*)"]
+    if migrated != expected:
+        raise Exception(f"Row count mismatch for {source_name}: {expected} in source, {migrated} migrated.")
+
+    if drop_source:
+        source.release()
+        milvus_manager.drop_collection(source_name)
+        logging.info(f"Collection {source_name} dropped after migration.")
+
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate tenant_* collections into the shared partition-key collection.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", default="19530")
+    parser.add_argument("--shared-collection", default="tenants_shared")
+    parser.add_argument("--num-partitions", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--drop-source", action="store_true", help="Drop each tenant collection after a verified copy.")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the collections that would be migrated.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    milvus_manager = MilvusManager(host=args.host, port=args.port, storage_mode=MilvusManager.STORAGE_MODE_PARTITION_KEY,
+                                   shared_collection_name=args.shared_collection, num_partitions=args.num_partitions)
+    milvus_manager.connect()
+    source_names = sorted(name for name in milvus_manager.list_collections() if name.startswith("tenant_"))
+    logging.info(f"{len(source_names)} tenant collections to migrate.")
+
+    for source_name in source_names:
+        if args.dry_run:
+            logging.info(f"Would migrate {source_name}.")
+            continue
+        copied = migrate_collection(milvus_manager, source_name, batch_size=args.batch_size, drop_source=args.drop_source)
+        logging.info(f"Migrated {copied} rows from {source_name}.")
+
+
+if __name__ == "__main__":
+    main()
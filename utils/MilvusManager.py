@@ -1,20 +1,358 @@
+import fcntl
+import itertools
+import json
 import logging
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
 import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from pymilvus import (
     connections, Collection, CollectionSchema, FieldSchema, DataType, utility
 )
+from .filename_index import FilenameIndex
+from .index_policy import IndexPolicy
+from .vector_backend import VectorBackend
+from .vector_storage import VectorStorage
 
 
-class MilvusManager:
-    def __init__(self, host="127.0.0.1", port="19530"):
-        # Connect to Milvus server
-        connections.connect(host=host, port=port, db_name="my_database")
+class MilvusManager(VectorBackend):
+    # (minimum row count, nlist) pairs of the IVF indexes, sorted by row count
+    DEFAULT_NLIST_TIERS = IndexPolicy.DEFAULT_NLIST_TIERS
+    # Storage modes: one collection per tenant, or all tenants in one collection partitioned by tenant_id
+    STORAGE_MODE_COLLECTION = "collection"
+    STORAGE_MODE_PARTITION_KEY = "partition_key"
+    TENANT_FIELD = "tenant_id"
+    _TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+    # Maximum number of rows Milvus returns from a single query
+    QUERY_WINDOW = 16384
+    # Per-chunk fields used to diff updated documents; collections created before them lack these fields
+    CHUNK_FIELDS = ("chunk_hash", "page_number", "chunk_index")
+    # Alias of the first pooled connection. It is the pymilvus default, so the utility functions and
+    # Collection handles of code that does not pass an alias (e.g. the tools) share it
+    DEFAULT_ALIAS = "default"
+    # Index migrations build a new version of a collection, named <name>__v<N>, and serve it under an alias of the name
+    _VERSION_PATTERN = re.compile(r"__v(\d+)$")
+
+    def __init__(self, host="127.0.0.1", port="19530", max_loaded_collections=256, collection_ttl=1800,
+                 flush_threshold_rows=5000, flush_interval=60, index_nlist_tiers=DEFAULT_NLIST_TIERS,
+                 storage_mode=STORAGE_MODE_COLLECTION, shared_collection_name="tenants_shared", num_partitions=64,
+                 metrics=None, max_insert_rows=2000, max_indexed_tenants=10000, file_manifest=None,
+                 index_policy=None, vector_storage=None, db_name="my_database",
+                 connection_pool_size=2, connect_timeout=10, health_check_interval=30, filename_index_ttl=60,
+                 alias_check_interval=10, migration_grace_period=60, migration_lock_dir=None):
+        """
+        :param host: Milvus server host.
+        :param port: Milvus server port.
+        :param max_loaded_collections: Maximum number of tenant collections kept loaded by this manager.
+        :param collection_ttl: Seconds after which an unused tenant collection is released.
+        :param flush_threshold_rows: Number of unflushed rows in a collection that triggers a flush.
+        :param flush_interval: Seconds after which unflushed rows are flushed on the next insert.
+        :param index_nlist_tiers: (minimum row count, nlist) pairs of the IVF indexes of the default index policy.
+        :param storage_mode: "collection" for one collection per tenant, or "partition_key" to keep all
+                             tenants in one shared collection with a partition key on tenant_id.
+        :param shared_collection_name: Name of the shared collection in "partition_key" mode.
+        :param num_partitions: Number of partitions of the shared collection.
+        :param metrics: Optional Metrics registry receiving the flush and index build times.
+        :param max_insert_rows: Maximum number of rows sent to Milvus in one insert request.
+        :param max_indexed_tenants: Number of tenants whose filenames are kept in the in-memory filename index.
+        :param file_manifest: Optional FileManifest kept up to date with the inserted and deleted files.
+        :param index_policy: IndexPolicy choosing the index and search parameters of each collection from its size.
+        :param vector_storage: VectorStorage encoding the stored vectors and texts (float32 vectors and plain texts by default).
+        :param db_name: Milvus database of the collections.
+        :param connection_pool_size: Number of connections to Milvus, used in turn by the loaded collections.
+        :param connect_timeout: Seconds to wait for a connection to open or answer a health check.
+        :param health_check_interval: Seconds after which a connection is checked again before being used.
+        :param filename_index_ttl: Seconds after which the filenames of a tenant the file manifest does not track are read again.
+        :param alias_check_interval: Seconds after which a loaded collection is checked again for an index migration
+                                     that moved its name to a new collection.
+        :param migration_grace_period: Seconds the previous collection is kept after an index migration, for the calls
+                                       of workers that have not seen the new collection yet.
+        :param migration_lock_dir: Directory of the lock files that let one process at a time migrate the index of a
+                                   collection. It must be shared by all the workers of a Milvus server (default: a
+                                   directory under the system temporary directory).
+        """
+        if storage_mode not in (self.STORAGE_MODE_COLLECTION, self.STORAGE_MODE_PARTITION_KEY):
+            raise ValueError(f"Unknown storage mode: {storage_mode}")
+        self.storage_mode = storage_mode
+        self.shared_collection_name = shared_collection_name
+        self.num_partitions = num_partitions
+        self.metrics = metrics
+        self.max_insert_rows = max_insert_rows
+
+        # Connections to the Milvus server are opened on first use, so the API starts while Milvus is down
+        self.host = host
+        self.port = port
+        self.db_name = db_name
+        self.connect_timeout = connect_timeout
+        self.health_check_interval = health_check_interval
+        self._aliases = [self.DEFAULT_ALIAS] + [f"{self.DEFAULT_ALIAS}_{i}" for i in range(1, max(1, connection_pool_size))]
+        self._alias_locks = {alias: threading.Lock() for alias in self._aliases}
+        self._alias_checked = {}  # alias -> time of the last successful connection or health check
+        self._next_alias = itertools.count()
+
+        # Registry of loaded tenant collections: collection name -> (Collection, last access time, time the
+        # collection behind the name was last checked), ordered from least to most recently used.
+        self.max_loaded_collections = max_loaded_collections
+        self.collection_ttl = collection_ttl
+        self.alias_check_interval = alias_check_interval
+        self._loaded_collections = OrderedDict()
+        self._registry_lock = threading.RLock()
+
+        # Batched flushes: collection name -> [unflushed row count, time of the first unflushed insert]
+        self.flush_threshold_rows = flush_threshold_rows
+        self.flush_interval = flush_interval
+        self._pending_flushes = {}
+        self._flush_lock = threading.Lock()
+
+        # Index type and parameters follow the collection size. Migrations to another index build a new
+        # collection on a background thread while the current one keeps serving, then swap them
+        self.index_policy = index_policy or IndexPolicy(nlist_tiers=index_nlist_tiers)
+        self._index_params = {}  # physical collection name -> parameters of its index, for the search parameters
+        self._migrations = set()  # names of the collections whose index migration is scheduled in this process
+        self._migration_lock = threading.Lock()
+        self._migration_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="milvus-index")
+        self.migration_grace_period = migration_grace_period
+        self.migration_lock_dir = migration_lock_dir or os.path.join(tempfile.gettempdir(), "milvus_index_migrations")
+        self._closing = threading.Event()
+
+        # Filenames and content hashes of each tenant, so duplicate checks do not scan the collection
+        self.filename_index = FilenameIndex(max_tenants=max_indexed_tenants, ttl=filename_index_ttl)
+        self.file_manifest = file_manifest
+        self.vector_storage = vector_storage or VectorStorage()
     
+    def _span(self, stage):
+        """Time a stage in the metrics registry, if one was given."""
+        return self.metrics.span(stage) if self.metrics is not None else nullcontext()
+
+    def _get_alias(self):
+        """
+        Return the alias of the next pooled connection, round-robin, making sure it is open and healthy.
+        """
+        alias = self._aliases[next(self._next_alias) % len(self._aliases)]
+        self._check_connection(alias)
+        return alias
+
+    def _check_connection(self, alias, force=False):
+        """
+        Open a pooled connection on first use. An open connection is pinged when it was last checked
+        more than health_check_interval seconds ago (or when force is set), and reopened if the ping fails.
+
+        :param alias: Alias of the connection.
+        :param force: Ping the connection whatever the time of its last check.
+        :return: True if the connection was (re)opened.
+        """
+        checked = self._alias_checked.get(alias)
+        if not force and checked is not None and time.monotonic() - checked <= self.health_check_interval:
+            return False
+
+        with self._alias_locks[alias]:
+            if checked != self._alias_checked.get(alias):
+                # Another thread checked the connection in the meantime
+                return False
+            if checked is not None:
+                try:
+                    utility.get_server_version(using=alias, timeout=self.connect_timeout)
+                    self._alias_checked[alias] = time.monotonic()
+                    return False
+                except Exception as e:
+                    logging.warning(f"Milvus connection {alias} failed its health check, reconnecting: {e}")
+                    self._alias_checked.pop(alias, None)
+                    connections.disconnect(alias)
+
+            connections.connect(alias=alias, host=self.host, port=self.port, db_name=self.db_name,
+                                timeout=self.connect_timeout)
+            self._alias_checked[alias] = time.monotonic()
+            logging.info(f"Milvus connection {alias} opened to {self.host}:{self.port}.")
+            return True
+
+    def _reconnect_after_failure(self, alias):
+        """
+        Check a connection after a failed call, reopening it if it is broken.
+
+        :return: True if the connection was reopened, so that the call is worth retrying.
+        """
+        try:
+            return self._check_connection(alias, force=True)
+        except Exception as e:
+            logging.error(f"Failed to reconnect Milvus connection {alias}: {e}")
+            return False
+
+    def connect(self):
+        """
+        Open all the pooled connections now instead of on first use, raising an exception if Milvus is unreachable.
+        """
+        for alias in self._aliases:
+            self._check_connection(alias)
+
+    def check_health(self):
+        """
+        Ping every pooled connection, reopening broken ones. Raises an exception if Milvus is unreachable.
+        """
+        for alias in self._aliases:
+            self._check_connection(alias, force=True)
+
     def _sanitize_tenant_id(self, tenant_id):
         """Helper function to sanitize tenant_id by replacing hyphens with underscores."""
         return tenant_id.replace("-", "_")
+
+    def _get_collection_name(self, tenant_id):
+        """Helper function to build the collection name of a tenant."""
+        if self.storage_mode == self.STORAGE_MODE_PARTITION_KEY:
+            # Validate the tenant id up front, it is used in the tenant filter expressions
+            self._get_tenant_key(tenant_id)
+            return self.shared_collection_name
+        return f"tenant_{self._sanitize_tenant_id(tenant_id)}"
+
+    def _get_tenant_key(self, tenant_id):
+        """
+        Helper function to build the partition key value of a tenant. The value ends up in filter
+        expressions, so anything but a plain identifier is rejected.
+        """
+        if not self._TENANT_ID_PATTERN.match(tenant_id):
+            raise Exception(f"Invalid tenant id: {tenant_id!r}")
+        return self._sanitize_tenant_id(tenant_id)
+
+    def _tenant_filter(self, tenant_id, expr=None):
+        """
+        Restrict a filter expression to the tenant's rows. In "collection" mode the collection
+        already belongs to the tenant and the expression is returned unchanged.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param expr: Optional filter expression.
+        :return: The filter expression to use.
+        """
+        if self.storage_mode != self.STORAGE_MODE_PARTITION_KEY:
+            return expr
+        tenant_expr = f'{self.TENANT_FIELD} == "{self._get_tenant_key(tenant_id)}"'
+        return f"{tenant_expr} and ({expr})" if expr else tenant_expr
+
+    def _get_collection(self, tenant_id):
+        """
+        Return a loaded Collection handle for the tenant, reusing the registry when possible.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :return: Tuple of (Collection, cached) where cached tells whether the handle came from the registry.
+        """
+        collection_name = self._get_collection_name(tenant_id)
+        now = time.monotonic()
+
+        with self._registry_lock:
+            entry = self._loaded_collections.pop(collection_name, None)
+            evicted = self._pop_expired_collections(now)
+            is_fresh = entry is not None and now - entry[1] <= self.collection_ttl
+            if is_fresh:
+                self._loaded_collections[collection_name] = (entry[0], now, entry[2])
+        self._release_collections(evicted)
+        if is_fresh and now - entry[2] <= self.alias_check_interval:
+            return entry[0], True
+
+        # Cache miss, stale entry or time to check whether an index migration (possibly run by another
+        # worker) moved the name to a new collection
+        alias = self._get_alias()
+        physical_name = self._resolve_collection_name(collection_name, alias)
+        if physical_name is None:
+            raise Exception(f"Collection {collection_name} does not exist.")
+
+        if is_fresh and entry[0].name == physical_name:
+            with self._registry_lock:
+                if collection_name in self._loaded_collections:
+                    self._loaded_collections[collection_name] = (entry[0], now, time.monotonic())
+            return entry[0], True
+
+        collection = Collection(physical_name, using=alias)
+        if not collection.has_index():
+            # E.g. a worker stopped between creating a collection and its index
+            self.create_index(collection, field_name="vector", index_params=self.index_policy.choose(collection.num_entities))
+        collection.load()
+
+        with self._registry_lock:
+            now = time.monotonic()
+            self._loaded_collections[collection_name] = (collection, now, now)
+            evicted = []
+            while len(self._loaded_collections) > self.max_loaded_collections:
+                _, (least_recent, _, _) = self._loaded_collections.popitem(last=False)
+                evicted.append(least_recent)
+        self._release_collections(evicted)
+
+        return collection, False
+
+    def _resolve_collection_name(self, collection_name, alias):
+        """
+        Return the name of the collection served under a collection name: the name itself, or the collection
+        its alias points to once an index migration replaced the collection.
+
+        :param collection_name: Name of the tenant or shared collection.
+        :param alias: Alias of the pooled connection to use.
+        :return: The name of the collection, or None if it does not exist.
+        """
+        if not utility.has_collection(collection_name, using=alias):
+            return None
+        return Collection(collection_name, using=alias).describe()["collection_name"]
+
+    @classmethod
+    def _logical_name(cls, collection_name):
+        """Return the name a version of a collection built by an index migration is served under."""
+        return cls._VERSION_PATTERN.sub("", collection_name)
+
+    def _call_with_collection(self, tenant_id, operation):
+        """
+        Run operation(collection) on the tenant's loaded collection. If the call fails on a cached
+        handle (e.g. the collection was released or dropped by another worker) or on a broken
+        connection, which is reopened, the handle is invalidated and the call is retried once on a
+        freshly loaded collection.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param operation: Callable receiving the Collection instance.
+        :return: Result of the operation.
+        """
+        collection, cached = self._get_collection(tenant_id)
+        try:
+            return operation(collection)
+        except Exception as e:
+            reconnected = self._reconnect_after_failure(collection._using)
+            if not cached and not reconnected:
+                raise
+            logging.warning(f"Operation on collection {collection.name} failed, reloading: {e}")
+            self._invalidate_collection(self._get_collection_name(tenant_id))
+            collection, _ = self._get_collection(tenant_id)
+            return operation(collection)
+
+    def _pop_expired_collections(self, now):
+        """Remove collections unused for longer than the TTL from the registry. Caller holds the registry lock."""
+        expired = []
+        while self._loaded_collections:
+            collection_name, (collection, last_used, _) = next(iter(self._loaded_collections.items()))
+            if now - last_used <= self.collection_ttl:
+                break
+            del self._loaded_collections[collection_name]
+            expired.append(collection)
+        return expired
+
+    def _release_collections(self, collections):
+        """Release collections from Milvus memory, logging (not raising) failures."""
+        for collection in collections:
+            try:
+                collection.release()
+                logging.info(f"Collection {collection.name} released.")
+            except Exception as e:
+                logging.warning(f"Failed to release collection {collection.name}: {e}")
+
+    def _invalidate_collection(self, collection_name):
+        """Forget a cached collection handle without releasing it."""
+        with self._registry_lock:
+            entry = self._loaded_collections.pop(collection_name, None)
+            self._index_params.pop(collection_name, None)
+            if entry is not None:
+                self._index_params.pop(entry[0].name, None)
+
     def has_collection(self, collection_name):
-        if utility.has_collection(collection_name):
+        if utility.has_collection(collection_name, using=self._get_alias()):
             print(f"Collection {collection_name} already exists.")
             return
 
@@ -26,6 +364,9 @@ class MilvusManager:
         :param tenant_id: Unique identifier for the tenant (UUID).
         :param fields: List of FieldSchema objects defining the schema.
         """
+        if self.storage_mode == self.STORAGE_MODE_PARTITION_KEY:
+            return self._create_shared_collection(tenant_id, fields)
+
         try:
             # Sanitize tenant ID to avoid any issues with special characters
             sanitized_tenant_id = self._sanitize_tenant_id(tenant_id)
@@ -39,9 +380,13 @@ class MilvusManager:
             schema = CollectionSchema(fields, description=f"Collection for tenant {sanitized_tenant_id}")
 
             # Create the collection
-            collection = Collection(name=collection_name, schema=schema)
+            collection = Collection(name=collection_name, schema=schema, using=self._get_alias())
             self.create_index(collection, field_name="vector")
 
+            # Make sure no stale handle of a previous collection with the same name is reused
+            self._invalidate_collection(collection_name)
+            self._register_empty_tenant(tenant_id)
+
             logging.info(f"Collection {collection_name} created.")
             return tenant_id
 
@@ -50,6 +395,115 @@ class MilvusManager:
             logging.error(f"Error occurred while creating collection : {e}")
             raise Exception(f"Failed to create collection. Error: {e}")
 
+    def get_shared_schema(self, fields):
+        """
+        Build the schema of the shared collection: the tenant fields plus the tenant_id partition key.
+
+        :param fields: List of FieldSchema objects defining the per-tenant schema.
+        :return: The CollectionSchema of the shared collection.
+        """
+        tenant_field = FieldSchema(name=self.TENANT_FIELD, dtype=DataType.VARCHAR, max_length=64, is_partition_key=True)
+        return CollectionSchema(list(fields) + [tenant_field], description="Collection shared by all tenants")
+
+    def _create_shared_collection(self, tenant_id, fields):
+        """
+        Register a tenant in "partition_key" mode, creating the shared collection on first use.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param fields: List of FieldSchema objects defining the schema.
+        """
+        try:
+            self._get_tenant_key(tenant_id)
+
+            alias = self._get_alias()
+            if not utility.has_collection(self.shared_collection_name, using=alias):
+                collection = Collection(name=self.shared_collection_name, schema=self.get_shared_schema(fields),
+                                        num_partitions=self.num_partitions, using=alias)
+                self.create_index(collection, field_name="vector")
+                self._invalidate_collection(self.shared_collection_name)
+                logging.info(f"Collection {self.shared_collection_name} created.")
+
+            # Tenants with rows already (e.g. moved in by tools.migrate_to_partition_key) are tracked by the backfill tool
+            rows = self._call_with_collection(
+                tenant_id,
+                lambda collection: collection.query(expr=self._tenant_filter(tenant_id), output_fields=["id"], limit=1,
+                                                    consistency_level="Strong")
+            )
+            if not rows:
+                self._register_empty_tenant(tenant_id)
+            return tenant_id
+
+        except Exception as e:
+            logging.error(f"Error occurred while creating collection : {e}")
+            raise Exception(f"Failed to create collection. Error: {e}")
+
+    def _register_empty_tenant(self, tenant_id):
+        """
+        Record that a new tenant has no files: the file manifest tracks it from now on, and the filename
+        index does not have to read its files on the first upload.
+        """
+        revision = None
+        if self.file_manifest is not None:
+            self.file_manifest.track_tenant(tenant_id)
+            revision = self.file_manifest.get_revision(tenant_id)
+        self.filename_index.load(tenant_id, {}, self.filename_index.get_generation(tenant_id), revision)
+
+    def _get_indexed_files(self, tenant_id):
+        """
+        Return the files of a tenant from the filename index, reading them from the file manifest or the
+        collection on first use and whenever the indexed copy is stale.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :return: Dict of filename -> content hash (None for files stored before the index knew them).
+        """
+        # The manifest is shared by the workers: its revision tells whether another worker changed the files
+        revision = self.file_manifest.get_revision(tenant_id) if self.file_manifest is not None else None
+        files = self.filename_index.get(tenant_id, revision)
+        if files is not None:
+            return files
+
+        generation = self.filename_index.get_generation(tenant_id)
+        if revision is not None:
+            manifest_files = self.file_manifest.list_files(tenant_id)
+            if manifest_files is not None:
+                files = {file["filename"]: file["content_hash"] for file in manifest_files}
+                self.filename_index.load(tenant_id, files, generation, revision)
+                return files
+
+        found = set()
+        while True:
+            # Skip the files found so far, so each round returns chunks of files not seen yet
+            expr = f"filename not in {json.dumps(sorted(found))}" if found else None
+            rows = self._call_with_collection(
+                tenant_id,
+                lambda collection: collection.query(expr=self._tenant_filter(tenant_id, expr) or "", output_fields=["filename"],
+                                                    limit=self.QUERY_WINDOW, consistency_level="Strong")
+            )
+            found.update(row["filename"] for row in rows)
+            if len(rows) < self.QUERY_WINDOW:
+                break
+
+        files = {filename: None for filename in found}
+        # Not installed if the tenant changed while its files were read; the next call reads them again.
+        # Read again after the TTL of the index too, since other workers may have changed them
+        self.filename_index.load(tenant_id, files, generation)
+        return files
+
+    def get_file_hash(self, tenant_id, filename):
+        """
+        Look up a stored file of a tenant in the filename index.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param filename: The filename to look up.
+        :return: Tuple of (True if the filename exists, content hash it was uploaded with or None).
+        """
+        try:
+            files = self._get_indexed_files(tenant_id)
+            return filename in files, files.get(filename)
+
+        except Exception as e:
+            logging.error(f"Failed to check if filename '{filename}' exists: {e}")
+            raise Exception(f"Error checking filename: {e}")
 
     def filename_exists(self, tenant_id, filename):
             """
@@ -59,23 +513,24 @@ class MilvusManager:
             :param filename: The filename to check.
             :return: True if the filename exists, False otherwise.
             """
-            sanitized_tenant_id = self._sanitize_tenant_id(tenant_id)
-            collection_name = f"tenant_{sanitized_tenant_id}"
-
-            if not utility.has_collection(collection_name):
-                raise Exception(f"Collection {collection_name} does not exist.")
+            exists, _ = self.get_file_hash(tenant_id, filename)
+            return exists
 
-            collection = Collection(collection_name)
-            collection.load()
+    def existing_filenames(self, tenant_id, filenames):
+        """
+        Find which of several filenames already exist in the tenant's collection.
 
-            try:
-                # Query to check if the filename already exists
-                query_result = collection.query(expr=f'filename == "{filename}"', output_fields=["filename"])
-                return len(query_result) > 0
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param filenames: The filenames to check.
+        :return: Set of the filenames that exist.
+        """
+        try:
+            files = self._get_indexed_files(tenant_id)
+            return {filename for filename in filenames if filename in files}
 
-            except Exception as e:
-                logging.error(f"Failed to check if filename '{filename}' exists: {e}")
-                raise Exception(f"Error checking filename: {e}")
+        except Exception as e:
+            logging.error(f"Failed to check which filenames exist: {e}")
+            raise Exception(f"Error checking filenames: {e}")
 
     # def insert_data(self, tenant_id, data):
     #     """
@@ -105,28 +560,458 @@ class MilvusManager:
     #     # Create an index for the vector field (if needed)
     #     self.create_index(collection, field_name="vector")
    
-    def insert_data(self, tenant_id, data):
+    def insert_data(self, tenant_id, data, flush=False, content_hashes=None, file_sizes=None):
         """
-        Insert data into the tenant-specific collection and create an index.
+        Insert data into the tenant-specific collection.
+
+        Flushes are batched across inserts (see flush_threshold_rows and flush_interval) and the index
+        is only migrated after a flush that moves the collection to another index of the index policy.
         
         :param tenant_id: Unique identifier for the tenant (UUID).
         :param data: List of data records to insert (should match the schema of the collection).
+        :param flush: Flush immediately instead of waiting for the batching thresholds.
+        :param content_hashes: Optional dict of filename -> content hash of the inserted files, kept in the filename index.
+        :param file_sizes: Optional dict of filename -> size in bytes of the inserted files, kept in the file manifest.
+        :return: Primary keys of the inserted rows, in the order of the data.
         """
-        sanitized_tenant_id = self._sanitize_tenant_id(tenant_id)
-        collection_name = f"tenant_{sanitized_tenant_id}"
-
-        if not utility.has_collection(collection_name):
-            raise Exception(f"Collection {collection_name} does not exist.")
+        collection, _ = self._get_collection(tenant_id)
+        content_hashes = content_hashes or {}
+        file_sizes = file_sizes or {}
+        # The filename is the second field of the schema
+        chunk_counts = Counter(data[1] if data else [])
+        if not self._has_chunk_fields(collection):
+            # Collections created before the chunk fields only take the vector, filename and text
+            data = list(data)[:3]
+        if data:
+            # Vectors follow the type and dimension of the collection, texts the current text compression
+            data = [self._encode_vectors(collection, data[0]), data[1],
+                    [self.vector_storage.encode_text(text) for text in data[2]]] + list(data[3:])
 
-        collection = Collection(collection_name)
+        if self.storage_mode == self.STORAGE_MODE_PARTITION_KEY:
+            # The partition key is the last field of the shared schema
+            num_rows = len(data[0]) if data else 0
+            data = list(data) + [[self._get_tenant_key(tenant_id)] * num_rows]
+        num_rows = len(data[0]) if data else 0
+        if not collection.schema.auto_id:
+            # Collections built by an index migration keep the ids of the copied rows, so ids are generated here
+            data = [self._new_ids(num_rows)] + list(data)
         
-        # Insert data
-        collection.insert(data)
-        collection.flush()
-        print(f"Data inserted into collection {collection_name}.")
+        # Insert data, in slices that stay below the gRPC message size limit
+        primary_keys = []
+        try:
+            for start in range(0, num_rows, self.max_insert_rows):
+                insert_result = collection.insert([column[start:start + self.max_insert_rows] for column in data])
+                primary_keys.extend(insert_result.primary_keys)
+        except Exception:
+            # The slices are not atomic: remove the ones already inserted, so that a retry does not duplicate them
+            self._rollback_insert(tenant_id, collection, primary_keys)
+            raise
+        self.filename_index.add(tenant_id, {filename: content_hashes.get(filename) for filename in chunk_counts})
+        if self.file_manifest is not None:
+            self.file_manifest.record_files(tenant_id, {
+                filename: {"chunks": chunks, "size_bytes": file_sizes.get(filename), "content_hash": content_hashes.get(filename)}
+                for filename, chunks in chunk_counts.items()
+            })
+        print(f"Data inserted into collection {collection.name}.")
+
+        if self._add_pending_rows(collection.name, num_rows) or flush:
+            self._flush_collection(collection)
+        return primary_keys
+
+    @staticmethod
+    def _new_ids(num_rows):
+        """Generate random positive int64 primary keys for collections without auto ids."""
+        return [secrets.randbits(63) for _ in range(num_rows)]
+
+    def _rollback_insert(self, tenant_id, collection, primary_keys):
+        """Delete the rows of a failed insert, logging (not raising) failures."""
+        try:
+            for start in range(0, len(primary_keys), self.QUERY_WINDOW):
+                ids = json.dumps(list(primary_keys[start:start + self.QUERY_WINDOW]))
+                collection.delete(expr=self._tenant_filter(tenant_id, f"id in {ids}"))
+            if primary_keys:
+                logging.warning(f"Rolled back {len(primary_keys)} rows of a failed insert into collection {collection.name}.")
+        except Exception as e:
+            logging.error(f"Failed to roll back {len(primary_keys)} rows of a failed insert into collection {collection.name}: {e}")
+
+    def _encode_vectors(self, collection, vectors):
+        """Adapt vectors to the type and dimension of the vector field of a collection."""
+        return self.vector_storage.encode_vectors(vectors, VectorStorage.get_vector_field(collection.schema))
+
+    def _format_hit(self, hit):
+        """Turn a search hit into a result dict, decoding its text."""
+        return {
+            "id": hit.id,
+            "distance": hit.distance,
+            "text": self.vector_storage.decode_text(hit.entity.get("text")),
+            "filename": hit.entity.get("filename")
+        }
+
+    @classmethod
+    def _has_chunk_fields(cls, collection):
+        """Check whether a collection stores the per-chunk hash, page number and position."""
+        field_names = {field.name for field in collection.schema.fields}
+        return all(name in field_names for name in cls.CHUNK_FIELDS)
+
+    def has_chunk_fields(self, tenant_id):
+        """
+        Check whether the tenant's collection stores chunk hashes, so that updated files can be diffed.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        """
+        collection, _ = self._get_collection(tenant_id)
+        return self._has_chunk_fields(collection)
+
+    def _query_all(self, tenant_id, expr, output_fields, batch_size=1000):
+        """Return every row of the tenant matching expr, read in batches with a query iterator."""
+        def operation(collection):
+            rows = []
+            iterator = collection.query_iterator(batch_size=batch_size, expr=self._tenant_filter(tenant_id, expr),
+                                                 output_fields=list(output_fields), consistency_level="Strong")
+            try:
+                while True:
+                    batch = iterator.next()
+                    if not batch:
+                        return rows
+                    rows.extend(batch)
+            finally:
+                iterator.close()
+
+        return self._call_with_collection(tenant_id, operation)
+
+    def get_file_chunks(self, tenant_id, filename, output_fields=("id", "chunk_hash", "page_number", "chunk_index", "text")):
+        """
+        Read the stored chunks of a file.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param filename: The filename whose chunks are read.
+        :param output_fields: Fields returned for each chunk.
+        :return: List of row dicts.
+        """
+        try:
+            rows = self._query_all(tenant_id, f"filename == {json.dumps(filename)}", output_fields)
+            for row in rows:
+                if "text" in row:
+                    row["text"] = self.vector_storage.decode_text(row["text"])
+            return rows
+
+        except Exception as e:
+            logging.error(f"Failed to read the chunks of file '{filename}': {e}")
+            raise Exception(f"Error reading file chunks: {e}")
+
+    def get_vectors(self, tenant_id, ids):
+        """
+        Read the stored vectors of chunks, e.g. to re-insert chunks that moved without embedding them again.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param ids: Primary keys of the chunks.
+        :return: Dict of primary key -> vector.
+        """
+        vectors = {}
+        for start in range(0, len(ids), self.QUERY_WINDOW):
+            rows = self._query_all(tenant_id, f"id in {json.dumps(list(ids[start:start + self.QUERY_WINDOW]))}", ["id", "vector"])
+            vectors.update((row["id"], VectorStorage.decode_vector(row["vector"])) for row in rows)
+        return vectors
+
+    def delete_chunks(self, tenant_id, filename, ids, content_hash=None):
+        """
+        Delete some chunks of a file, e.g. the chunks an updated file no longer has, and record the new
+        content hash of the file.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param filename: The file the chunks belong to.
+        :param ids: Primary keys of the chunks to delete.
+        :param content_hash: Optional new content hash of the file, kept in the filename index and the manifest.
+        :return: Number of deleted chunks.
+        """
+        try:
+            for start in range(0, len(ids), self.QUERY_WINDOW):
+                delete_expression = self._tenant_filter(tenant_id, f"id in {json.dumps(list(ids[start:start + self.QUERY_WINDOW]))}")
+                self._call_with_collection(tenant_id, lambda collection: collection.delete(expr=delete_expression))
+            if content_hash is not None:
+                self.filename_index.add(tenant_id, {filename: content_hash})
+            if self.file_manifest is not None:
+                self.file_manifest.record_files(tenant_id, {filename: {"chunks": -len(ids), "content_hash": content_hash}})
+            return len(ids)
+
+        except Exception as e:
+            logging.error(f"Failed to delete {len(ids)} chunks of file '{filename}': {e}")
+            raise Exception(f"Failed to delete chunks. Error: {e}")
+
+    def flush(self, tenant_id):
+        """
+        Flush pending inserts of a tenant collection and update its index if needed.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        """
+        collection, _ = self._get_collection(tenant_id)
+        self._flush_collection(collection)
+
+    def flush_pending(self):
+        """
+        Flush every collection that still has unflushed inserts (e.g. on shutdown).
+        """
+        with self._flush_lock:
+            collection_names = list(self._pending_flushes)
+
+        for collection_name in collection_names:
+            try:
+                self._flush_collection(Collection(collection_name, using=self._get_alias()))
+            except Exception as e:
+                logging.error(f"Failed to flush collection {collection_name}: {e}")
+
+    def close(self):
+        """
+        Wait for the running index migration, cutting its grace period short; migrations that have not
+        started yet are cancelled.
+        """
+        self._closing.set()
+        self._migration_executor.shutdown(wait=True, cancel_futures=True)
+        with self._migration_lock:
+            self._migrations.clear()
+
+    def _add_pending_rows(self, collection_name, num_rows):
+        """
+        Record unflushed rows for a collection.
+
+        :return: True if the collection is due for a flush.
+        """
+        now = time.monotonic()
+        with self._flush_lock:
+            pending = self._pending_flushes.setdefault(collection_name, [0, now])
+            pending[0] += num_rows
+            return pending[0] >= self.flush_threshold_rows or now - pending[1] >= self.flush_interval
+
+    def _flush_collection(self, collection):
+        """Flush a collection and bring its index in line with the new row count."""
+        with self._flush_lock:
+            self._pending_flushes.pop(collection.name, None)
+
+        with self._span("milvus.flush"):
+            collection.flush()
+        self.ensure_index(collection, num_rows=collection.num_entities)
+
+    def _get_index_params(self, num_rows):
+        """
+        Build the index parameters suited to a collection of num_rows entities.
+
+        :param num_rows: Number of entities in the collection.
+        :return: Index parameters for create_index.
+        """
+        return self.index_policy.choose(num_rows)
+
+    def ensure_index(self, collection, field_name="vector", num_rows=0):
+        """
+        Make sure the collection has an index suited to its size. Nothing is done when a compatible
+        index already exists; otherwise the index is migrated on the background index thread.
+
+        :param collection: The Milvus collection instance.
+        :param field_name: Name of the field to index.
+        :param num_rows: Number of entities in the collection.
+        """
+        index_params = self._get_index_params(num_rows)
+
+        if not collection.has_index():
+            self.create_index(collection, field_name=field_name, index_params=index_params)
+            return
+
+        if self.index_policy.is_compatible(collection.index().params, index_params):
+            return
+
+        collection_name = self._logical_name(collection.name)
+        with self._migration_lock:
+            if collection_name in self._migrations or self._closing.is_set():
+                return
+            self._migrations.add(collection_name)
+        logging.info(f"Scheduling index migration of collection {collection_name} for {num_rows} rows: {index_params}")
+        self._migration_executor.submit(self._migrate_index, collection_name, field_name)
+
+    @contextmanager
+    def _migration_file_lock(self, collection_name):
+        """
+        Lock the index migration of a collection across processes, without waiting.
+        The lock is released when the process holding it exits.
+
+        :return: Context manager yielding True if the lock was acquired.
+        """
+        os.makedirs(self.migration_lock_dir, exist_ok=True)
+        with open(os.path.join(self.migration_lock_dir, f"{collection_name}.lock"), "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _migrate_index(self, collection_name, field_name):
+        """
+        Move a collection to the index its size calls for, unless another process is migrating it already.
+        """
+        try:
+            with self._migration_file_lock(collection_name) as locked:
+                if not locked:
+                    logging.info(f"Index migration of collection {collection_name} is running in another process.")
+                    return
+                with self._span("milvus.index_migration"):
+                    self._run_index_migration(collection_name, field_name)
+        except Exception as e:
+            logging.error(f"Index migration of collection {collection_name} failed: {e}")
+        finally:
+            with self._migration_lock:
+                self._migrations.discard(collection_name)
+
+    def _run_index_migration(self, collection_name, field_name):
+        """
+        Build the new index on a copy of the collection while the current collection keeps serving, then
+        point the collection name (an alias) to the copy. Writes made to the current collection during the
+        copy, and by workers still using it during the grace period, are carried over before it is dropped.
+        Both collections are loaded while the copy catches up, so the migration needs twice the memory.
+        Caller holds the migration file lock.
+        """
+        alias = self._get_alias()
+        source_name = self._resolve_collection_name(collection_name, alias)
+        if source_name is None:
+            return
+        source = Collection(source_name, using=alias)
+        index_params = self._get_index_params(source.num_entities)
+        if source.has_index() and self.index_policy.is_compatible(source.index().params, index_params):
+            # Migrated by another process in the meantime
+            return
+
+        # Versions left behind by an interrupted migration
+        for name in self._list_versions(collection_name, alias):
+            if name != source_name:
+                utility.drop_collection(name, using=alias)
+                logging.warning(f"Dropped collection {name} left behind by an interrupted index migration.")
+
+        match = self._VERSION_PATTERN.search(source_name)
+        target_name = f"{collection_name}__v{int(match.group(1)) + 1 if match else 1}"
+        schema = self._copy_schema(source.schema)
+        if any(field.is_partition_key for field in schema.fields):
+            target = Collection(target_name, schema=schema, num_partitions=len(source.partitions), using=alias)
+        else:
+            target = Collection(target_name, schema=schema, using=alias)
+        try:
+            self.create_index(target, field_name=field_name, index_params=index_params)
+            # Bulk copy, indexed once flushed, then catch up with the writes made during the copy
+            self._sync_rows(source, target)
+            target.flush()
+            utility.wait_for_index_building_complete(target_name, using=alias)
+            target.load()
+            synced_ids = self._sync_rows(source, target)
+            source_name = self._swap_alias(collection_name, source_name, target_name, alias)
+        except Exception:
+            # The current collection still serves the name
+            utility.drop_collection(target_name, using=alias)
+            raise
+        self._invalidate_collection(collection_name)
+        swapped_at = time.monotonic()
+        logging.info(f"Collection {collection_name} moved to {target_name} with a {index_params['index_type']} index.")
+
+        # Workers see the new collection within alias_check_interval; the grace period also covers their calls in flight
+        self._closing.wait(self.migration_grace_period)
+        time.sleep(max(0.0, swapped_at + 2 * self.alias_check_interval - time.monotonic()))
+        source = Collection(source_name, using=alias)
+        self._sync_rows(source, target, synced_ids)
+        utility.drop_collection(source_name, using=alias)
+        logging.info(f"Collection {source_name} dropped after the index migration of {collection_name}.")
+
+    def _list_versions(self, collection_name, alias):
+        """Return the collections holding a version of a collection: the collection itself and its migrated copies."""
+        return [name for name in utility.list_collections(using=alias)
+                if name == collection_name or self._VERSION_PATTERN.search(name) and self._logical_name(name) == collection_name]
+
+    @staticmethod
+    def _copy_schema(schema):
+        """
+        Copy a collection schema for a migrated collection. Its primary key takes the ids of the copied
+        rows instead of generating them.
+        """
+        fields = []
+        for field in schema.fields:
+            field = FieldSchema.construct_from_dict(field.to_dict())
+            if field.is_primary:
+                field.auto_id = False
+            fields.append(field)
+        return CollectionSchema(fields, description=schema.description, enable_dynamic_field=schema.enable_dynamic_field)
+
+    def _read_ids(self, collection):
+        """Return the primary keys of every row of a collection."""
+        ids = set()
+        iterator = collection.query_iterator(batch_size=self.QUERY_WINDOW, expr="", output_fields=["id"],
+                                             consistency_level="Strong")
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    return ids
+                ids.update(row["id"] for row in batch)
+        finally:
+            iterator.close()
+
+    def _sync_rows(self, source, target, synced_ids=None):
+        """
+        Copy to the target collection the rows of the source it lacks, and delete from it the rows the
+        source no longer has. Rows are never updated in place, so comparing the ids is enough.
+
+        :param source: Collection whose rows are copied.
+        :param target: Collection of the index migration.
+        :param synced_ids: Ids of the source at the previous sync. When given, only the changes made to the
+                           source since then are carried over, so the target can take writes of its own.
+        :return: The ids of the source.
+        """
+        source_ids = self._read_ids(source)
+        target_ids = self._read_ids(target) if synced_ids is None else synced_ids
+        missing = sorted(source_ids - target_ids)
+        removed = sorted(target_ids - source_ids)
+
+        field_names = [field.name for field in target.schema.fields]
+        for start in range(0, len(missing), self.max_insert_rows):
+            ids = json.dumps(missing[start:start + self.max_insert_rows])
+            rows = source.query(expr=f"id in {ids}", output_fields=field_names, consistency_level="Strong")
+            if rows:
+                columns = {name: [row[name] for row in rows] for name in field_names}
+                columns["vector"] = self._encode_vectors(target, columns["vector"])
+                target.insert([columns[name] for name in field_names])
+        for start in range(0, len(removed), self.QUERY_WINDOW):
+            target.delete(expr=f"id in {json.dumps(removed[start:start + self.QUERY_WINDOW])}")
+        if missing or removed:
+            logging.info(f"Synced {target.name} with {source.name}: {len(missing)} rows copied, {len(removed)} deleted.")
+        return source_ids
+
+    def _swap_alias(self, collection_name, source_name, target_name, alias):
+        """
+        Point a collection name to the migrated collection.
+
+        :return: The name of the previous collection, which was renamed if it was served under the name itself.
+        """
+        if source_name != collection_name:
+            utility.alter_alias(target_name, collection_name, using=alias)
+            return source_name
 
-        # Create an index for the vector field (if needed)
-        self.create_index(collection, field_name="vector")
+        # First migration of the collection: its name becomes an alias. Calls made in between fail and are
+        # retried by _call_with_collection
+        renamed = f"{collection_name}__v0"
+        utility.rename_collection(collection_name, renamed, using=alias)
+        try:
+            utility.create_alias(target_name, collection_name, using=alias)
+        except Exception:
+            utility.rename_collection(renamed, collection_name, using=alias)
+            raise
+        return renamed
+
+    def _get_search_params(self, collection, top_k):
+        """
+        Build the search parameters matching the index of a collection, read once per loaded collection.
+        """
+        index_params = self._index_params.get(collection.name)
+        if index_params is None:
+            index_params = collection.index().params
+            self._index_params[collection.name] = index_params
+        return self.index_policy.search_params(index_params, top_k)
 
     def create_index(self, collection, field_name="vector", index_params=None):
         """
@@ -137,14 +1022,12 @@ class MilvusManager:
         :param index_params: Optional parameters for index creation (type, metric, etc.).
         """
         if index_params is None:
-            index_params = {
-                "index_type": "IVF_FLAT",  # Default index type, can be customized
-                "metric_type": "L2",       # Default metric type (Euclidean distance)
-                "params": {"nlist": 128}   # Default index params
-            }
+            index_params = self._get_index_params(num_rows=0)
 
         # Create an index on the specified field
-        collection.create_index(field_name=field_name, index_params=index_params)
+        with self._span("milvus.index"):
+            collection.create_index(field_name=field_name, index_params=index_params)
+        self._index_params[collection.name] = index_params
         print(f"Index created for field {field_name} in collection {collection.name}.")
 
     def search(self, tenant_id, query_vectors, top_k=5, search_params=None):
@@ -154,41 +1037,28 @@ class MilvusManager:
         :param tenant_id: Unique identifier for the tenant (UUID).
         :param query_vectors: List of query vectors.
         :param top_k: Number of top results to return.
-        :param search_params: Search parameters (depends on index type).
+        :param search_params: Search parameters (depends on index type); derived from the collection's index by default.
         :return: Search results including text and filename.
         """
-        sanitized_tenant_id = self._sanitize_tenant_id(tenant_id)
-        collection_name = f"tenant_{sanitized_tenant_id}"
-
-        if not utility.has_collection(collection_name):
-            raise Exception(f"Collection {collection_name} does not exist.")
-
-        collection = Collection(collection_name)
-        collection.load()
-
-        if search_params is None:
-            search_params = {"metric_type": "L2", "params": {"nprobe": 10}}  # Default search params
-
         try:
             # Perform the search
-            results = collection.search(
-                data=query_vectors,
-                anns_field="vector",  # The field we indexed
-                param=search_params,
-                limit=top_k,
-                output_fields=["text", "filename"]  # Specify the fields to return
+            results = self._call_with_collection(
+                tenant_id,
+                lambda collection: collection.search(
+                    data=self._encode_vectors(collection, query_vectors),
+                    anns_field="vector",  # The field we indexed
+                    param=search_params or self._get_search_params(collection, top_k),
+                    limit=top_k,
+                    expr=self._tenant_filter(tenant_id),  # Only the tenant's rows in "partition_key" mode
+                    output_fields=["text", "filename"]  # Specify the fields to return
+                )
             )
 
             # Format the results
             formatted_results = []
             for result in results:
                 for hit in result:
-                    formatted_results.append({
-                        "id": hit.id,
-                        "distance": hit.distance,
-                        "text": hit.entity.get("text"),
-                        "filename": hit.entity.get("filename")
-                    })
+                    formatted_results.append(self._format_hit(hit))
 
             return formatted_results
 
@@ -198,10 +1068,49 @@ class MilvusManager:
 
     def list_collections(self):
         """
-        List all collections available on the server.
+        List all collections available on the server, by the name they are served under.
+        """
+        collections = utility.list_collections(using=self._get_alias())
+        return sorted({self._logical_name(name) for name in collections})
+
+    def drop_collection(self, collection_name):
+        """
+        Drop a collection with the versions of it built by index migrations.
+
+        :param collection_name: Name of the collection, as returned by list_collections.
         """
-        collections = utility.list_collections()
-        return collections
+        self._invalidate_collection(collection_name)
+        alias = self._get_alias()
+        physical_name = self._resolve_collection_name(collection_name, alias)
+        if physical_name is None:
+            raise Exception(f"Collection {collection_name} does not exist.")
+
+        if physical_name != collection_name:
+            utility.drop_alias(collection_name, using=alias)
+        for name in self._list_versions(collection_name, alias):
+            utility.drop_collection(name, using=alias)
+
+    def drop_tenant_collection(self, tenant_id):
+        """
+        Drop the collection of a tenant and remove it from the collection registry.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        """
+        if self.storage_mode == self.STORAGE_MODE_PARTITION_KEY:
+            # Tenants only own rows of the shared collection
+            self._call_with_collection(tenant_id, lambda collection: collection.delete(expr=self._tenant_filter(tenant_id)))
+            self.filename_index.drop(tenant_id)
+            if self.file_manifest is not None:
+                self.file_manifest.drop_tenant(tenant_id)
+            logging.info(f"Rows of tenant {tenant_id} dropped from {self.shared_collection_name}.")
+            return
+
+        collection_name = self._get_collection_name(tenant_id)
+        self.drop_collection(collection_name)
+        self.filename_index.drop(tenant_id)
+        if self.file_manifest is not None:
+            self.file_manifest.drop_tenant(tenant_id)
+        logging.info(f"Collection {collection_name} dropped.")
 
 
     def delete_file_by_filename(self, tenant_id, filename):
@@ -212,19 +1121,13 @@ class MilvusManager:
         :param filename: The filename to match and delete.
         :return: Number of deleted entities or a message indicating success/failure.
         """
-        sanitized_tenant_id = self._sanitize_tenant_id(tenant_id)
-        collection_name = f"tenant_{sanitized_tenant_id}"
-
-        if not utility.has_collection(collection_name):
-            raise Exception(f"Collection {collection_name} does not exist.")
-
-        collection = Collection(collection_name)
-        collection.load()
-
         try:
             # Delete the entities where the 'filename' matches the given filename
-            delete_expression = f'filename == "{filename}"'
-            delete_result = collection.delete(expr=delete_expression)
+            delete_expression = self._tenant_filter(tenant_id, f'filename == "{filename}"')
+            delete_result = self._call_with_collection(tenant_id, lambda collection: collection.delete(expr=delete_expression))
+            self.filename_index.discard(tenant_id, filename)
+            if self.file_manifest is not None:
+                self.file_manifest.remove_file(tenant_id, filename)
 
             # Return the number of deleted entities or an appropriate message
             num_deleted = delete_result.delete_count
@@ -244,52 +1147,43 @@ class MilvusManager:
         :param tenant_id: Unique identifier for the tenant (UUID).
         :param query_vectors: List of query vectors.
         :param top_k: Number of top results to return.
-        :param search_params: Search parameters (depends on index type).
+        :param search_params: Search parameters (depends on index type); derived from the collection's index by default.
         :param filter_expr: Optional expression to filter the search by filenames or other criteria.
         :return: Search results including text and filename.
         """
-        sanitized_tenant_id = self._sanitize_tenant_id(tenant_id)
-        collection_name = f"tenant_{sanitized_tenant_id}"
-
-        if not utility.has_collection(collection_name):
-            raise Exception(f"Collection {collection_name} does not exist.")
-
-        collection = Collection(collection_name)
-        collection.load()
-
-        if search_params is None:
-            search_params = {"metric_type": "L2", "params": {"nprobe": 10}}  # Default search params
 
         try:
             # Perform the search with an optional filter
             if filter_expr:
-                results = collection.search(
-                    data=query_vectors,
-                    anns_field="vector",
-                    param=search_params,
-                    limit=top_k,
-                    expr=filter_expr,  # Apply the filter expression here
-                    output_fields=["text", "filename"]
+                results = self._call_with_collection(
+                    tenant_id,
+                    lambda collection: collection.search(
+                        data=self._encode_vectors(collection, query_vectors),
+                        anns_field="vector",
+                        param=search_params or self._get_search_params(collection, top_k),
+                        limit=top_k,
+                        expr=self._tenant_filter(tenant_id, filter_expr),  # Apply the filter expression here
+                        output_fields=["text", "filename"]
+                    )
                 )
             else:
-                results = collection.search(
-                    data=query_vectors,
-                    anns_field="vector",
-                    param=search_params,
-                    limit=top_k,
-                    output_fields=["text", "filename"]
+                results = self._call_with_collection(
+                    tenant_id,
+                    lambda collection: collection.search(
+                        data=self._encode_vectors(collection, query_vectors),
+                        anns_field="vector",
+                        param=search_params or self._get_search_params(collection, top_k),
+                        limit=top_k,
+                        expr=self._tenant_filter(tenant_id),
+                        output_fields=["text", "filename"]
+                    )
                 )
 
             # Format the results
             formatted_results = []
             for result in results:
                 for hit in result:
-                    formatted_results.append({
-                        "id": hit.id,
-                        "distance": hit.distance,
-                        "text": hit.entity.get("text"),
-                        "filename": hit.entity.get("filename")
-                    })
+                    formatted_results.append(self._format_hit(hit))
 
             return formatted_results
 
@@ -297,32 +1191,66 @@ class MilvusManager:
             logging.error(f"Search with filter failed: {e}")
             raise
 
-    def list_files(self, tenant_id, limit=1000):
+    def search_batch(self, tenant_id, query_vectors, top_k=5, search_params=None, filter_expr=None):
         """
-        List all unique files in a tenant-specific collection by retrieving the 'filename' field.
+        Search many query vectors of a tenant in one request, keeping the results of each query apart.
 
         :param tenant_id: Unique identifier for the tenant (UUID).
-        :param limit: Limit on the number of files to retrieve (default: 1000).
-        :return: A list of unique filenames in the collection.
+        :param query_vectors: List of query vectors.
+        :param top_k: Number of top results to return per query.
+        :param search_params: Search parameters (depends on index type); derived from the collection's index by default.
+        :param filter_expr: Optional expression to filter the search by filenames or other criteria.
+        :return: One list of results (including text and filename) per query vector, in the order of query_vectors.
         """
         try:
-            sanitized_tenant_id = self._sanitize_tenant_id(tenant_id)
-            collection_name = f"tenant_{sanitized_tenant_id}"
+            results = self._call_with_collection(
+                tenant_id,
+                lambda collection: collection.search(
+                    data=self._encode_vectors(collection, query_vectors),
+                    anns_field="vector",
+                    param=search_params or self._get_search_params(collection, top_k),
+                    limit=top_k,
+                    expr=self._tenant_filter(tenant_id, filter_expr),
+                    output_fields=["text", "filename"]
+                )
+            )
 
-            if not utility.has_collection(collection_name):
-                raise Exception(f"Collection {collection_name} does not exist.")
+            return [[self._format_hit(hit) for hit in result] for result in results]
 
-            collection = Collection(collection_name)
-            collection.load()
+        except Exception as e:
+            logging.error(f"Batch search failed: {e}")
+            raise
 
-            # Use a limit to retrieve filenames (since we can't use an empty expression without limit)
-            results = collection.query(expr="", output_fields=["filename"], limit=limit)
+    def list_file_details(self, tenant_id):
+        """
+        List the files of a tenant with their chunk count, size, upload time and content hash, read
+        from the file manifest. Tenants the manifest does not track yet are listed from the
+        filename index, without the details.
 
-            # Extract filenames and remove duplicates by converting to a set
-            filenames = list(set(result['filename'] for result in results if 'filename' in result))
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :return: List of file dicts sorted by filename.
+        """
+        try:
+            if self.file_manifest is not None:
+                files = self.file_manifest.list_files(tenant_id)
+                if files is not None:
+                    return files
 
-            return filenames
+            return [
+                {"filename": filename, "chunks": None, "size_bytes": None, "content_hash": content_hash, "uploaded_at": None}
+                for filename, content_hash in sorted(self._get_indexed_files(tenant_id).items())
+            ]
 
         except Exception as e:
             logging.error(f"Error while listing files: {e}")
             raise Exception(f"Error while listing files: {e}")
+
+    def list_files(self, tenant_id, limit=1000):
+        """
+        List the unique files of a tenant.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param limit: Maximum number of files returned (default: 1000).
+        :return: A list of unique filenames in the collection.
+        """
+        return [file["filename"] for file in self.list_file_details(tenant_id)[:limit]]
@@ -1,5 +1,45 @@
-from .document_generation import DocumentGenerator
+import importlib
+
 # from .embedding_model import EmbeddingModel
 # from .qdrant_db import Qdrant_DB
 # from .llm import gpt_chain
-from .MilvusManager import MilvusManager
\ No newline at end of file
+
+# Exported name -> module defining it. The modules are imported on first access, so that importing the package
+# does not pull in pymilvus, PyPDF2, langchain or tiktoken before they are needed
+_EXPORTS = {
+    "DocumentGenerator": ".document_generation",
+    "MilvusManager": ".MilvusManager",
+    "EmbeddingService": ".embedding_service",
+    "EmbeddingCache": ".embedding_cache",
+    "CachedEmbeddings": ".embedding_cache",
+    "AsyncMilvusManager": ".async_milvus_manager",
+    "SemanticCache": ".semantic_cache",
+    "Metrics": ".metrics",
+    "TraceIdLogFilter": ".metrics",
+    "TextCleaner": ".text_cleaning",
+    "TextChunker": ".text_chunking",
+    "IngestionQueue": ".ingestion_queue",
+    "FilenameIndex": ".filename_index",
+    "FileManifest": ".file_manifest",
+    "LexicalIndex": ".lexical_index",
+    "IndexPolicy": ".index_policy",
+    "ContextBuilder": ".context_builder",
+    "VectorStorage": ".vector_storage",
+    "VectorBackend": ".vector_backend",
+    "EmbeddedVectorStore": ".embedded_vector_store",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    # Cached as a module attribute; this also replaces the utils.MilvusManager submodule bound by the import
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
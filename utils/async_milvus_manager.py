@@ -0,0 +1,112 @@
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncMilvusManager:
+    """
+    Async facade over a VectorBackend (MilvusManager or EmbeddedVectorStore). The blocking calls run
+    on a dedicated, bounded thread pool so they never block the event loop, and every call but inserts
+    is subject to a timeout.
+    """
+
+    def __init__(self, milvus_manager, max_workers=8, timeout=30, metrics=None):
+        """
+        :param milvus_manager: The VectorBackend instance doing the actual work.
+        :param max_workers: Maximum number of concurrent Milvus calls.
+        :param timeout: Seconds after which a call is abandoned with asyncio.TimeoutError.
+        :param metrics: Optional Metrics registry receiving the time each call waits for a thread
+                        ("milvus.queue_wait") and runs ("milvus.<method name>").
+        """
+        self.milvus_manager = milvus_manager
+        self.timeout = timeout
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="milvus")
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking MilvusManager method on the Milvus thread pool, abandoned after the timeout."""
+        return await asyncio.wait_for(self._submit(func, *args, **kwargs), timeout=self.timeout)
+
+    def _submit(self, func, *args, **kwargs):
+        """Submit a blocking MilvusManager method to the Milvus thread pool and return its future."""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        if self.metrics is not None:
+            call = functools.partial(self._timed_call, call, f"milvus.{func.__name__}", time.perf_counter())
+        # Like asyncio.to_thread, run in a copy of the caller's context so metrics keep the request labels
+        context = contextvars.copy_context()
+        return loop.run_in_executor(self._executor, context.run, call)
+
+    def _timed_call(self, call, stage, submitted_at):
+        """Record how long a call waited for a free thread, then time the call itself."""
+        self.metrics.observe_stage("milvus.queue_wait", time.perf_counter() - submitted_at)
+        with self.metrics.span(stage):
+            return call()
+
+    async def create_tenant_collection(self, tenant_id, fields):
+        return await self._run(self.milvus_manager.create_tenant_collection, tenant_id=tenant_id, fields=fields)
+
+    async def filename_exists(self, tenant_id, filename):
+        return await self._run(self.milvus_manager.filename_exists, tenant_id=tenant_id, filename=filename)
+
+    async def get_file_hash(self, tenant_id, filename):
+        return await self._run(self.milvus_manager.get_file_hash, tenant_id=tenant_id, filename=filename)
+
+    async def existing_filenames(self, tenant_id, filenames):
+        return await self._run(self.milvus_manager.existing_filenames, tenant_id=tenant_id, filenames=filenames)
+
+    async def insert_data(self, tenant_id, data, flush=False, content_hashes=None, file_sizes=None):
+        # Not subject to the timeout: an abandoned insert would keep running and land after its job was
+        # marked as failed
+        return await self._submit(self.milvus_manager.insert_data, tenant_id=tenant_id, data=data, flush=flush,
+                                  content_hashes=content_hashes, file_sizes=file_sizes)
+
+    async def has_chunk_fields(self, tenant_id):
+        return await self._run(self.milvus_manager.has_chunk_fields, tenant_id=tenant_id)
+
+    async def get_file_chunks(self, tenant_id, filename, output_fields=("id", "chunk_hash", "page_number", "chunk_index", "text")):
+        return await self._run(self.milvus_manager.get_file_chunks, tenant_id=tenant_id, filename=filename,
+                               output_fields=output_fields)
+
+    async def get_vectors(self, tenant_id, ids):
+        return await self._run(self.milvus_manager.get_vectors, tenant_id=tenant_id, ids=ids)
+
+    async def delete_chunks(self, tenant_id, filename, ids, content_hash=None):
+        return await self._run(self.milvus_manager.delete_chunks, tenant_id=tenant_id, filename=filename, ids=ids,
+                               content_hash=content_hash)
+
+    async def flush(self, tenant_id):
+        return await self._run(self.milvus_manager.flush, tenant_id=tenant_id)
+
+    async def search(self, tenant_id, query_vectors, top_k=5, search_params=None):
+        return await self._run(self.milvus_manager.search, tenant_id=tenant_id, query_vectors=query_vectors,
+                               top_k=top_k, search_params=search_params)
+
+    async def search_with_filter(self, tenant_id, query_vectors, top_k=5, search_params=None, filter_expr=None):
+        return await self._run(self.milvus_manager.search_with_filter, tenant_id=tenant_id, query_vectors=query_vectors,
+                               top_k=top_k, search_params=search_params, filter_expr=filter_expr)
+
+    async def search_batch(self, tenant_id, query_vectors, top_k=5, search_params=None, filter_expr=None):
+        return await self._run(self.milvus_manager.search_batch, tenant_id=tenant_id, query_vectors=query_vectors,
+                               top_k=top_k, search_params=search_params, filter_expr=filter_expr)
+
+    async def list_file_details(self, tenant_id):
+        return await self._run(self.milvus_manager.list_file_details, tenant_id=tenant_id)
+
+    async def list_files(self, tenant_id, limit=1000):
+        return await self._run(self.milvus_manager.list_files, tenant_id=tenant_id, limit=limit)
+
+    async def delete_file_by_filename(self, tenant_id, filename):
+        return await self._run(self.milvus_manager.delete_file_by_filename, tenant_id=tenant_id, filename=filename)
+
+    async def drop_tenant_collection(self, tenant_id):
+        return await self._run(self.milvus_manager.drop_tenant_collection, tenant_id=tenant_id)
+
+    async def check_health(self):
+        return await self._run(self.milvus_manager.check_health)
+
+    def close(self):
+        """Wait for running calls and stop the thread pool."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,205 @@
+import logging
+import math
+import re
+import zlib
+from collections import Counter
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+class ContextBuilder:
+    """
+    Turns the search results of a query into the context sent to the LLM: optionally reranks a wide
+    candidate set, merges chunks of the same file whose texts overlap (consecutive chunks share
+    chunk_overlap tokens), drops near-duplicate chunks and packs the best remaining ones into a
+    token budget.
+
+    Rerankers run locally on the CPU: "lexical" fuses the retrieval order with a BM25 ranking of the
+    candidates, "cross_encoder" scores (query, chunk) pairs with a sentence-transformers CrossEncoder
+    (an optional dependency, loaded on first use; the lexical reranker is used when it is missing).
+    """
+
+    RERANKERS = ("lexical", "cross_encoder")
+
+    def __init__(self, max_tokens=3000, encoding_name="o200k_base", reranker=None,
+                 cross_encoder_model="cross-encoder/ms-marco-MiniLM-L-6-v2", min_overlap_chars=20,
+                 duplicate_threshold=0.8, shingle_size=3, separator="\n"):
+        """
+        :param max_tokens: Token budget of the context.
+        :param encoding_name: tiktoken encoding of the LLM, used to count tokens.
+        :param reranker: None, "lexical" or "cross_encoder".
+        :param cross_encoder_model: Name or path of the CrossEncoder model of the "cross_encoder" reranker.
+        :param min_overlap_chars: Minimum length of the text shared by two chunks for them to be merged.
+        :param duplicate_threshold: Jaccard similarity of the word shingles above which a chunk is a near-duplicate.
+        :param shingle_size: Number of words per shingle of the near-duplicate detection.
+        :param separator: Text placed between the chunks of the context.
+        """
+        if reranker is not None and reranker not in self.RERANKERS:
+            raise ValueError(f"Unknown reranker: {reranker}")
+        self.max_tokens = max_tokens
+        self.encoding_name = encoding_name
+        self.reranker = reranker
+        self.cross_encoder_model = cross_encoder_model
+        self.min_overlap_chars = min_overlap_chars
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+        self.separator = separator
+        self._encoding = None
+        self._cross_encoder = None
+
+    def count_tokens(self, text):
+        """
+        Count the tokens of a text, falling back to a character based estimate without tiktoken.
+        """
+        if self._encoding is None:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logging.warning(f"tiktoken unavailable, estimating context token counts: {e}")
+                self._encoding = False
+        if self._encoding is False:
+            return len(text) // 4 + 1
+        return len(self._encoding.encode_ordinary(text))
+
+    def _get_cross_encoder(self):
+        """Load the CrossEncoder on first use; None when sentence-transformers is not installed."""
+        if self._cross_encoder is None:
+            try:
+                from sentence_transformers import CrossEncoder
+                self._cross_encoder = CrossEncoder(self.cross_encoder_model, device="cpu")
+            except Exception as e:
+                logging.warning(f"Cross-encoder unavailable, reranking lexically: {e}")
+                self._cross_encoder = False
+        return self._cross_encoder or None
+
+    def _rerank_lexically(self, query, hits, rrf_k=60):
+        """Fuse the retrieval order with a BM25 ranking of the hits by reciprocal rank."""
+        documents = [Counter(_WORD_PATTERN.findall(hit["text"].lower())) for hit in hits]
+        average_length = sum(sum(document.values()) for document in documents) / len(documents) or 1
+        query_terms = set(_WORD_PATTERN.findall(query.lower()))
+        document_frequencies = Counter(term for document in documents for term in query_terms if term in document)
+
+        def bm25(document, k1=1.2, b=0.75):
+            length = sum(document.values())
+            score = 0.0
+            for term in query_terms:
+                frequency = document.get(term, 0)
+                if frequency:
+                    idf = math.log(1 + (len(documents) - document_frequencies[term] + 0.5) / (document_frequencies[term] + 0.5))
+                    score += idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / average_length))
+            return score
+
+        lexical_scores = [bm25(document) for document in documents]
+        lexical_order = sorted(range(len(hits)), key=lambda i: lexical_scores[i], reverse=True)
+        scores = [1.0 / (rrf_k + i + 1) for i in range(len(hits))]
+        for rank, i in enumerate(lexical_order, start=1):
+            # Hits sharing no term with the query get no lexical rank
+            if lexical_scores[i] > 0:
+                scores[i] += 1.0 / (rrf_k + rank)
+        return [hits[i] for i in sorted(range(len(hits)), key=lambda i: scores[i], reverse=True)]
+
+    def rerank(self, query, hits):
+        """
+        Reorder the hits with the configured reranker; returned unchanged without one.
+        """
+        if not self.reranker or len(hits) < 2:
+            return hits
+        if self.reranker == "cross_encoder":
+            cross_encoder = self._get_cross_encoder()
+            if cross_encoder is not None:
+                scores = cross_encoder.predict([(query, hit["text"]) for hit in hits])
+                return [hit for _, hit in sorted(zip(scores, hits), key=lambda pair: pair[0], reverse=True)]
+        return self._rerank_lexically(query, hits)
+
+    def _overlap(self, first, second):
+        """Length of the longest suffix of first that is a prefix of second, or 0 below min_overlap_chars."""
+        if len(first) < self.min_overlap_chars or len(second) < self.min_overlap_chars:
+            return 0
+        head = second[:self.min_overlap_chars]
+        position = first.find(head, max(0, len(first) - len(second)))
+        while position != -1:
+            if second.startswith(first[position:]):
+                return len(first) - position
+            position = first.find(head, position + 1)
+        return 0
+
+    def merge_overlapping(self, hits):
+        """
+        Merge hits of the same file whose texts overlap into one hit placed at the rank of the best of them.
+        A merged hit keeps the fields of its best hit, with the merged text and the ids of all its chunks.
+        """
+        merged = [dict(hit, ids=[hit.get("id")]) for hit in hits]
+        changed = True
+        while changed:
+            changed = False
+            for i, first in enumerate(merged):
+                for j, second in enumerate(merged):
+                    if i == j or first.get("filename") != second.get("filename"):
+                        continue
+                    overlap = self._overlap(first["text"], second["text"])
+                    if not overlap:
+                        continue
+                    # Keep the merged hit at the better rank of the two
+                    keep, drop = (i, j) if i < j else (j, i)
+                    merged[keep] = dict(merged[keep], text=first["text"] + second["text"][overlap:],
+                                        ids=first["ids"] + second["ids"])
+                    del merged[drop]
+                    changed = True
+                    break
+                if changed:
+                    break
+        return merged
+
+    def _shingles(self, text):
+        words = _WORD_PATTERN.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        return {zlib.crc32(" ".join(words[i:i + size]).encode()) for i in range(max(1, len(words) - size + 1))}
+
+    def drop_near_duplicates(self, hits):
+        """
+        Drop hits whose text is a near-duplicate of (or contained in) a better ranked hit.
+        """
+        kept = []
+        kept_shingles = []
+        for hit in hits:
+            shingles = self._shingles(hit["text"])
+            is_duplicate = False
+            for other, other_shingles in zip(kept, kept_shingles):
+                shared = len(shingles & other_shingles)
+                if (hit["text"] in other["text"] or shared / len(shingles | other_shingles) >= self.duplicate_threshold
+                        or shared / len(shingles) >= self.duplicate_threshold):
+                    is_duplicate = True
+                    break
+            if not is_duplicate:
+                kept.append(hit)
+                kept_shingles.append(shingles)
+        return kept
+
+    def pack(self, hits):
+        """
+        Keep the best hits fitting the token budget, in rank order. A hit too large for the remaining
+        budget is skipped so that smaller, lower ranked hits can still fill it.
+        """
+        separator_tokens = self.count_tokens(self.separator) if self.separator else 0
+        packed = []
+        used = 0
+        for hit in hits:
+            tokens = self.count_tokens(hit["text"]) + (separator_tokens if packed else 0)
+            if used + tokens <= self.max_tokens:
+                packed.append(hit)
+                used += tokens
+        return packed
+
+    def build(self, query, hits, max_hits=None):
+        """
+        Build the LLM context of a query from its search results.
+
+        :param query: The query text.
+        :param hits: Search results with "text" and "filename", best first.
+        :param max_hits: Maximum number of (merged) hits in the context, e.g. the top_k of the query.
+        :return: Tuple of (context text, hits in the context).
+        """
+        hits = self.drop_near_duplicates(self.merge_overlapping(self.rerank(query, hits)))
+        packed = self.pack(hits[:max_hits] if max_hits else hits)
+        return self.separator.join(hit["text"] for hit in packed), packed
@@ -1,17 +1,90 @@
-import re
-import string
+import os
+import time
 import logging
 import traceback
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.docstore.document import Document
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from .text_chunking import TextChunker
+from .text_cleaning import TextCleaner, clean_text
+
+
+@lru_cache(maxsize=None)
+def _get_text_chunker(chunk_size, chunk_overlap):
+    """
+    Build the tiktoken based text chunker once per process and chunking configuration.
+    """
+    return TextChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def _clean_and_split_page(page_text, page_number, file_name, chunk_size, chunk_overlap):
+    """
+    Clean and split a single page. Defined at module level so it can run in worker processes.
+
+    Parameters:
+    - page_text (str): The raw text extracted from the page.
+    - page_number (int): The page number stored in the chunk metadata.
+    - file_name (str): The name of the file the page belongs to.
+    - chunk_size (int): Maximum chunk size in tokens.
+    - chunk_overlap (int): Overlap between consecutive chunks in tokens.
+
+    Returns:
+        Tuple[List[Document], float, float]: The chunks of the page and the seconds spent cleaning and splitting it.
+    """
+    from langchain_community.docstore.document import Document
+
+    start = time.perf_counter()
+    page_document = Document(page_content=clean_text(page_text), metadata={"page_number": page_number, "file_name": file_name})
+    cleaned_at = time.perf_counter()
+    documents = _get_text_chunker(chunk_size, chunk_overlap).split_documents([page_document])
+    return documents, cleaned_at - start, time.perf_counter() - cleaned_at
+
 
 class DocumentGenerator:
 
-    def __init__(self) -> None:
-        pass
+    def __init__(self, chunk_size=300, chunk_overlap=30, max_workers=None, min_pages_for_workers=8, metrics=None) -> None:
+        """
+        Parameters:
+        - chunk_size (int): Maximum chunk size in tokens.
+        - chunk_overlap (int): Overlap between consecutive chunks in tokens.
+        - max_workers (int): Number of worker processes used to clean and split pages
+          (None lets the executor decide, 0 processes everything in the calling process).
+        - min_pages_for_workers (int): Documents with fewer pages are processed in the calling process.
+        - metrics (Metrics): Optional registry receiving the extraction, cleaning and splitting time of each document.
+        """
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_workers = max_workers
+        self.min_pages_for_workers = min_pages_for_workers
+        self.metrics = metrics
+        self.text_cleaner = TextCleaner(max_workers=max_workers)
+        self._executor = None
+
+    def close(self) -> None:
+        """
+        Shut down the worker processes, if any were started.
+        """
+        self.text_cleaner.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def warm_up(self) -> None:
+        """
+        Load the tiktoken encoding of the text chunker in the calling process, which splits small documents.
+        """
+        _get_text_chunker(self.chunk_size, self.chunk_overlap)
 
-    def clean_data(self, data) -> str:
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """
+        Lazily start the worker pool so it is shared across uploads.
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    @staticmethod
+    def clean_data(data) -> str:
         """
         Cleans raw text data by removing unnecessary characters, extra spaces, and formatting.
     
@@ -21,12 +94,7 @@ class DocumentGenerator:
         Returns:
             str: The cleaned text.
         """
-        cleaned_data = data.replace("’", "").replace('\xa0', ' ').replace("'", "").replace("", "")
-        cleaned_data = cleaned_data.translate(str.maketrans({key: " {0} ".format(key) for key in string.punctuation}))
-        cleaned_data = re.sub(r"\B([A-Z][a-z])", r" \1", cleaned_data)
-        cleaned_data = re.sub(r"[\([{})\]]", "", cleaned_data)
-        cleaned_data = re.sub(' +', r' ', cleaned_data).lower()
-        return cleaned_data
+        return clean_text(data)
 
     def clean_merge_document(self, document_list, file_name) -> list:
         """
@@ -41,11 +109,12 @@ class DocumentGenerator:
         """
         logging.info("Cleaning Documents")
         try:
+            from langchain_community.docstore.document import Document
+
             page_data = []
             page_documents = []
 
-            for page_number, content in enumerate(document_list):
-                cleaned_content = self.clean_data(content)
+            for page_number, cleaned_content in enumerate(self.text_cleaner.clean_batch(document_list)):
                 page_documents.append(Document(page_content=cleaned_content, metadata={"page_number": page_number + 1, "file_name": file_name}))
 
             return page_documents
@@ -54,37 +123,99 @@ class DocumentGenerator:
             logging.error(f"Error while Cleaning Documents: {e} trace_back:{traceback.format_exc()}")
             raise Exception(f"Error: {e}")
 
-    def generate_documents(self, file, file_name) -> list:
+    def _iter_page_texts(self, reader, timings):
         """
-        Generate and split documents from a PDF file using PyPDF2.
+        Extract the text of each page exactly once, skipping pages without text.
+
+        Parameters:
+        - reader (PdfReader): The opened PDF.
+        - timings (dict): Stage timings of the document; the extraction time is added to "pdf.extract".
+
+        Yields:
+            Tuple[int, str]: The page number (counting pages with text) and the raw page text.
+        """
+        page_number = 0
+        for page in reader.pages:
+            start = time.perf_counter()
+            page_text = page.extract_text()
+            timings["pdf.extract"] += time.perf_counter() - start
+            if page_text:
+                page_number += 1
+                yield page_number, page_text
+
+    def iter_documents(self, file, file_name):
+        """
+        Stream cleaned and split documents from a PDF file page by page, so that callers can
+        start processing chunks before the whole file has been parsed. Large documents are
+        cleaned and split in a pool of worker processes while the next pages are extracted.
 
         Parameters:
         - file (str): The path of the PDF file to be processed.
         - file_name (str): The name of the file being processed.
 
-        Returns:
-        List[Document]: List of cleaned and split documents.
+        Yields:
+            Document: Cleaned and split documents, in page order.
         """
         logging.info("Generating Documents")
         try:
-            # Use PyPDF2 to read the PDF file
-            reader = PdfReader(file)
-            document_texts = [page.extract_text() for page in reader.pages if page.extract_text()]
+            from PyPDF2 import PdfReader
 
-            if not document_texts:
+            reader = PdfReader(file)
+            timings = {"pdf.extract": 0.0, "pdf.clean": 0.0, "pdf.split": 0.0}
+            page_texts = self._iter_page_texts(reader, timings)
+            has_text = False
+
+            def page_chunks(result):
+                documents, clean_seconds, split_seconds = result
+                timings["pdf.clean"] += clean_seconds
+                timings["pdf.split"] += split_seconds
+                return documents
+
+            use_workers = self.max_workers != 0 and len(reader.pages) >= self.min_pages_for_workers
+            if not use_workers:
+                for page_number, page_text in page_texts:
+                    has_text = True
+                    yield from page_chunks(_clean_and_split_page(page_text, page_number, file_name, self.chunk_size, self.chunk_overlap))
+            else:
+                executor = self._get_executor()
+                # Keep a bounded window of pages in flight to overlap extraction with cleaning and splitting
+                max_in_flight = 2 * (self.max_workers or os.cpu_count() or 1)
+                in_flight = deque()
+                try:
+                    for page_number, page_text in page_texts:
+                        has_text = True
+                        in_flight.append(executor.submit(_clean_and_split_page, page_text, page_number, file_name, self.chunk_size, self.chunk_overlap))
+                        if len(in_flight) >= max_in_flight:
+                            yield from page_chunks(in_flight.popleft().result())
+                    while in_flight:
+                        yield from page_chunks(in_flight.popleft().result())
+                finally:
+                    # Drop queued pages if the consumer stopped early or a page failed
+                    for future in in_flight:
+                        future.cancel()
+
+            if not has_text:
                 raise Exception("No text found in the PDF file.")
 
-            # Clean and merge document pages
-            cleaned_pdf_documents = self.clean_merge_document(document_texts, file_name)
+            if self.metrics is not None:
+                for stage, seconds in timings.items():
+                    self.metrics.observe_stage(stage, seconds)
 
-            # Split the cleaned documents into smaller chunks
-            text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(chunk_size=300, chunk_overlap=30)
-            splitted_docs = text_splitter.split_documents(cleaned_pdf_documents)
-            
             logging.info("Documents Generated Successfully")
-        
-            return splitted_docs
 
         except Exception as e:
             logging.error(f"Error while Generating Documents: {e} trace_back:{traceback.format_exc()}")
             raise Exception(f"Error: {e}")
+
+    def generate_documents(self, file, file_name) -> list:
+        """
+        Generate and split documents from a PDF file using PyPDF2.
+
+        Parameters:
+        - file (str): The path of the PDF file to be processed.
+        - file_name (str): The name of the file being processed.
+
+        Returns:
+        List[Document]: List of cleaned and split documents.
+        """
+        return list(self.iter_documents(file, file_name))
@@ -0,0 +1,548 @@
+import ast
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from .vector_backend import VectorBackend
+from .vector_storage import VectorStorage
+
+
+class EmbeddedVectorStore(VectorBackend):
+    """
+    In-process vector store for single-node and test deployments, run in place of a Milvus server.
+
+    Each tenant's vectors are appended to a file of fixed-size rows (float32 or float16, following the
+    vector field of its schema) that is memory-mapped and searched exhaustively with numpy, which is
+    exact and fast enough up to a few hundred thousand chunks per tenant. Chunk ids, filenames, texts
+    and the file list are kept in a SQLite database next to the vector files.
+
+    Vectors are written before the rows referencing them are committed and truncated again if the commit
+    fails, so a crash can at most leave unreferenced vectors at the end of a file. Deleted chunks leave holes in the vector file, which is
+    rewritten under a new generation once most of its rows are holes; the switch to the new file is
+    committed together with the renumbered rows. The store is meant to be used by a single process.
+    """
+
+    _TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+    CHUNK_FIELDS = ("id", "filename", "text", "chunk_hash", "page_number", "chunk_index")
+    # Rows scored at a time by a search, bounding the float32 copies of float16 rows
+    SEARCH_BLOCK_ROWS = 8192
+
+    def __init__(self, directory="vector_store", compact_ratio=0.5, min_compact_rows=1000):
+        """
+        :param directory: Directory of the vector files and the metadata database.
+        :param compact_ratio: Fraction of deleted rows of a vector file above which it is rewritten.
+        :param min_compact_rows: Vector files with fewer deleted rows are never rewritten.
+        """
+        self.directory = directory
+        self.compact_ratio = compact_ratio
+        self.min_compact_rows = min_compact_rows
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+        self._connection = sqlite3.connect(os.path.join(directory, "metadata.sqlite3"), check_same_thread=False,
+                                           isolation_level=None, timeout=30)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS tenants (
+                tenant_id TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                vector_type TEXT NOT NULL,
+                generation INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tenant_id TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                text TEXT NOT NULL,
+                chunk_hash TEXT,
+                page_number INTEGER,
+                chunk_index INTEGER
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS chunks_by_file ON chunks (tenant_id, filename)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS chunks_by_row ON chunks (tenant_id, row)")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                tenant_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                chunks INTEGER NOT NULL,
+                size_bytes INTEGER,
+                content_hash TEXT,
+                uploaded_at REAL,
+                PRIMARY KEY (tenant_id, filename)
+            )
+        """)
+        # tenant_id -> {"field", "dtype", "path", "matrix" (memory map or None), "ids" (-1 for deleted rows), "filenames", "norms"}
+        self._tenants = {}
+
+    def _execute_in_transaction(self, operation):
+        """Run operation(connection) in a write transaction."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = operation(self._connection)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return result
+
+    def _get_tenant_key(self, tenant_id):
+        """Sanitized tenant id used in file names; anything but a plain identifier is rejected."""
+        if not self._TENANT_ID_PATTERN.match(tenant_id):
+            raise Exception(f"Invalid tenant id: {tenant_id!r}")
+        return tenant_id.replace("-", "_")
+
+    def _get_vector_path(self, tenant_id, vector_type, generation):
+        extension = "f16" if vector_type == "float16" else "f32"
+        return os.path.join(self.directory, f"tenant_{self._get_tenant_key(tenant_id)}.{generation}.{extension}")
+
+    def _get_tenant(self, tenant_id):
+        """
+        Return the search state of a tenant, loading it from disk on first use. Caller holds the lock.
+        """
+        tenant = self._tenants.get(tenant_id)
+        if tenant is not None:
+            return tenant
+
+        row = self._connection.execute("SELECT dim, vector_type, generation FROM tenants WHERE tenant_id = ?", (tenant_id,)).fetchone()
+        if row is None:
+            raise Exception(f"Collection tenant_{self._get_tenant_key(tenant_id)} does not exist.")
+        is_float16 = row["vector_type"] == "float16"
+        dtype = np.float16 if is_float16 else np.float32
+        path = self._get_vector_path(tenant_id, row["vector_type"], row["generation"])
+        row_bytes = row["dim"] * np.dtype(dtype).itemsize
+        num_rows = os.path.getsize(path) // row_bytes if os.path.exists(path) else 0
+        if os.path.exists(path) and os.path.getsize(path) != num_rows * row_bytes:
+            # A write interrupted by a crash; the partial row was never referenced
+            with open(path, "r+b") as f:
+                f.truncate(num_rows * row_bytes)
+
+        ids = np.full(num_rows, -1, dtype=np.int64)
+        filenames = np.empty(num_rows, dtype=object)
+        for chunk in self._connection.execute("SELECT id, row, filename FROM chunks WHERE tenant_id = ?", (tenant_id,)):
+            ids[chunk["row"]] = chunk["id"]
+            filenames[chunk["row"]] = chunk["filename"]
+
+        from pymilvus import DataType, FieldSchema
+        field = FieldSchema(name="vector", dtype=DataType.FLOAT16_VECTOR if is_float16 else DataType.FLOAT_VECTOR, dim=row["dim"])
+        tenant = {"dim": row["dim"], "vector_type": row["vector_type"], "generation": row["generation"], "field": field,
+                  "dtype": dtype, "path": path, "matrix": None, "ids": ids, "filenames": filenames,
+                  "norms": np.empty(0, dtype=np.float32)}
+        self._map_vectors(tenant, num_rows)
+        self._tenants[tenant_id] = tenant
+        return tenant
+
+    def _map_vectors(self, tenant, num_rows):
+        """Memory-map the first num_rows rows of a tenant's vector file and compute the squared norms of the new ones."""
+        known_rows = len(tenant["norms"])
+        tenant["matrix"] = (np.memmap(tenant["path"], dtype=tenant["dtype"], mode="r", shape=(num_rows, tenant["dim"]))
+                            if num_rows else None)
+        norms = [tenant["norms"]]
+        for start in range(known_rows, num_rows, self.SEARCH_BLOCK_ROWS):
+            block = np.asarray(tenant["matrix"][start:start + self.SEARCH_BLOCK_ROWS], dtype=np.float32)
+            norms.append((block ** 2).sum(axis=1))
+        tenant["norms"] = np.concatenate(norms)
+
+    def create_tenant_collection(self, tenant_id, fields):
+        """
+        Register a tenant, with the vector type and dimension of the vector field of its schema.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param fields: List of FieldSchema objects defining the schema.
+        """
+        try:
+            self._get_tenant_key(tenant_id)
+            from pymilvus import DataType
+            field = next(field for field in fields if field.name == "vector")
+            vector_type = "float16" if field.dtype == DataType.FLOAT16_VECTOR else "float32"
+            self._execute_in_transaction(lambda connection: connection.execute(
+                "INSERT OR IGNORE INTO tenants (tenant_id, dim, vector_type, created_at) VALUES (?, ?, ?, ?)",
+                (tenant_id, field.params["dim"], vector_type, time.time())
+            ))
+            logging.info(f"Embedded collection of tenant {tenant_id} created.")
+            return tenant_id
+
+        except Exception as e:
+            logging.error(f"Error occurred while creating collection : {e}")
+            raise Exception(f"Failed to create collection. Error: {e}")
+
+    def drop_tenant_collection(self, tenant_id):
+        """
+        Drop a tenant's chunks, files and vector file.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        """
+        with self._lock:
+            tenant = self._get_tenant(tenant_id)
+            self._tenants.pop(tenant_id, None)
+
+            def operation(connection):
+                for table in ("chunks", "files", "tenants"):
+                    connection.execute(f"DELETE FROM {table} WHERE tenant_id = ?", (tenant_id,))
+
+            self._execute_in_transaction(operation)
+            if os.path.exists(tenant["path"]):
+                os.remove(tenant["path"])
+        logging.info(f"Embedded collection of tenant {tenant_id} dropped.")
+
+    def list_collections(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT tenant_id FROM tenants ORDER BY tenant_id").fetchall()
+        return [f"tenant_{self._get_tenant_key(row['tenant_id'])}" for row in rows]
+
+    def get_file_hash(self, tenant_id, filename):
+        """
+        Look up a stored file of a tenant.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param filename: The filename to look up.
+        :return: Tuple of (True if the filename exists, content hash it was uploaded with or None).
+        """
+        with self._lock:
+            self._get_tenant(tenant_id)
+            row = self._connection.execute("SELECT content_hash FROM files WHERE tenant_id = ? AND filename = ?",
+                                           (tenant_id, filename)).fetchone()
+        return row is not None, row["content_hash"] if row is not None else None
+
+    def existing_filenames(self, tenant_id, filenames):
+        filenames = list(filenames)
+        with self._lock:
+            self._get_tenant(tenant_id)
+            rows = self._connection.execute(
+                f"SELECT filename FROM files WHERE tenant_id = ? AND filename IN ({', '.join('?' * len(filenames))})",
+                [tenant_id] + filenames
+            ).fetchall() if filenames else []
+        return {row["filename"] for row in rows}
+
+    def insert_data(self, tenant_id, data, flush=False, content_hashes=None, file_sizes=None):
+        """
+        Append chunks to a tenant's vector file and metadata.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param data: Columns of the chunks: vectors, filenames, texts, then optionally chunk hashes, page numbers and positions.
+        :param flush: fsync the vector file before returning.
+        :param content_hashes: Optional dict of filename -> content hash of the inserted files.
+        :param file_sizes: Optional dict of filename -> size in bytes of the inserted files.
+        :return: Primary keys of the inserted rows, in the order of the data.
+        """
+        if not data or not len(data[0]):
+            return []
+        vectors, filenames, texts = data[:3]
+        num_rows = len(vectors)
+        chunk_columns = [list(column) for column in data[3:6]] + [[None] * num_rows] * (3 - len(data[3:6]))
+        content_hashes = content_hashes or {}
+        file_sizes = file_sizes or {}
+
+        with self._lock:
+            tenant = self._get_tenant(tenant_id)
+            matrix = np.asarray(VectorStorage.encode_vectors(list(vectors), tenant["field"]), dtype=tenant["dtype"])
+            if matrix.shape != (num_rows, tenant["dim"]):
+                raise Exception(f"Expected vectors of dimension {tenant['dim']}, got shape {matrix.shape}.")
+
+            first_row = len(tenant["ids"])
+
+            def operation(connection):
+                ids = []
+                for i in range(num_rows):
+                    cursor = connection.execute(
+                        "INSERT INTO chunks (tenant_id, row, filename, text, chunk_hash, page_number, chunk_index) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (tenant_id, first_row + i, filenames[i], texts[i], chunk_columns[0][i], chunk_columns[1][i], chunk_columns[2][i])
+                    )
+                    ids.append(cursor.lastrowid)
+                now = time.time()
+                for filename, chunks in Counter(filenames).items():
+                    connection.execute(
+                        "INSERT INTO files (tenant_id, filename, chunks, size_bytes, content_hash, uploaded_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (tenant_id, filename) DO UPDATE SET "
+                        "chunks = chunks + excluded.chunks, size_bytes = COALESCE(excluded.size_bytes, size_bytes), "
+                        "content_hash = COALESCE(excluded.content_hash, content_hash), uploaded_at = excluded.uploaded_at",
+                        (tenant_id, filename, chunks, file_sizes.get(filename),
+                         content_hashes.get(filename), now)
+                    )
+                return ids
+
+            try:
+                with open(tenant["path"], "ab") as f:
+                    f.write(np.ascontiguousarray(matrix).tobytes())
+                    if flush:
+                        f.flush()
+                        os.fsync(f.fileno())
+                ids = self._execute_in_transaction(operation)
+            except BaseException:
+                # Drop the unreferenced vectors, which the rows of the next insert would otherwise point past
+                if os.path.exists(tenant["path"]):
+                    with open(tenant["path"], "r+b") as f:
+                        f.truncate(first_row * tenant["dim"] * np.dtype(tenant["dtype"]).itemsize)
+                raise
+            tenant["ids"] = np.concatenate([tenant["ids"], np.asarray(ids, dtype=np.int64)])
+            tenant["filenames"] = np.concatenate([tenant["filenames"], np.asarray(list(filenames), dtype=object)])
+            self._map_vectors(tenant, first_row + num_rows)
+
+        logging.info(f"{num_rows} chunks inserted for tenant {tenant_id}.")
+        return ids
+
+    def has_chunk_fields(self, tenant_id):
+        with self._lock:
+            self._get_tenant(tenant_id)
+        return True
+
+    def get_file_chunks(self, tenant_id, filename, output_fields=("id", "chunk_hash", "page_number", "chunk_index", "text")):
+        """
+        Read the stored chunks of a file.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param filename: The filename whose chunks are read.
+        :param output_fields: Fields returned for each chunk.
+        :return: List of row dicts.
+        """
+        unknown = set(output_fields) - set(self.CHUNK_FIELDS)
+        if unknown:
+            raise Exception(f"Unknown chunk fields: {sorted(unknown)}")
+        with self._lock:
+            self._get_tenant(tenant_id)
+            rows = self._connection.execute(
+                f"SELECT {', '.join(output_fields)} FROM chunks WHERE tenant_id = ? AND filename = ? ORDER BY row",
+                (tenant_id, filename)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_vectors(self, tenant_id, ids):
+        """
+        Read the stored vectors of chunks.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param ids: Primary keys of the chunks.
+        :return: Dict of primary key -> vector.
+        """
+        ids = list(ids)
+        with self._lock:
+            tenant = self._get_tenant(tenant_id)
+            rows = self._connection.execute(
+                f"SELECT id, row FROM chunks WHERE tenant_id = ? AND id IN ({', '.join('?' * len(ids))})", [tenant_id] + ids
+            ).fetchall() if ids else []
+            matrix = tenant["matrix"]
+            return {row["id"]: np.asarray(matrix[row["row"]], dtype=np.float32).tolist() for row in rows}
+
+    def _delete_rows(self, tenant_id, where, params, filename, content_hash=None, remove_file=False):
+        """
+        Delete the chunks of a file matching a condition and update its file entry. Caller holds the lock.
+
+        :return: Number of deleted chunks.
+        """
+        tenant = self._get_tenant(tenant_id)
+
+        def operation(connection):
+            rows = [row["row"] for row in connection.execute(
+                f"SELECT row FROM chunks WHERE tenant_id = ? AND filename = ? AND {where}", [tenant_id, filename] + params)]
+            connection.execute(f"DELETE FROM chunks WHERE tenant_id = ? AND filename = ? AND {where}", [tenant_id, filename] + params)
+            if remove_file:
+                connection.execute("DELETE FROM files WHERE tenant_id = ? AND filename = ?", (tenant_id, filename))
+            else:
+                connection.execute(
+                    "UPDATE files SET chunks = chunks - ?, content_hash = COALESCE(?, content_hash) WHERE tenant_id = ? AND filename = ?",
+                    (len(rows), content_hash, tenant_id, filename)
+                )
+            return rows
+
+        rows = self._execute_in_transaction(operation)
+        tenant["ids"][rows] = -1
+        tenant["filenames"][rows] = None
+        self._maybe_compact(tenant_id, tenant)
+        return len(rows)
+
+    def delete_chunks(self, tenant_id, filename, ids, content_hash=None):
+        """
+        Delete some chunks of a file, e.g. the chunks an updated file no longer has, and record the new
+        content hash of the file.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param filename: The file the chunks belong to.
+        :param ids: Primary keys of the chunks to delete.
+        :param content_hash: Optional new content hash of the file.
+        :return: Number of deleted chunks.
+        """
+        ids = list(ids)
+        try:
+            with self._lock:
+                if not ids:
+                    self._delete_rows(tenant_id, "0", [], filename, content_hash)
+                    return 0
+                return self._delete_rows(tenant_id, f"id IN ({', '.join('?' * len(ids))})", ids, filename, content_hash)
+
+        except Exception as e:
+            logging.error(f"Failed to delete {len(ids)} chunks of file '{filename}': {e}")
+            raise Exception(f"Failed to delete chunks. Error: {e}")
+
+    def delete_file_by_filename(self, tenant_id, filename):
+        """
+        Delete all the chunks of a file.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param filename: The filename to match and delete.
+        :return: Message telling how many chunks were deleted.
+        """
+        try:
+            with self._lock:
+                num_deleted = self._delete_rows(tenant_id, "1", [], filename, remove_file=True)
+            if num_deleted > 0:
+                return f"{num_deleted} entities with filename '{filename}' were deleted."
+            return f"No entities found with filename '{filename}'."
+
+        except Exception as e:
+            logging.error(f"Failed to delete file with filename '{filename}' from collection: {e}")
+            raise Exception(f"Failed to delete file. Error: {e}")
+
+    def _maybe_compact(self, tenant_id, tenant):
+        """
+        Rewrite a tenant's vector file without its deleted rows once they make up compact_ratio of it.
+        Caller holds the lock.
+        """
+        live = np.flatnonzero(tenant["ids"] >= 0)
+        num_deleted = len(tenant["ids"]) - len(live)
+        if num_deleted < self.min_compact_rows or num_deleted < self.compact_ratio * len(tenant["ids"]):
+            return
+
+        generation = tenant["generation"] + 1
+        path = self._get_vector_path(tenant_id, tenant["vector_type"], generation)
+        with open(path, "wb") as f:
+            for start in range(0, len(live), self.SEARCH_BLOCK_ROWS):
+                f.write(np.ascontiguousarray(tenant["matrix"][live[start:start + self.SEARCH_BLOCK_ROWS]]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        def operation(connection):
+            connection.executemany("UPDATE chunks SET row = ? WHERE id = ?",
+                                   [(new_row, int(tenant["ids"][old_row])) for new_row, old_row in enumerate(live)])
+            connection.execute("UPDATE tenants SET generation = ? WHERE tenant_id = ?", (generation, tenant_id))
+
+        try:
+            self._execute_in_transaction(operation)
+        except BaseException:
+            os.remove(path)
+            raise
+        os.remove(tenant["path"])
+
+        tenant.update(generation=generation, path=path, ids=tenant["ids"][live], filenames=tenant["filenames"][live],
+                      norms=tenant["norms"][live])
+        self._map_vectors(tenant, len(live))
+        logging.info(f"Vector file of tenant {tenant_id} compacted: {num_deleted} deleted rows removed.")
+
+    @staticmethod
+    def _parse_filter(filter_expr):
+        """Parse the `filename in [...]` filter expressions of the API into a set of filenames."""
+        if not filter_expr:
+            return None
+        match = re.fullmatch(r"\s*filename\s+in\s+(\[.*\])\s*", filter_expr)
+        if match is None:
+            raise Exception(f"Unsupported filter expression: {filter_expr}")
+        return set(ast.literal_eval(match.group(1)))
+
+    def search_batch(self, tenant_id, query_vectors, top_k=5, search_params=None, filter_expr=None):
+        """
+        Search many query vectors of a tenant exhaustively, keeping the results of each query apart.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param query_vectors: List of query vectors.
+        :param top_k: Number of top results to return per query.
+        :param search_params: Ignored, the search is exact.
+        :param filter_expr: Optional `filename in [...]` expression restricting the searched files.
+        :return: One list of results (including text and filename) per query vector, in the order of query_vectors.
+        """
+        try:
+            filenames = self._parse_filter(filter_expr)
+            with self._lock:
+                # Inserts and compactions replace these arrays, so the search works on a consistent snapshot
+                tenant = self._get_tenant(tenant_id)
+                matrix, ids, norms = tenant["matrix"], tenant["ids"].copy(), tenant["norms"]
+                valid = ids >= 0
+                if filenames is not None:
+                    valid &= np.isin(tenant["filenames"], list(filenames))
+                field = tenant["field"]
+            queries = np.asarray(VectorStorage.encode_vectors(list(query_vectors), field),
+                                 dtype=np.float32).reshape(len(query_vectors), field.params["dim"])
+
+            # Best top_k rows of each block, then the best top_k of those
+            candidate_rows, candidate_distances = [], []
+            for start in range(0, len(ids) if matrix is not None else 0, self.SEARCH_BLOCK_ROWS):
+                block = np.asarray(matrix[start:start + self.SEARCH_BLOCK_ROWS], dtype=np.float32)
+                distances = norms[start:start + len(block), None] - 2 * block @ queries.T + (queries ** 2).sum(axis=1)
+                distances[~valid[start:start + len(block)]] = np.inf
+                k = min(top_k, len(block))
+                best = np.argpartition(distances, k - 1, axis=0)[:k]
+                candidate_rows.append(best + start)
+                candidate_distances.append(np.take_along_axis(distances, best, axis=0))
+
+            results = [[] for _ in query_vectors]
+            if candidate_rows:
+                rows, distances = np.concatenate(candidate_rows), np.concatenate(candidate_distances)
+                order = np.argsort(distances, axis=0, kind="stable")[:top_k]
+                for j in range(len(query_vectors)):
+                    for position in order[:, j]:
+                        if np.isfinite(distances[position, j]):
+                            results[j].append({"id": int(ids[rows[position, j]]), "distance": float(distances[position, j])})
+
+            hit_ids = sorted({hit["id"] for hits in results for hit in hits})
+            with self._lock:
+                chunks = {row["id"]: row for row in self._connection.execute(
+                    f"SELECT id, filename, text FROM chunks WHERE id IN ({', '.join('?' * len(hit_ids))})", hit_ids
+                )} if hit_ids else {}
+            # Chunks deleted since the search ran are left out
+            return [[dict(hit, text=chunks[hit["id"]]["text"], filename=chunks[hit["id"]]["filename"])
+                     for hit in hits if hit["id"] in chunks] for hits in results]
+
+        except Exception as e:
+            logging.error(f"Batch search failed: {e}")
+            raise
+
+    def list_file_details(self, tenant_id):
+        """
+        List the files of a tenant with their chunk count, size, upload time and content hash.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :return: List of file dicts sorted by filename.
+        """
+        with self._lock:
+            self._get_tenant(tenant_id)
+            rows = self._connection.execute(
+                "SELECT filename, chunks, size_bytes, content_hash, uploaded_at FROM files WHERE tenant_id = ? ORDER BY filename",
+                (tenant_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def flush(self, tenant_id):
+        """fsync the tenant's vector file."""
+        with self._lock:
+            tenant = self._get_tenant(tenant_id)
+            if os.path.exists(tenant["path"]):
+                with open(tenant["path"], "rb+") as f:
+                    os.fsync(f.fileno())
+
+    def flush_pending(self):
+        """fsync the vector files of the tenants used by this process."""
+        with self._lock:
+            tenant_ids = list(self._tenants)
+        for tenant_id in tenant_ids:
+            try:
+                self.flush(tenant_id)
+            except Exception as e:
+                logging.error(f"Failed to flush the vectors of tenant {tenant_id}: {e}")
+
+    def close(self):
+        """Close the memory maps and the SQLite connection."""
+        with self._lock:
+            self._tenants.clear()
+            self._connection.close()
@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache with an in-memory LRU tier in front of a SQLite tier.
+
+    Entries are keyed by a hash of the model name and the normalized text, so identical chunks
+    of re-uploaded documents and repeated questions are only embedded once.
+    """
+
+    def __init__(self, path="embedding_cache.sqlite3", max_memory_entries=50000):
+        """
+        :param path: Path of the SQLite database (None keeps only the memory tier).
+        :param max_memory_entries: Maximum number of embeddings kept in memory.
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        self._connection = None
+        if path:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._connection.commit()
+
+    @staticmethod
+    def normalize(text):
+        """Normalize whitespace so that formatting-only differences share a cache entry."""
+        return " ".join(text.split())
+
+    @classmethod
+    def make_key(cls, model_name, text):
+        """Build the cache key of a text embedded with a given model."""
+        return hashlib.sha256(f"{model_name}\0{cls.normalize(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """
+        Look up embeddings, promoting disk hits to the memory tier.
+
+        :param keys: List of cache keys.
+        :return: Dict of key -> embedding for the keys found in the cache.
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                embedding = self._memory.get(key)
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = embedding
+            self._stats["memory_hits"] += len(found)
+
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            if self._connection is not None and missing:
+                # Stay below SQLite's bound parameter limit
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._connection.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        embedding = array("f", blob).tolist()
+                        found[key] = embedding
+                        self._remember(key, embedding)
+                        self._stats["disk_hits"] += 1
+
+            self._stats["misses"] += sum(1 for key in missing if key not in found)
+        return found
+
+    def set_many(self, items):
+        """
+        Store embeddings in both tiers.
+
+        :param items: Dict of key -> embedding.
+        """
+        with self._lock:
+            for key, embedding in items.items():
+                self._remember(key, embedding)
+            if self._connection is not None and items:
+                try:
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                        [(key, array("f", embedding).tobytes()) for key, embedding in items.items()]
+                    )
+                    self._connection.commit()
+                except sqlite3.Error as e:
+                    logging.warning(f"Failed to persist embeddings to the cache: {e}")
+
+    def _remember(self, key, embedding):
+        """Insert into the memory tier, evicting the least recently used entries. Caller holds the lock."""
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        """
+        Return hit/miss counters and the hit rate of the cache.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        """Close the SQLite connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class CachedEmbeddings:
+    """
+    Embedder wrapper that serves embed_documents / embed_query from an EmbeddingCache and only
+    forwards texts that were never embedded with the same model.
+    """
+
+    def __init__(self, embedder, cache, model_name=None, embedder_factory=None):
+        """
+        :param embedder: Object exposing embed_documents(texts) and embed_query(text), or None to build it
+                         with embedder_factory on first use.
+        :param cache: The EmbeddingCache instance.
+        :param model_name: Name used in the cache key (defaults to the embedder's model; required with embedder_factory).
+        :param embedder_factory: Callable without arguments returning the embedder, used when embedder is None.
+        """
+        if embedder is None and (embedder_factory is None or model_name is None):
+            raise ValueError("An embedder built on first use needs an embedder_factory and a model_name")
+        self._embedder = embedder
+        self._embedder_factory = embedder_factory
+        self._embedder_lock = threading.Lock()
+        self.cache = cache
+        self.model_name = model_name or getattr(embedder, "model", None) or type(embedder).__name__
+
+    @property
+    def embedder(self):
+        """The wrapped embedder, built by the embedder factory on first use."""
+        if self._embedder is None:
+            with self._embedder_lock:
+                if self._embedder is None:
+                    self._embedder = self._embedder_factory()
+        return self._embedder
+
+    @embedder.setter
+    def embedder(self, embedder):
+        self._embedder = embedder
+
+    def embed_documents(self, texts):
+        """
+        Embed texts, calling the wrapped embedder only for cache misses (each distinct text once).
+        """
+        keys = [self.cache.make_key(self.model_name, text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            embeddings = self.embedder.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), embeddings))
+            self.cache.set_many(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        """
+        Embed a query, sharing cache entries with identical document texts.
+        """
+        key = self.cache.make_key(self.model_name, text)
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key]
+
+        embedding = self.embedder.embed_query(text)
+        self.cache.set_many({key: embedding})
+        return embedding
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import nullcontext
+
+
+class EmbeddingService:
+    """
+    Async front-end for a LangChain style embedder (anything with embed_documents / embed_query).
+
+    Documents are packed into token-bounded batches that are embedded with bounded concurrency,
+    retried with exponential backoff, and paused together when the provider reports a rate limit.
+    Queries arriving within a few milliseconds of each other are coalesced into one batched call.
+    The blocking embedder calls run in worker threads so they never block the event loop.
+    """
+
+    def __init__(self, embedder, max_batch_tokens=50000, max_batch_size=512, max_concurrency=4,
+                 max_retries=5, initial_backoff=1.0, max_backoff=30.0, query_coalesce_window=0.005,
+                 encoding_name="cl100k_base", metrics=None):
+        """
+        :param embedder: Object exposing embed_documents(texts) and embed_query(text).
+        :param max_batch_tokens: Maximum number of tokens sent in one embedding request.
+        :param max_batch_size: Maximum number of texts sent in one embedding request.
+        :param max_concurrency: Maximum number of embedding requests in flight.
+        :param max_retries: Number of retries of a failed embedding request.
+        :param initial_backoff: Initial retry delay in seconds, doubled after every failure.
+        :param max_backoff: Upper bound of the retry delay in seconds.
+        :param query_coalesce_window: Seconds to wait for more queries before embedding them together.
+        :param encoding_name: tiktoken encoding used to count tokens.
+        :param metrics: Optional Metrics registry receiving the duration of each embedding request ("embedding").
+        """
+        self.embedder = embedder
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.query_coalesce_window = query_coalesce_window
+        self.encoding_name = encoding_name
+        self.metrics = metrics
+
+        self._max_concurrency = max_concurrency
+        self._semaphore = None
+        self._encoding = None
+        # Monotonic time until which all requests hold off after a rate limit response
+        self._rate_limited_until = 0.0
+        # Queries waiting to be coalesced: list of (text, future)
+        self._pending_queries = []
+        self._query_flush_handle = None
+        # Running query flush tasks, referenced so they are not garbage-collected while callers await them
+        self._flush_tasks = set()
+
+    def _get_semaphore(self):
+        """Create the concurrency limiter lazily so it binds to the running event loop."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphore
+
+    def count_tokens(self, text):
+        """
+        Count the tokens of a text, falling back to a character based estimate without tiktoken.
+        """
+        if self._encoding is None:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logging.warning(f"tiktoken unavailable, estimating token counts: {e}")
+                self._encoding = False
+        if self._encoding is False:
+            return len(text) // 4 + 1
+        return len(self._encoding.encode_ordinary(text))
+
+    def make_batches(self, texts):
+        """
+        Split texts into consecutive batches bounded by max_batch_tokens and max_batch_size.
+
+        :param texts: List of texts.
+        :return: List of (start, end) index ranges into texts.
+        """
+        batches = []
+        start = 0
+        batch_tokens = 0
+        for i, text in enumerate(texts):
+            num_tokens = self.count_tokens(text)
+            if i > start and (batch_tokens + num_tokens > self.max_batch_tokens or i - start >= self.max_batch_size):
+                batches.append((start, i))
+                start = i
+                batch_tokens = 0
+            batch_tokens += num_tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    @staticmethod
+    def _is_rate_limit_error(error):
+        """Recognise rate limit errors of the OpenAI client (and similar HTTP clients)."""
+        if getattr(error, "status_code", None) == 429:
+            return True
+        return "ratelimit" in type(error).__name__.lower()
+
+    @classmethod
+    def _is_retryable_error(cls, error):
+        """
+        Recognise transient errors worth retrying: rate limits, server errors (5xx), timeouts and
+        connection errors. Other errors (e.g. 400 or 401) would fail again and are raised at once.
+        """
+        if cls._is_rate_limit_error(error):
+            return True
+        status_code = getattr(error, "status_code", None)
+        if isinstance(status_code, int):
+            return status_code >= 500
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+            return True
+        name = type(error).__name__.lower()
+        return "timeout" in name or "connection" in name
+
+    @staticmethod
+    def _get_retry_after(error):
+        """Return the Retry-After delay advertised by the provider, if any."""
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        try:
+            return float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return None
+
+    async def _call_with_retries(self, func, *args):
+        """
+        Run a blocking embedder call in a worker thread, bounded by the concurrency limit. Transient
+        errors are retried with exponential backoff and jitter.
+        """
+        backoff = self.initial_backoff
+        for attempt in range(self.max_retries + 1):
+            # Hold off while another request is backing off from a rate limit
+            delay = self._rate_limited_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                async with self._get_semaphore():
+                    with self.metrics.span("embedding") if self.metrics is not None else nullcontext():
+                        return await asyncio.to_thread(func, *args)
+            except Exception as e:
+                if attempt == self.max_retries or not self._is_retryable_error(e):
+                    raise
+                delay = min(backoff, self.max_backoff) * (1 + random.random() / 2)
+                if self._is_rate_limit_error(e):
+                    delay = self._get_retry_after(e) or delay
+                    self._rate_limited_until = max(self._rate_limited_until, time.monotonic() + delay)
+                logging.warning(f"Embedding request failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                backoff *= 2
+
+    async def embed_documents(self, texts):
+        """
+        Embed a list of texts in token-bounded batches sent concurrently.
+
+        :param texts: List of texts to embed.
+        :return: List of embeddings in the order of texts.
+        """
+        if not texts:
+            return []
+
+        batches = self.make_batches(texts)
+        results = await asyncio.gather(*[
+            self._call_with_retries(self.embedder.embed_documents, texts[start:end])
+            for start, end in batches
+        ])
+
+        embeddings = [embedding for batch in results for embedding in batch]
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Mismatch between number of embeddings and texts. {len(embeddings)}, {len(texts)}")
+        return embeddings
+
+    async def embed_query(self, text):
+        """
+        Embed a query. Queries received within query_coalesce_window are embedded in one request.
+
+        :param text: The query text.
+        :return: The query embedding.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_queries.append((text, future))
+        if self._query_flush_handle is None:
+            self._query_flush_handle = loop.call_later(self.query_coalesce_window, self._schedule_query_flush)
+        return await future
+
+    def _schedule_query_flush(self):
+        """Hand the queries collected during the coalescing window over to a flush task."""
+        pending, self._pending_queries = self._pending_queries, []
+        self._query_flush_handle = None
+        task = asyncio.ensure_future(self._flush_queries(pending))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_queries(self, pending):
+        """Embed a group of coalesced queries and resolve their futures."""
+        texts = [text for text, _ in pending]
+        try:
+            if len(texts) == 1:
+                embeddings = [await self._call_with_retries(self.embedder.embed_query, texts[0])]
+            else:
+                # OpenAI query embeddings are plain document embeddings, so they can share one request
+                embeddings = await self._call_with_retries(self.embedder.embed_documents, texts)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), embedding in zip(pending, embeddings):
+            if not future.done():
+                future.set_result(embedding)
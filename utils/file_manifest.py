@@ -0,0 +1,180 @@
+import sqlite3
+import threading
+import time
+
+
+class FileManifest:
+    """
+    SQLite-backed per-tenant manifest of the stored files: filename, chunk count, size, upload time
+    and content hash. It is maintained on insert and delete, so listing a tenant's files reads one
+    row per file instead of every chunk.
+
+    A tenant is tracked once the manifest is known to hold all of its files: from the creation of
+    its collection, or after tools.backfill_file_manifest ran for collections created before.
+    Callers fall back to the vector store for tenants that are not tracked.
+
+    Every change to the files of a tracked tenant bumps its revision, so that the workers sharing
+    the manifest can tell when their in-memory copy of the tenant's files is stale.
+    """
+
+    def __init__(self, path="file_manifest.sqlite3"):
+        """
+        :param path: Path of the SQLite database.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                tenant_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                chunks INTEGER NOT NULL,
+                size_bytes INTEGER,
+                content_hash TEXT,
+                uploaded_at REAL,
+                PRIMARY KEY (tenant_id, filename)
+            )
+        """)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS tenants (tenant_id TEXT PRIMARY KEY, tracked_since REAL NOT NULL, "
+            "revision INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row["name"] for row in self._connection.execute("PRAGMA table_info(tenants)")}
+        if "revision" not in columns:
+            # Databases created before the revisions
+            self._connection.execute("ALTER TABLE tenants ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+
+    def _execute_in_transaction(self, operation):
+        """Run operation(connection) in a write transaction, serialized across threads and processes."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = operation(self._connection)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return result
+
+    def track_tenant(self, tenant_id):
+        """
+        Mark a tenant as fully described by the manifest, e.g. when its collection is created empty.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        """
+        with self._lock:
+            self._connection.execute("INSERT OR IGNORE INTO tenants (tenant_id, tracked_since) VALUES (?, ?)",
+                                     (tenant_id, time.time()))
+
+    @staticmethod
+    def _bump_revision(connection, tenant_id):
+        connection.execute("UPDATE tenants SET revision = revision + 1 WHERE tenant_id = ?", (tenant_id,))
+
+    def get_revision(self, tenant_id):
+        """
+        Return the revision of a tenant, bumped by every change to its files.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :return: The revision, or None when the tenant is not tracked.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT revision FROM tenants WHERE tenant_id = ?", (tenant_id,)).fetchone()
+        return row["revision"] if row is not None else None
+
+    def is_tracked(self, tenant_id):
+        """Return whether the manifest holds all the files of a tenant."""
+        with self._lock:
+            row = self._connection.execute("SELECT 1 FROM tenants WHERE tenant_id = ?", (tenant_id,)).fetchone()
+        return row is not None
+
+    def record_files(self, tenant_id, files, uploaded_at=None):
+        """
+        Record inserted chunks. Chunk counts add up when a file is inserted in several calls; negative
+        counts record deleted chunks of an updated file.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param files: Dict of filename -> {"chunks": int, "size_bytes": int or None, "content_hash": str or None}.
+        :param uploaded_at: Upload time (defaults to now).
+        """
+        uploaded_at = uploaded_at or time.time()
+
+        def operation(connection):
+            connection.executemany(
+                "INSERT INTO files (tenant_id, filename, chunks, size_bytes, content_hash, uploaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (tenant_id, filename) DO UPDATE SET "
+                "chunks = chunks + excluded.chunks, size_bytes = COALESCE(excluded.size_bytes, size_bytes), "
+                "content_hash = COALESCE(excluded.content_hash, content_hash)",
+                [(tenant_id, filename, info["chunks"], info.get("size_bytes"), info.get("content_hash"), uploaded_at)
+                 for filename, info in files.items()]
+            )
+            self._bump_revision(connection, tenant_id)
+
+        self._execute_in_transaction(operation)
+
+    def remove_file(self, tenant_id, filename):
+        """Forget a deleted file of a tenant."""
+        def operation(connection):
+            connection.execute("DELETE FROM files WHERE tenant_id = ? AND filename = ?", (tenant_id, filename))
+            self._bump_revision(connection, tenant_id)
+
+        self._execute_in_transaction(operation)
+
+    def drop_tenant(self, tenant_id):
+        """Forget a tenant and all of its files, e.g. after its collection was dropped."""
+        def operation(connection):
+            connection.execute("DELETE FROM files WHERE tenant_id = ?", (tenant_id,))
+            connection.execute("DELETE FROM tenants WHERE tenant_id = ?", (tenant_id,))
+
+        self._execute_in_transaction(operation)
+
+    def backfill(self, tenant_id, chunk_counts, scan_started_at):
+        """
+        Rebuild the manifest of a tenant from a scan of its chunks and mark the tenant as tracked.
+        Files recorded after the scan started are kept; sizes and hashes already known are kept.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param chunk_counts: Dict of filename -> number of chunks found by the scan.
+        :param scan_started_at: Time the scan started.
+        """
+        def operation(connection):
+            connection.execute("CREATE TEMP TABLE IF NOT EXISTS scanned (filename TEXT PRIMARY KEY)")
+            connection.execute("DELETE FROM scanned")
+            connection.executemany("INSERT INTO scanned (filename) VALUES (?)", [(filename,) for filename in chunk_counts])
+            connection.execute(
+                "DELETE FROM files WHERE tenant_id = ? AND filename NOT IN (SELECT filename FROM scanned) "
+                "AND (uploaded_at IS NULL OR uploaded_at < ?)", (tenant_id, scan_started_at)
+            )
+            connection.executemany(
+                "INSERT INTO files (tenant_id, filename, chunks) VALUES (?, ?, ?) "
+                "ON CONFLICT (tenant_id, filename) DO UPDATE SET chunks = excluded.chunks",
+                [(tenant_id, filename, chunks) for filename, chunks in chunk_counts.items()]
+            )
+            connection.execute("INSERT OR IGNORE INTO tenants (tenant_id, tracked_since) VALUES (?, ?)",
+                               (tenant_id, scan_started_at))
+            self._bump_revision(connection, tenant_id)
+
+        self._execute_in_transaction(operation)
+
+    def list_files(self, tenant_id):
+        """
+        List the files of a tenant.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :return: List of file dicts sorted by filename, or None when the tenant is not tracked.
+        """
+        with self._lock:
+            if self._connection.execute("SELECT 1 FROM tenants WHERE tenant_id = ?", (tenant_id,)).fetchone() is None:
+                return None
+            rows = self._connection.execute(
+                "SELECT filename, chunks, size_bytes, content_hash, uploaded_at FROM files WHERE tenant_id = ? ORDER BY filename",
+                (tenant_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """Close the SQLite connection."""
+        with self._lock:
+            self._connection.close()
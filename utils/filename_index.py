@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class FilenameIndex:
+    """
+    In-memory per-tenant index of the stored filenames and the content hash they were uploaded with.
+
+    A tenant is loaded from the file manifest or the vector store and then kept in sync by the
+    inserts and deletes of this process. Each tenant has a generation counter bumped by every
+    change; a load that raced with a change is discarded instead of installing a stale file set.
+
+    The index lives in the process memory, so changes made by other workers are only seen on a
+    reload: a tenant loaded from the file manifest is reloaded as soon as the manifest revision
+    differs from the one it was loaded at, and a tenant read from the vector store after ttl seconds.
+    """
+
+    def __init__(self, max_tenants=10000, ttl=60):
+        """
+        :param max_tenants: Maximum number of tenants kept in memory (least recently used are dropped).
+        :param ttl: Seconds after which a tenant loaded without a manifest revision is read again.
+        """
+        self.max_tenants = max_tenants
+        self.ttl = ttl
+        # tenant_id -> {filename: content hash, or None when the file predates the index}
+        self._tenants = OrderedDict()
+        # tenant_id -> (monotonic load time, manifest revision or None) of the loaded tenants
+        self._sources = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant_id, revision=None):
+        """
+        Return a copy of the indexed files of a tenant.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param revision: Current manifest revision of the tenant, or None if the manifest does not track it.
+        :return: Dict of filename -> content hash, or None when the tenant is not loaded or is stale.
+        """
+        with self._lock:
+            files = self._tenants.get(tenant_id)
+            if files is None:
+                return None
+            loaded_at, loaded_revision = self._sources[tenant_id]
+            if revision is not None:
+                is_stale = loaded_revision != revision
+            else:
+                is_stale = loaded_revision is not None or time.monotonic() - loaded_at > self.ttl
+            if is_stale:
+                del self._tenants[tenant_id]
+                del self._sources[tenant_id]
+                return None
+            self._tenants.move_to_end(tenant_id)
+            return dict(files)
+
+    def get_generation(self, tenant_id):
+        """
+        Return the current generation of a tenant; pass it to load() to detect concurrent changes.
+        """
+        with self._lock:
+            return self._generations.get(tenant_id, 0)
+
+    def load(self, tenant_id, files, generation, revision=None):
+        """
+        Install the file set of a tenant read from the vector store or the file manifest.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param files: Dict of filename -> content hash (None if unknown) of all the files of the tenant.
+        :param generation: Generation of the tenant when the read started.
+        :param revision: Manifest revision read before the files, or None when they were not read from the manifest.
+        :return: True if the file set was installed, False if the tenant changed during the read.
+        """
+        with self._lock:
+            if self._generations.get(tenant_id, 0) != generation:
+                return False
+            self._tenants[tenant_id] = dict(files)
+            self._sources[tenant_id] = (time.monotonic(), revision)
+            self._tenants.move_to_end(tenant_id)
+            while len(self._tenants) > self.max_tenants:
+                evicted, _ = self._tenants.popitem(last=False)
+                del self._sources[evicted]
+            return True
+
+    def _bump(self, tenant_id):
+        self._generations[tenant_id] = self._generations.get(tenant_id, 0) + 1
+
+    def add(self, tenant_id, files):
+        """
+        Record inserted files of a tenant.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param files: Dict of filename -> content hash (None if unknown).
+        """
+        with self._lock:
+            self._bump(tenant_id)
+            if tenant_id in self._tenants:
+                self._tenants[tenant_id].update(files)
+
+    def discard(self, tenant_id, filename):
+        """
+        Record the deletion of a file of a tenant.
+        """
+        with self._lock:
+            self._bump(tenant_id)
+            if tenant_id in self._tenants:
+                self._tenants[tenant_id].pop(filename, None)
+
+    def drop(self, tenant_id):
+        """
+        Forget every file of a tenant, e.g. after its collection was dropped.
+        """
+        with self._lock:
+            self._bump(tenant_id)
+            self._tenants.pop(tenant_id, None)
+            self._sources.pop(tenant_id, None)
@@ -0,0 +1,173 @@
+import math
+
+
+class IndexPolicy:
+    """
+    Picks the vector index of a collection from its size and a memory budget, and the search
+    parameters matching that index.
+
+    Collections move up a ladder as they grow: FLAT (exact search, no training) for small
+    collections, HNSW while its graph fits the memory budget, then IVF_FLAT and IVF_SQ8 (vectors
+    quantized to one byte per dimension) for the largest ones. With a quantization set, collections
+    past FLAT go straight to IVF_SQ8 or IVF_PQ (product quantization, pq_m bytes per vector) to keep
+    the memory of loaded collections down. A collection never moves down the ladder when it shrinks
+    (or when the quantization is turned off), so deletes do not trigger rebuilds.
+    """
+
+    # Index types from the smallest to the largest collections they are meant for
+    INDEX_LADDER = ("FLAT", "HNSW", "IVF_FLAT", "IVF_SQ8", "IVF_PQ")
+    IVF_INDEXES = ("IVF_FLAT", "IVF_SQ8", "IVF_PQ")
+    QUANTIZED_INDEXES = {"SQ8": "IVF_SQ8", "PQ": "IVF_PQ"}
+    # (minimum row count, nlist) pairs of the IVF indexes, sorted by row count
+    DEFAULT_NLIST_TIERS = ((0, 128), (100_000, 1024), (1_000_000, 4096))
+
+    def __init__(self, metric_type="L2", dim=1536, flat_max_rows=20_000, hnsw_max_rows=2_000_000,
+                 memory_budget_bytes=None, nlist_tiers=DEFAULT_NLIST_TIERS, hnsw_m=16, hnsw_ef_construction=200,
+                 nprobe_ratio=1 / 32, min_nprobe=16, min_ef=64, bytes_per_dim=4, quantization=None, pq_m=None):
+        """
+        :param metric_type: Distance metric of the indexes and searches.
+        :param dim: Dimension of the vectors, used to estimate the memory of an index.
+        :param flat_max_rows: Collections with fewer rows are searched exhaustively (FLAT).
+        :param hnsw_max_rows: Collections with fewer rows get an HNSW index if it fits the memory budget.
+        :param memory_budget_bytes: Memory one collection's index may use, or None for no limit.
+        :param nlist_tiers: (minimum row count, nlist) pairs of the IVF indexes.
+        :param hnsw_m: Number of graph neighbours per vector of the HNSW indexes.
+        :param hnsw_ef_construction: Candidate list size used while building the HNSW indexes.
+        :param nprobe_ratio: Fraction of the IVF clusters probed per search.
+        :param min_nprobe: Minimum number of IVF clusters probed per search.
+        :param min_ef: Minimum candidate list size of the HNSW searches.
+        :param bytes_per_dim: Bytes per stored vector dimension: 4 for float32 vectors, 2 for float16.
+        :param quantization: None, "SQ8" or "PQ": quantized index of the collections past flat_max_rows.
+        :param pq_m: Number of sub-vectors of the IVF_PQ indexes, a divisor of dim; defaults to dim / 8 (or the nearest divisor).
+        """
+        if quantization is not None and quantization not in self.QUANTIZED_INDEXES:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        if pq_m is not None and dim % pq_m:
+            raise ValueError(f"pq_m must divide the dimension {dim}")
+        self.metric_type = metric_type
+        self.dim = dim
+        self.flat_max_rows = flat_max_rows
+        self.hnsw_max_rows = hnsw_max_rows
+        self.memory_budget_bytes = memory_budget_bytes
+        self.nlist_tiers = sorted(nlist_tiers)
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.nprobe_ratio = nprobe_ratio
+        self.min_nprobe = min_nprobe
+        self.min_ef = min_ef
+        self.bytes_per_dim = bytes_per_dim
+        self.quantization = quantization
+        self.pq_m = pq_m or next(m for m in range(max(1, dim // 8), 0, -1) if dim % m == 0)
+
+    def get_nlist(self, num_rows):
+        """Return the number of IVF clusters for a collection of num_rows entities."""
+        nlist = self.nlist_tiers[0][1]
+        for min_rows, tier_nlist in self.nlist_tiers:
+            if num_rows >= min_rows:
+                nlist = tier_nlist
+        return nlist
+
+    def estimate_memory(self, index_type, num_rows):
+        """
+        Estimate the memory in bytes of an index over num_rows vectors.
+        """
+        if index_type == "IVF_SQ8":
+            return num_rows * self.dim
+        if index_type == "IVF_PQ":
+            # One byte code per sub-vector, plus the 256 centroids of each sub-vector
+            return num_rows * self.pq_m + 256 * self.dim * 4
+        if index_type == "HNSW":
+            # Full vectors plus about 2 * M neighbour ids per vector on the bottom layer
+            return num_rows * (self.dim * self.bytes_per_dim + self.hnsw_m * 2 * 4)
+        return num_rows * self.dim * self.bytes_per_dim
+
+    def build_index_params(self, index_type, num_rows=0):
+        """
+        Build the index parameters of an index type for a collection of num_rows entities.
+
+        :param index_type: One of INDEX_LADDER.
+        :param num_rows: Number of entities in the collection.
+        :return: Index parameters for create_index.
+        """
+        if index_type == "FLAT":
+            params = {}
+        elif index_type == "HNSW":
+            params = {"M": self.hnsw_m, "efConstruction": self.hnsw_ef_construction}
+        elif index_type in ("IVF_FLAT", "IVF_SQ8"):
+            params = {"nlist": self.get_nlist(num_rows)}
+        elif index_type == "IVF_PQ":
+            params = {"nlist": self.get_nlist(num_rows), "m": self.pq_m, "nbits": 8}
+        else:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        return {"index_type": index_type, "metric_type": self.metric_type, "params": params}
+
+    def choose(self, num_rows):
+        """
+        Choose the index of a collection of num_rows entities.
+
+        :param num_rows: Number of entities in the collection.
+        :return: Index parameters for create_index.
+        """
+        if num_rows < self.flat_max_rows:
+            return self.build_index_params("FLAT")
+        if self.quantization is not None:
+            return self.build_index_params(self.QUANTIZED_INDEXES[self.quantization], num_rows)
+
+        candidates = (["HNSW"] if num_rows < self.hnsw_max_rows else []) + ["IVF_FLAT"]
+        for index_type in candidates:
+            if self.memory_budget_bytes is None or self.estimate_memory(index_type, num_rows) <= self.memory_budget_bytes:
+                return self.build_index_params(index_type, num_rows)
+        # The most compact index is used even when it exceeds the budget
+        return self.build_index_params("IVF_SQ8", num_rows)
+
+    @staticmethod
+    def normalize(index_params):
+        """
+        Flatten index parameters as reported by Milvus, either nested under "params" or flat and as strings.
+        """
+        normalized = dict(index_params)
+        normalized.update(normalized.pop("params", None) or {})
+        return normalized
+
+    def is_compatible(self, existing_params, index_params):
+        """
+        Check whether an existing index can serve in place of index_params: an index further up the
+        ladder, or of the same type with at least as many IVF clusters, is kept.
+
+        :param existing_params: Parameters of the existing index, as reported by Milvus.
+        :param index_params: Parameters of the wanted index.
+        """
+        existing = self.normalize(existing_params)
+        if existing.get("metric_type") != index_params["metric_type"]:
+            return False
+
+        existing_type = existing.get("index_type")
+        wanted_type = index_params["index_type"]
+        if existing_type not in self.INDEX_LADDER:
+            return False
+        if existing_type != wanted_type:
+            return self.INDEX_LADDER.index(existing_type) > self.INDEX_LADDER.index(wanted_type)
+        nlist = index_params["params"].get("nlist")
+        return nlist is None or int(existing.get("nlist", 0)) >= nlist
+
+    def search_params(self, index_params, top_k=5, nprobe=None, ef=None):
+        """
+        Build the search parameters matching an index.
+
+        :param index_params: Parameters of the searched index, as reported by Milvus or from choose().
+        :param top_k: Number of results of the search.
+        :param nprobe: Optional number of IVF clusters to probe instead of the policy's.
+        :param ef: Optional HNSW candidate list size instead of the policy's.
+        :return: Search parameters for Collection.search.
+        """
+        index = self.normalize(index_params)
+        index_type = index.get("index_type")
+        params = {}
+        if index_type in self.IVF_INDEXES:
+            nlist = int(index.get("nlist", self.nlist_tiers[0][1]))
+            if nprobe is None:
+                nprobe = max(self.min_nprobe, math.ceil(nlist * self.nprobe_ratio))
+            params["nprobe"] = min(nlist, nprobe)
+        elif index_type == "HNSW":
+            params["ef"] = max(top_k, ef if ef is not None else self.min_ef)
+        return {"metric_type": index.get("metric_type", self.metric_type), "params": params}
@@ -0,0 +1,431 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class IngestionQueue:
+    """
+    Durable queue of PDF ingestion jobs in a local SQLite database, with uploaded files spooled to disk.
+
+    Jobs are idempotent per tenant, filename and content hash: submitting the same file again
+    returns the existing job instead of queueing a new one. Workers claim jobs with a lease, which
+    they renew while the jobs run; a job whose worker died is claimed again once its lease expires,
+    and failed jobs are retried with exponential backoff until max_attempts is reached. Each claim
+    gets a lease token, and only the holder of the current lease can record progress or an outcome.
+    The jobs of one filename run one at a time, so two versions of a file are never checked and
+    inserted concurrently. The database may be
+    shared by several worker processes on the same host.
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_REJECTED = "rejected"
+    STATUS_FAILED = "failed"
+    FINISHED_STATUSES = (STATUS_SUCCEEDED, STATUS_REJECTED, STATUS_FAILED)
+    # Uploads add a new file; updates replace the chunks of a stored file that changed
+    OPERATION_UPLOAD = "upload"
+    OPERATION_UPDATE = "update"
+
+    def __init__(self, path="ingestion_jobs.sqlite3", spool_dir="ingestion_spool", max_attempts=3,
+                 retry_delay=5.0, lease_seconds=600):
+        """
+        :param path: Path of the SQLite database.
+        :param spool_dir: Directory where uploaded files wait to be processed.
+        :param max_attempts: Number of times a job is tried before it is marked as failed.
+        :param retry_delay: Seconds before the first retry of a failed job, doubled after every attempt.
+        :param lease_seconds: Seconds after which a running job whose lease was not renewed is handed to another worker.
+        """
+        self.path = path
+        self.spool_dir = spool_dir
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease_seconds = lease_seconds
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                tenant_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                chunks INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                error TEXT,
+                available_at REAL NOT NULL,
+                lease_expires_at REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                batch_id TEXT,
+                operation TEXT NOT NULL DEFAULT 'upload',
+                lease_token TEXT
+            )
+        """)
+        columns = {row["name"] for row in self._connection.execute("PRAGMA table_info(jobs)")}
+        if "batch_id" not in columns:
+            # Databases created before bulk uploads
+            self._connection.execute("ALTER TABLE jobs ADD COLUMN batch_id TEXT")
+        if "operation" not in columns:
+            # Databases created before document updates
+            self._connection.execute("ALTER TABLE jobs ADD COLUMN operation TEXT NOT NULL DEFAULT 'upload'")
+        if "lease_token" not in columns:
+            # Databases created before lease tokens
+            self._connection.execute("ALTER TABLE jobs ADD COLUMN lease_token TEXT")
+        self._connection.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS jobs_idempotency_key ON jobs (tenant_id, filename, content_hash)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id)")
+
+    def _execute_in_transaction(self, operation):
+        """Run operation(connection) in a write transaction, serialized across threads and processes."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = operation(self._connection)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return result
+
+    @staticmethod
+    def _to_dict(row):
+        return dict(row) if row is not None else None
+
+    def spool(self, fileobj, chunk_size=1024 * 1024):
+        """
+        Copy an uploaded file to the spool directory, hashing it on the way.
+
+        :param fileobj: Binary file object positioned at the start of the upload.
+        :param chunk_size: Bytes copied at a time.
+        :return: Tuple of (spooled file path, SHA-256 hex digest of the content).
+        """
+        digest = hashlib.sha256()
+        path = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}.pdf")
+        with open(path, "wb") as spooled:
+            while True:
+                chunk = fileobj.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                spooled.write(chunk)
+        return path, digest.hexdigest()
+
+    @staticmethod
+    def hash_content(fileobj, chunk_size=1024 * 1024):
+        """
+        Hash an uploaded file without keeping a copy, the same way spool() does.
+
+        :param fileobj: Binary file object positioned at the start of the upload.
+        :param chunk_size: Bytes read at a time.
+        :return: SHA-256 hex digest of the content.
+        """
+        digest = hashlib.sha256()
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def find(self, tenant_id, filename, content_hash):
+        """
+        Return the job of a previous submission of the same file, if any.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param filename: Name the chunks are stored under.
+        :param content_hash: Hash of the file content.
+        :return: Job dict, or None.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM jobs WHERE tenant_id = ? AND filename = ? AND content_hash = ?",
+                (tenant_id, filename, content_hash)
+            ).fetchone()
+        return self._to_dict(row)
+
+    def submit(self, tenant_id, filename, content_hash, file_path, batch_id=None, operation=OPERATION_UPLOAD):
+        """
+        Queue the ingestion of a spooled file, unless the same file is already queued, running or done.
+        An update is queued again when the same content was processed before, since the stored file
+        has changed since then (callers do not submit updates with the content already stored).
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param filename: Name the chunks are stored under.
+        :param content_hash: Hash of the file content.
+        :param file_path: Path of the spooled file; it is deleted when the file was already submitted.
+        :param batch_id: Optional id grouping the files of one bulk upload.
+        :param operation: OPERATION_UPLOAD or OPERATION_UPDATE.
+        :return: Tuple of (job dict, True if a new job was queued).
+        """
+        now = time.time()
+
+        def submit_job(connection):
+            existing = connection.execute(
+                "SELECT * FROM jobs WHERE tenant_id = ? AND filename = ? AND content_hash = ?",
+                (tenant_id, filename, content_hash)
+            ).fetchone()
+            if existing is None:
+                job_id = uuid.uuid4().hex
+                connection.execute(
+                    "INSERT INTO jobs (id, tenant_id, filename, content_hash, file_path, status, stage, "
+                    "available_at, created_at, updated_at, batch_id, operation) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, tenant_id, filename, content_hash, file_path, self.STATUS_QUEUED, self.STATUS_QUEUED,
+                     now, now, now, batch_id, operation)
+                )
+            elif existing["status"] == self.STATUS_FAILED or (
+                    operation == self.OPERATION_UPDATE and existing["status"] in self.FINISHED_STATUSES):
+                # Give a failed upload a fresh set of attempts with the new copy of the file
+                job_id = existing["id"]
+                connection.execute(
+                    "UPDATE jobs SET file_path = ?, status = ?, stage = ?, chunks = 0, attempts = 0, message = NULL, "
+                    "error = NULL, available_at = ?, lease_expires_at = NULL, lease_token = NULL, updated_at = ?, batch_id = ?, "
+                    "operation = ? WHERE id = ?",
+                    (file_path, self.STATUS_QUEUED, self.STATUS_QUEUED, now, now, batch_id, operation, job_id)
+                )
+            else:
+                return self._to_dict(existing), False
+            return self._to_dict(connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()), True
+
+        job, created = self._execute_in_transaction(submit_job)
+        if not created:
+            self._remove_file(file_path)
+        return job, created
+
+    def claim(self, max_jobs=1):
+        """
+        Take the oldest job that is ready to run, together with up to max_jobs - 1 other ready jobs of
+        the same tenant so they can be ingested in one pass, and lease them to the caller. Jobs of a
+        filename that is being processed, by this claim or an unexpired lease, are left for later.
+
+        :param max_jobs: Maximum number of jobs claimed at once.
+        :return: List of job dicts, empty when no job is ready. The jobs share a "lease_token" that
+                 the caller passes to renew_lease and to the methods recording their progress and outcome.
+        """
+        now = time.time()
+        lease_token = uuid.uuid4().hex
+        ready = ("((status = ? AND available_at <= ?) OR (status = ? AND lease_expires_at < ?)) AND NOT EXISTS ("
+                 "SELECT 1 FROM jobs AS other WHERE other.tenant_id = jobs.tenant_id AND other.filename = jobs.filename "
+                 "AND other.id != jobs.id AND other.status = ? AND other.lease_expires_at >= ?)")
+        ready_params = (self.STATUS_QUEUED, now, self.STATUS_RUNNING, now, self.STATUS_RUNNING, now)
+
+        def operation(connection):
+            first = connection.execute(
+                f"SELECT tenant_id FROM jobs WHERE {ready} ORDER BY available_at LIMIT 1", ready_params
+            ).fetchone()
+            if first is None:
+                return []
+            rows = connection.execute(
+                f"SELECT * FROM jobs WHERE {ready} AND tenant_id = ? ORDER BY available_at LIMIT ?",
+                (*ready_params, first["tenant_id"], max_jobs)
+            ).fetchall()
+
+            claimed = []
+            for row in rows:
+                if any(job["filename"] == row["filename"] for job in claimed):
+                    continue
+                if row["attempts"] >= self.max_attempts:
+                    # The worker running the last attempt died
+                    connection.execute(
+                        "UPDATE jobs SET status = ?, stage = ?, error = ?, lease_expires_at = NULL, lease_token = NULL, updated_at = ? "
+                        "WHERE id = ?",
+                        (self.STATUS_FAILED, self.STATUS_FAILED, "Worker stopped while processing the job.", now, row["id"])
+                    )
+                    self._remove_file(row["file_path"])
+                    continue
+                connection.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_expires_at = ?, lease_token = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (self.STATUS_RUNNING, now + self.lease_seconds, lease_token, now, row["id"])
+                )
+                claimed.append(self._to_dict(connection.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()))
+            return claimed
+
+        return self._execute_in_transaction(operation)
+
+    def renew_lease(self, lease_token):
+        """
+        Extend the lease of the running jobs of a claim, e.g. from a heartbeat while a long stage runs.
+
+        :param lease_token: Lease token of the claim.
+        :return: Number of jobs whose lease was renewed; jobs claimed by another worker since are not.
+        """
+        now = time.time()
+        return self._execute_in_transaction(lambda connection: connection.execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE lease_token = ? AND status = ?",
+            (now + self.lease_seconds, lease_token, self.STATUS_RUNNING)
+        ).rowcount)
+
+    def update_progress(self, job_id, lease_token, stage, chunks=None):
+        """
+        Record the progress of a running job and extend its lease.
+
+        :param job_id: The job id.
+        :param lease_token: Lease token of the claim that took the job.
+        :param stage: Name of the current stage (parsing, embedding, inserting, ...).
+        :param chunks: Number of chunks processed so far.
+        :return: True if the caller still holds the lease of the job.
+        """
+        now = time.time()
+        return self._execute_in_transaction(lambda connection: connection.execute(
+            "UPDATE jobs SET stage = ?, chunks = COALESCE(?, chunks), lease_expires_at = ?, updated_at = ? "
+            "WHERE id = ? AND lease_token = ? AND status = ?",
+            (stage, chunks, now + self.lease_seconds, now, job_id, lease_token, self.STATUS_RUNNING)
+        ).rowcount > 0)
+
+    def complete(self, job_id, lease_token, message, status=STATUS_SUCCEEDED):
+        """
+        Mark a job as finished and delete its spooled file.
+
+        :param job_id: The job id.
+        :param lease_token: Lease token of the claim that took the job.
+        :param message: Outcome shown to the client.
+        :param status: "succeeded", or "rejected" when the file was not ingested on purpose.
+        :return: True if the outcome was recorded, False if the lease was lost to another worker.
+        """
+        return self._finish(job_id, lease_token, status, message=message)
+
+    def fail(self, job_id, lease_token, error):
+        """
+        Record a failed attempt; the job is queued again with backoff until max_attempts is reached.
+
+        :param job_id: The job id.
+        :param lease_token: Lease token of the claim that took the job.
+        :param error: Description of the failure.
+        :return: True if the failure was recorded, False if the lease was lost to another worker.
+        """
+        now = time.time()
+
+        def operation(connection):
+            row = connection.execute("SELECT attempts FROM jobs WHERE id = ? AND lease_token = ? AND status = ?",
+                                     (job_id, lease_token, self.STATUS_RUNNING)).fetchone()
+            if row is None:
+                return None
+            if row["attempts"] >= self.max_attempts:
+                return False
+            delay = self.retry_delay * 2 ** (row["attempts"] - 1)
+            connection.execute(
+                "UPDATE jobs SET status = ?, stage = ?, error = ?, available_at = ?, lease_expires_at = NULL, "
+                "lease_token = NULL, updated_at = ? WHERE id = ?",
+                (self.STATUS_QUEUED, self.STATUS_QUEUED, error, now + delay, now, job_id)
+            )
+            return True
+
+        requeued = self._execute_in_transaction(operation)
+        if requeued is None:
+            return False
+        if not requeued:
+            return self._finish(job_id, lease_token, self.STATUS_FAILED, error=error)
+        return True
+
+    def release(self, job_id, lease_token):
+        """
+        Hand a running job back to the queue without counting the attempt, e.g. when its worker is stopped.
+
+        :param job_id: The job id.
+        :param lease_token: Lease token of the claim that took the job.
+        """
+        now = time.time()
+        self._execute_in_transaction(lambda connection: connection.execute(
+            "UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), available_at = ?, lease_expires_at = NULL, "
+            "lease_token = NULL, updated_at = ? WHERE id = ? AND lease_token = ? AND status = ?",
+            (self.STATUS_QUEUED, now, now, job_id, lease_token, self.STATUS_RUNNING)
+        ))
+
+    def _finish(self, job_id, lease_token, status, message=None, error=None):
+        now = time.time()
+
+        def operation(connection):
+            row = connection.execute("SELECT file_path FROM jobs WHERE id = ? AND lease_token = ? AND status = ?",
+                                     (job_id, lease_token, self.STATUS_RUNNING)).fetchone()
+            if row is None:
+                # The lease expired and another worker took the job (and needs its spooled file)
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, stage = ?, message = ?, error = ?, lease_expires_at = NULL, lease_token = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (status, status, message, error, now, job_id)
+            )
+            return row["file_path"]
+
+        file_path = self._execute_in_transaction(operation)
+        if file_path is None:
+            logging.warning(f"Outcome of ingestion job {job_id} not recorded: its lease is held by another worker.")
+            return False
+        self._remove_file(file_path)
+        return True
+
+    def get(self, job_id, tenant_id):
+        """
+        Return a job of a tenant.
+
+        :param job_id: The job id.
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :return: The job dict, or None if the tenant has no such job.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM jobs WHERE id = ? AND tenant_id = ?", (job_id, tenant_id)
+            ).fetchone()
+        return self._to_dict(row)
+
+    def list_jobs(self, tenant_id, limit=100, batch_id=None):
+        """
+        Return the most recent jobs of a tenant, newest first, optionally only those of one bulk upload.
+        """
+        with self._lock:
+            if batch_id is None:
+                rows = self._connection.execute(
+                    "SELECT * FROM jobs WHERE tenant_id = ? ORDER BY created_at DESC LIMIT ?", (tenant_id, limit)
+                ).fetchall()
+            else:
+                rows = self._connection.execute(
+                    "SELECT * FROM jobs WHERE tenant_id = ? AND batch_id = ? ORDER BY created_at DESC LIMIT ?",
+                    (tenant_id, batch_id, limit)
+                ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def forget(self, tenant_id, filename):
+        """
+        Drop the finished jobs of a file, e.g. after it was deleted, so that it can be uploaded again.
+        """
+        self._execute_in_transaction(lambda connection: connection.execute(
+            f"DELETE FROM jobs WHERE tenant_id = ? AND filename = ? AND status IN ({','.join('?' * len(self.FINISHED_STATUSES))})",
+            (tenant_id, filename, *self.FINISHED_STATUSES)
+        ))
+
+    @staticmethod
+    def public_view(job):
+        """Return the fields of a job that are shown to clients."""
+        return {key: job[key] for key in ("id", "batch_id", "operation", "filename", "status", "stage", "chunks", "attempts",
+                                          "message", "error", "created_at", "updated_at")}
+
+    @staticmethod
+    def _remove_file(path):
+        if not path:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"Failed to remove spooled file {path}: {e}")
+
+    def close(self):
+        """Close the SQLite connection."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,361 @@
+import fcntl
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from .text_cleaning import clean_text
+
+# Chunks are stored cleaned (lowercased, punctuation padded with spaces), so words are runs of \w
+_TOKEN_PATTERN = re.compile(r"\w+")
+_TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_STATE_FILE = "segments.json"
+
+
+def _hash_terms(terms):
+    """
+    Map terms to stable 64-bit ids, so that the vocabulary of a segment is a sorted integer array
+    that can be binary searched in place.
+    """
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little") for term in terms],
+        dtype=np.uint64
+    )
+
+
+def _write_segment(path, ids, filenames, texts):
+    """
+    Write an immutable segment: the postings of every term sorted by term id, and the id, file,
+    length and text of every chunk. All arrays are stored as .npy files so they can be memory-mapped.
+
+    :return: Dict describing the segment (chunk count, total token count, filenames).
+    """
+    file_names = list(dict.fromkeys(filenames))
+    file_ids = {filename: position for position, filename in enumerate(file_names)}
+
+    vocabulary = {}
+    posting_terms, posting_docs, posting_tfs = [], [], []
+    doc_lengths = np.zeros(len(texts), dtype=np.uint32)
+    for doc, text in enumerate(texts):
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        doc_lengths[doc] = len(tokens)
+        for term, tf in Counter(tokens).items():
+            posting_terms.append(vocabulary.setdefault(term, len(vocabulary)))
+            posting_docs.append(doc)
+            posting_tfs.append(min(tf, np.iinfo(np.uint16).max))
+
+    posting_hashes = _hash_terms(list(vocabulary))[np.array(posting_terms, dtype=np.int64)]
+    posting_docs = np.array(posting_docs, dtype=np.uint32)
+    order = np.lexsort((posting_docs, posting_hashes))
+    posting_hashes = posting_hashes[order]
+    term_hashes, term_starts = np.unique(posting_hashes, return_index=True)
+
+    encoded_texts = [text.encode("utf-8") for text in texts]
+    text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(encoded) for encoded in encoded_texts], out=text_offsets[1:])
+
+    os.makedirs(path)
+    np.save(os.path.join(path, "term_hashes.npy"), term_hashes)
+    np.save(os.path.join(path, "term_starts.npy"), np.append(term_starts, len(posting_hashes)).astype(np.int64))
+    np.save(os.path.join(path, "posting_docs.npy"), posting_docs[order])
+    np.save(os.path.join(path, "posting_tfs.npy"), np.array(posting_tfs, dtype=np.uint16)[order])
+    np.save(os.path.join(path, "doc_ids.npy"), np.array(ids, dtype=np.int64))
+    np.save(os.path.join(path, "doc_files.npy"), np.array([file_ids[filename] for filename in filenames], dtype=np.uint32))
+    np.save(os.path.join(path, "doc_lengths.npy"), doc_lengths)
+    np.save(os.path.join(path, "text_offsets.npy"), text_offsets)
+    with open(os.path.join(path, "texts.bin"), "wb") as texts_file:
+        texts_file.write(b"".join(encoded_texts))
+
+    return {"num_docs": len(texts), "total_length": int(doc_lengths.sum()), "filenames": file_names}
+
+
+class _Segment:
+    """Read-only, memory-mapped view of a segment written by _write_segment."""
+
+    def __init__(self, path, info):
+        self.num_docs = info["num_docs"]
+        self.total_length = info["total_length"]
+        self.filenames = info["filenames"]
+        self.file_ids = {filename: position for position, filename in enumerate(self.filenames)}
+        self.deleted_file_ids = np.array([self.file_ids[filename] for filename in info["deleted_files"]], dtype=np.uint32)
+
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        self.term_hashes = load("term_hashes.npy")
+        self.term_starts = load("term_starts.npy")
+        self.posting_docs = load("posting_docs.npy")
+        self.posting_tfs = load("posting_tfs.npy")
+        self.doc_ids = load("doc_ids.npy")
+        self.doc_files = load("doc_files.npy")
+        self.doc_lengths = load("doc_lengths.npy")
+        self.text_offsets = load("text_offsets.npy")
+        texts_path = os.path.join(path, "texts.bin")
+        self.texts = np.memmap(texts_path, dtype=np.uint8, mode="r") if os.path.getsize(texts_path) else np.empty(0, np.uint8)
+
+    def postings(self, term_hash):
+        """Return the (chunks, term frequencies) of a term, or None if no chunk contains it."""
+        position = int(np.searchsorted(self.term_hashes, term_hash))
+        if position == len(self.term_hashes) or self.term_hashes[position] != term_hash:
+            return None
+        start, end = self.term_starts[position], self.term_starts[position + 1]
+        return self.posting_docs[start:end], self.posting_tfs[start:end]
+
+    def text(self, doc):
+        return bytes(self.texts[self.text_offsets[doc]:self.text_offsets[doc + 1]]).decode("utf-8")
+
+    def live_docs(self):
+        """Positions of the chunks whose file was not deleted."""
+        return np.flatnonzero(~np.isin(self.doc_files, self.deleted_file_ids))
+
+
+class LexicalIndex:
+    """
+    Per-tenant BM25 index over the chunk texts, for lexical and hybrid retrieval of the exact tokens
+    (part numbers, error codes) embeddings handle badly.
+
+    Each tenant directory holds immutable segments, one per ingested batch, whose postings, chunk
+    metadata and texts are memory-mapped: only the pages a query touches are read, so the index
+    does not have to fit in memory. Deleting a file marks it deleted in the existing segments;
+    segments are merged (dropping deleted chunks) when a tenant has more than max_segments. The
+    list of segments is replaced atomically and re-read by other processes when it changes.
+    """
+
+    def __init__(self, directory="lexical_index", k1=1.2, b=0.75, max_segments=16, max_open_tenants=256):
+        """
+        :param directory: Directory holding one sub-directory per tenant.
+        :param k1: BM25 term frequency saturation.
+        :param b: BM25 document length normalization.
+        :param max_segments: Number of segments of a tenant above which the smallest are merged.
+        :param max_open_tenants: Number of tenants whose segments are kept open (least recently used are closed).
+        """
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self.max_open_tenants = max_open_tenants
+        os.makedirs(directory, exist_ok=True)
+
+        # tenant_id -> (identity of the segments file, [_Segment])
+        self._open_tenants = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_locks = {}
+
+    def _tenant_dir(self, tenant_id):
+        if not _TENANT_ID_PATTERN.match(tenant_id):
+            raise Exception(f"Invalid tenant id: {tenant_id!r}")
+        return os.path.join(self.directory, tenant_id)
+
+    @contextmanager
+    def _write_lock(self, tenant_id):
+        """Serialize the writers of a tenant across threads and processes."""
+        tenant_dir = self._tenant_dir(tenant_id)
+        with self._lock:
+            thread_lock = self._write_locks.setdefault(tenant_id, threading.Lock())
+        with thread_lock:
+            os.makedirs(tenant_dir, exist_ok=True)
+            with open(os.path.join(tenant_dir, ".lock"), "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield tenant_dir
+
+    @staticmethod
+    def _read_state(tenant_dir):
+        try:
+            with open(os.path.join(tenant_dir, _STATE_FILE)) as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return {"next_segment": 0, "segments": []}
+
+    @staticmethod
+    def _write_state(tenant_dir, state, unused_segments=()):
+        """Replace the segment list atomically, then remove the segments it no longer references."""
+        temporary_path = os.path.join(tenant_dir, f".{_STATE_FILE}.{uuid.uuid4().hex}")
+        with open(temporary_path, "w") as state_file:
+            json.dump(state, state_file)
+        os.replace(temporary_path, os.path.join(tenant_dir, _STATE_FILE))
+        for name in unused_segments:
+            shutil.rmtree(os.path.join(tenant_dir, name), ignore_errors=True)
+
+    @staticmethod
+    def _new_segment(tenant_dir, state, ids, filenames, texts):
+        """Write a segment under a fresh name and return its entry for the segment list."""
+        name = f"segment_{state['next_segment']:08d}"
+        state["next_segment"] += 1
+        # Written under a temporary name so that a crash never leaves a partial segment behind a valid name
+        temporary_path = os.path.join(tenant_dir, f".{name}.{uuid.uuid4().hex}")
+        info = _write_segment(temporary_path, ids, filenames, texts)
+        os.rename(temporary_path, os.path.join(tenant_dir, name))
+        return {"name": name, "deleted_files": [], **info}
+
+    def _merge_smallest(self, tenant_dir, state):
+        """
+        Merge the smallest segments into one, dropping the chunks of deleted files.
+
+        :return: Names of the segments that were merged.
+        """
+        segments = sorted(state["segments"], key=lambda entry: entry["num_docs"])
+        merged = segments[:len(segments) - self.max_segments // 2 + 1]
+        ids, filenames, texts = [], [], []
+        for entry in merged:
+            segment = _Segment(os.path.join(tenant_dir, entry["name"]), entry)
+            for doc in segment.live_docs():
+                ids.append(int(segment.doc_ids[doc]))
+                filenames.append(segment.filenames[segment.doc_files[doc]])
+                texts.append(segment.text(doc))
+
+        merged_names = [entry["name"] for entry in merged]
+        state["segments"] = [entry for entry in state["segments"] if entry["name"] not in merged_names]
+        if texts:
+            state["segments"].append(self._new_segment(tenant_dir, state, ids, filenames, texts))
+        return merged_names
+
+    def add_documents(self, tenant_id, ids, filenames, texts):
+        """
+        Index inserted chunks as a new segment.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param ids: Primary keys of the chunks in the vector store.
+        :param filenames: Filename of each chunk.
+        :param texts: Cleaned text of each chunk.
+        """
+        if not texts:
+            return
+        with self._write_lock(tenant_id) as tenant_dir:
+            state = self._read_state(tenant_dir)
+            state["segments"].append(self._new_segment(tenant_dir, state, ids, filenames, texts))
+            unused_segments = self._merge_smallest(tenant_dir, state) if len(state["segments"]) > self.max_segments else []
+            self._write_state(tenant_dir, state, unused_segments)
+
+    def delete_file(self, tenant_id, filename):
+        """
+        Remove the chunks of a file from the index.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param filename: The filename whose chunks are removed.
+        """
+        with self._write_lock(tenant_id) as tenant_dir:
+            state = self._read_state(tenant_dir)
+            unused_segments = []
+            for entry in state["segments"]:
+                if filename in entry["filenames"] and filename not in entry["deleted_files"]:
+                    entry["deleted_files"].append(filename)
+                    if len(entry["deleted_files"]) == len(entry["filenames"]):
+                        unused_segments.append(entry["name"])
+            state["segments"] = [entry for entry in state["segments"] if entry["name"] not in unused_segments]
+            self._write_state(tenant_dir, state, unused_segments)
+
+    def drop_tenant(self, tenant_id):
+        """Remove the whole index of a tenant."""
+        with self._write_lock(tenant_id) as tenant_dir:
+            with self._lock:
+                self._open_tenants.pop(tenant_id, None)
+            self._write_state(tenant_dir, {"next_segment": 0, "segments": []},
+                              [entry["name"] for entry in self._read_state(tenant_dir)["segments"]])
+
+    def _get_segments(self, tenant_id):
+        """Return the open segments of a tenant, reopening them when the segment list changed."""
+        tenant_dir = self._tenant_dir(tenant_id)
+        try:
+            stat = os.stat(os.path.join(tenant_dir, _STATE_FILE))
+        except FileNotFoundError:
+            return []
+        # The segment list is replaced, never modified in place, so a new inode means a new list
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._open_tenants.get(tenant_id)
+            if cached is not None and cached[0] == identity:
+                self._open_tenants.move_to_end(tenant_id)
+                return cached[1]
+
+        state = self._read_state(tenant_dir)
+        segments = [_Segment(os.path.join(tenant_dir, entry["name"]), entry) for entry in state["segments"]]
+        with self._lock:
+            self._open_tenants[tenant_id] = (identity, segments)
+            self._open_tenants.move_to_end(tenant_id)
+            while len(self._open_tenants) > self.max_open_tenants:
+                self._open_tenants.popitem(last=False)
+        return segments
+
+    def search(self, tenant_id, query, top_k=5, filenames=None):
+        """
+        Rank the chunks of a tenant against a query with BM25.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param query: The query text; it is cleaned like the chunks were.
+        :param top_k: Number of results to return.
+        :param filenames: Optional collection of filenames the search is restricted to.
+        :return: List of dicts with id, score, text and filename, best first.
+        """
+        terms = list(dict.fromkeys(_TOKEN_PATTERN.findall(clean_text(query))))
+        try:
+            segments = self._get_segments(tenant_id)
+        except FileNotFoundError:
+            # A merge removed a segment between reading the list and opening it
+            segments = self._get_segments(tenant_id)
+        num_docs = sum(segment.num_docs for segment in segments)
+        if not terms or not num_docs:
+            return []
+
+        term_hashes = _hash_terms(terms)
+        postings = [[segment.postings(term_hash) for term_hash in term_hashes] for segment in segments]
+        # Document frequencies and lengths over all segments; chunks of deleted files still count until merged
+        document_frequencies = [
+            sum(len(segment_postings[term][0]) for segment_postings in postings if segment_postings[term] is not None)
+            for term in range(len(terms))
+        ]
+        idf = [math.log(1 + (num_docs - df + 0.5) / (df + 0.5)) for df in document_frequencies]
+        average_length = sum(segment.total_length for segment in segments) / num_docs
+
+        candidates = []
+        for segment, segment_postings in zip(segments, postings):
+            docs_parts, score_parts = [], []
+            for term, term_postings in enumerate(segment_postings):
+                if term_postings is None:
+                    continue
+                docs = np.asarray(term_postings[0])
+                tfs = np.asarray(term_postings[1], dtype=np.float32)
+                lengths = np.asarray(segment.doc_lengths[docs], dtype=np.float32)
+                norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+                docs_parts.append(docs)
+                score_parts.append(idf[term] * tfs * (self.k1 + 1) / (tfs + norm))
+            if not docs_parts:
+                continue
+
+            # Sum the contributions of the query terms per chunk, touching only the matching chunks
+            docs, inverse = np.unique(np.concatenate(docs_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+            doc_files = np.asarray(segment.doc_files[docs])
+            keep = ~np.isin(doc_files, segment.deleted_file_ids)
+            if filenames is not None:
+                allowed = [segment.file_ids[filename] for filename in filenames if filename in segment.file_ids]
+                keep &= np.isin(doc_files, np.array(allowed, dtype=np.uint32))
+            docs, scores = docs[keep], scores[keep]
+            if len(docs) > top_k:
+                best = np.argpartition(-scores, top_k)[:top_k]
+                docs, scores = docs[best], scores[best]
+            candidates.extend((float(score), segment, int(doc)) for score, doc in zip(scores, docs))
+
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return [
+            {
+                "id": int(segment.doc_ids[doc]),
+                "score": score,
+                "text": segment.text(doc),
+                "filename": segment.filenames[segment.doc_files[doc]]
+            }
+            for score, segment, doc in candidates[:top_k]
+        ]
+
+    def close(self):
+        """Close the memory-mapped segments."""
+        with self._lock:
+            self._open_tenants.clear()
@@ -0,0 +1,198 @@
+import bisect
+import contextvars
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Endpoint, tenant and trace id of the request being served, set by the HTTP middleware.
+# asyncio tasks, asyncio.to_thread and AsyncMilvusManager carry it into the code they run.
+_request_context = contextvars.ContextVar("request_context", default=None)
+
+
+class Metrics:
+    """
+    In-process registry of latency histograms and counters, exported in the Prometheus text format.
+
+    Work done for a request is timed with span(stage) and labelled with the endpoint (and, when
+    enabled, the tenant) of the request being served. The registry lives in the process memory, so
+    with several workers each one exports its own series.
+    """
+
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    # Label value of work done outside any request (startup, shutdown, background flushes)
+    NO_ENDPOINT = "none"
+    # Label value of the tenants beyond max_tenant_labels
+    OTHER_TENANTS = "other"
+    _TRACEPARENT_PATTERN = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+    def __init__(self, namespace="rag", buckets=DEFAULT_BUCKETS, tenant_labels=False, max_tenant_labels=100):
+        """
+        :param namespace: Prefix of the exported metric names.
+        :param buckets: Upper bounds (seconds) of the histogram buckets.
+        :param tenant_labels: Whether to label stage timings by tenant.
+        :param max_tenant_labels: Number of distinct tenants labelled before the rest share the "other" label.
+        """
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self.tenant_labels = tenant_labels
+        self.max_tenant_labels = max_tenant_labels
+        self._labelled_tenants = set()
+        self._lock = threading.Lock()
+        # name -> {"type": ..., "help": ..., "labels": (...), "series": {label values: value}}
+        self._metrics = {}
+
+        stage_labels = ("stage", "endpoint", "tenant") if tenant_labels else ("stage", "endpoint")
+        self._define("stage_duration_seconds", "histogram", "Duration of processing stages.", stage_labels)
+        self._define("stage_errors_total", "counter", "Processing stages that raised an exception.", stage_labels)
+        self._define("http_request_duration_seconds", "histogram",
+                     "Duration of HTTP requests until the response headers are sent.", ("endpoint", "method", "status"))
+
+    def _define(self, name, metric_type, help_text, label_names):
+        self._metrics[f"{self.namespace}_{name}"] = {"type": metric_type, "help": help_text,
+                                                      "labels": label_names, "series": {}}
+
+    def observe(self, name, value, labels):
+        """
+        Add an observation to a histogram.
+
+        :param name: Histogram name without the namespace.
+        :param value: Observed value.
+        :param labels: Tuple of label values, in the order the histogram was defined with.
+        """
+        metric = self._metrics[f"{self.namespace}_{name}"]
+        with self._lock:
+            series = metric["series"].get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum and count
+                series = metric["series"][labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def inc(self, name, labels, amount=1):
+        """
+        Increment a counter.
+
+        :param name: Counter name without the namespace.
+        :param labels: Tuple of label values, in the order the counter was defined with.
+        :param amount: Increment.
+        """
+        metric = self._metrics[f"{self.namespace}_{name}"]
+        with self._lock:
+            metric["series"][labels] = metric["series"].get(labels, 0) + amount
+
+    @classmethod
+    def parse_trace_id(cls, traceparent=None, request_id=None):
+        """
+        Take the trace id of an incoming request from a W3C traceparent or an X-Request-ID header,
+        or start a new trace.
+        """
+        match = cls._TRACEPARENT_PATTERN.match(traceparent or "")
+        if match:
+            return match.group(1)
+        if request_id and len(request_id) <= 128:
+            return request_id
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def set_request_context(endpoint, tenant_id=None, trace_id=None):
+        """
+        Attribute the work done in the current context to a request.
+
+        :return: Token for reset_request_context().
+        """
+        return _request_context.set({"endpoint": endpoint, "tenant_id": tenant_id, "trace_id": trace_id})
+
+    @staticmethod
+    def reset_request_context(token):
+        _request_context.reset(token)
+
+    @staticmethod
+    def get_trace_id():
+        """Return the trace id of the request being served, if any."""
+        context = _request_context.get()
+        return context["trace_id"] if context else None
+
+    def _stage_labels(self, stage):
+        """Build the label values of a stage timing from the current request context."""
+        context = _request_context.get() or {}
+        endpoint = context.get("endpoint") or self.NO_ENDPOINT
+        if not self.tenant_labels:
+            return stage, endpoint
+
+        tenant_id = context.get("tenant_id") or ""
+        if tenant_id and tenant_id not in self._labelled_tenants:
+            with self._lock:
+                if len(self._labelled_tenants) < self.max_tenant_labels:
+                    self._labelled_tenants.add(tenant_id)
+                else:
+                    tenant_id = self.OTHER_TENANTS
+        return stage, endpoint, tenant_id
+
+    def observe_stage(self, stage, seconds):
+        """Record the duration of a stage measured by the caller."""
+        self.observe("stage_duration_seconds", seconds, self._stage_labels(stage))
+
+    @contextmanager
+    def span(self, stage):
+        """
+        Time the enclosed block as a stage; exceptions are counted and re-raised (cancellations are not counted).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("stage_errors_total", self._stage_labels(stage))
+            raise
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def observe_request(self, endpoint, method, status_code, seconds):
+        """Record the duration and outcome of an HTTP request."""
+        self.observe("http_request_duration_seconds", seconds, (endpoint, method, str(status_code)))
+
+    @staticmethod
+    def _format_labels(label_names, label_values, extra=()):
+        pairs = list(zip(label_names, label_values)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        """
+        Export all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, metric in self._metrics.items():
+                lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for label_values, value in sorted(metric["series"].items()):
+                    if metric["type"] == "counter":
+                        lines.append(f"{name}{self._format_labels(metric['labels'], label_values)} {value}")
+                        continue
+
+                    bucket_counts, total, count = value
+                    cumulative = 0
+                    for upper_bound, bucket_count in zip(self.buckets + ("+Inf",), bucket_counts):
+                        cumulative += bucket_count
+                        labels = self._format_labels(metric["labels"], label_values, [("le", upper_bound)])
+                        lines.append(f"{name}_bucket{labels} {cumulative}")
+                    labels = self._format_labels(metric["labels"], label_values)
+                    lines.append(f"{name}_sum{labels} {total}")
+                    lines.append(f"{name}_count{labels} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class TraceIdLogFilter(logging.Filter):
+    """
+    Logging filter adding the trace id of the request being served to every record (as trace_id).
+    """
+
+    def filter(self, record):
+        record.trace_id = Metrics.get_trace_id() or "-"
+        return True
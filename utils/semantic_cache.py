@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Per-tenant cache of answered queries, matched by cosine similarity of the query embeddings.
+
+    Each tenant has a generation counter that is bumped whenever its file set changes; entries
+    computed against an older generation are dropped, and answers computed while an upload or
+    delete was in progress are never stored. The cache lives in the process memory, so changes made
+    by other workers are seen through the revision of the tenant in the shared file manifest: the
+    answers cached at another revision are dropped on lookup. Without a revision (tenants the
+    manifest does not track), other workers only see a tenant's changes once its entries expire (ttl).
+    """
+
+    def __init__(self, similarity_threshold=0.95, max_entries_per_tenant=500, max_tenants=1000, ttl=3600):
+        """
+        :param similarity_threshold: Minimum cosine similarity for a cached query to match.
+        :param max_entries_per_tenant: Maximum number of cached answers per tenant.
+        :param max_tenants: Maximum number of tenants with cached answers (least recently used are dropped).
+        :param ttl: Seconds after which a cached answer expires.
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_entries_per_tenant = max_entries_per_tenant
+        self.max_tenants = max_tenants
+        self.ttl = ttl
+        # tenant_id -> {"vectors": ndarray (n, dim), "entries": [(scope, created_at, value)], "revision": int or None}
+        self._tenants = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get_generation(self, tenant_id):
+        """
+        Return the current generation of a tenant; pass it to store() to detect concurrent changes.
+        """
+        with self._lock:
+            return self._generations.get(tenant_id, 0)
+
+    def invalidate(self, tenant_id):
+        """
+        Drop every cached answer of a tenant, e.g. after its files changed.
+        """
+        with self._lock:
+            self._generations[tenant_id] = self._generations.get(tenant_id, 0) + 1
+            self._tenants.pop(tenant_id, None)
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, tenant_id, query_embedding, scope=None, revision=None):
+        """
+        Find the cached answer of the most similar previous query with the same scope.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param query_embedding: Embedding of the new query.
+        :param scope: Hashable description of the search options (top_k, file filter, ...).
+        :param revision: Current file manifest revision of the tenant, or None if the manifest does not track it.
+        :return: The cached value, or None.
+        """
+        query_vector = self._normalize(query_embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is not None and revision is not None and tenant["revision"] != revision:
+                # The files changed since, possibly through another worker
+                del self._tenants[tenant_id]
+                tenant = None
+            if tenant is None:
+                self._stats["misses"] += 1
+                return None
+            self._tenants.move_to_end(tenant_id)
+
+            similarities = tenant["vectors"] @ query_vector
+            for index in np.argsort(-similarities):
+                if similarities[index] < self.similarity_threshold:
+                    break
+                entry_scope, created_at, value = tenant["entries"][index]
+                if entry_scope == scope and now - created_at <= self.ttl:
+                    self._stats["hits"] += 1
+                    return value
+
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, tenant_id, query_embedding, value, scope=None, generation=None, revision=None):
+        """
+        Cache the answer of a query.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param query_embedding: Embedding of the query.
+        :param value: The answer to cache.
+        :param scope: Hashable description of the search options (top_k, file filter, ...).
+        :param generation: Tenant generation observed before the answer was computed; the answer is
+                           discarded if the tenant's files changed in the meantime.
+        :param revision: File manifest revision of the tenant read before the answer was computed, or None.
+        """
+        query_vector = self._normalize(query_embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            if generation is not None and generation != self._generations.get(tenant_id, 0):
+                return
+
+            tenant = self._tenants.get(tenant_id)
+            if tenant is not None and tenant["revision"] != revision:
+                if revision is not None and tenant["revision"] is not None and revision < tenant["revision"]:
+                    # Computed before a change of the files that newer entries already reflect
+                    return
+                tenant = None
+            if tenant is None:
+                tenant = {"vectors": np.empty((0, query_vector.shape[0]), dtype=np.float32), "entries": [], "revision": revision}
+                self._tenants[tenant_id] = tenant
+            self._tenants.move_to_end(tenant_id)
+
+            # Drop expired entries and keep room for the new one, oldest first
+            keep = [i for i, (_, created_at, _) in enumerate(tenant["entries"]) if now - created_at <= self.ttl]
+            keep = keep[len(keep) - self.max_entries_per_tenant + 1:] if len(keep) >= self.max_entries_per_tenant else keep
+            tenant["entries"] = [tenant["entries"][i] for i in keep] + [(scope, now, value)]
+            tenant["vectors"] = np.vstack([tenant["vectors"][keep], query_vector[np.newaxis, :]])
+
+            while len(self._tenants) > self.max_tenants:
+                self._tenants.popitem(last=False)
+
+    def stats(self):
+        """
+        Return hit/miss counters and the number of cached answers.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = sum(len(tenant["entries"]) for tenant in self._tenants.values())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
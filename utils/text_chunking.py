@@ -0,0 +1,113 @@
+import threading
+
+
+class TextChunker:
+    """
+    Reusable token-bounded text splitter. Produces exactly the chunks of
+    RecursiveCharacterTextSplitter.from_tiktoken_encoder with the same settings, but builds the
+    encoder once and memoizes token counts: the splitter measures every piece of a text several
+    times (when choosing pieces, merging them and dropping the overlap), and only the first
+    measurement now reaches tiktoken. The pieces of a text are counted up front in one batch.
+    """
+
+    DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+    def __init__(self, chunk_size=300, chunk_overlap=30, encoding_name="gpt2", max_cached_counts=100_000,
+                 batch_threads=4, min_batch_for_threads=256):
+        """
+        :param chunk_size: Maximum chunk size in tokens.
+        :param chunk_overlap: Overlap between consecutive chunks in tokens.
+        :param encoding_name: tiktoken encoding used to count tokens.
+        :param max_cached_counts: Number of memoized token counts kept before the memo is reset.
+        :param batch_threads: Threads used by tiktoken for large batches.
+        :param min_batch_for_threads: Batches with fewer new texts are counted in the calling thread.
+        """
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.encoding_name = encoding_name
+        self.max_cached_counts = max_cached_counts
+        self.batch_threads = batch_threads
+        self.min_batch_for_threads = min_batch_for_threads
+
+        import tiktoken
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        self._encoding = tiktoken.get_encoding(encoding_name)
+        self._token_counts = {}
+        self._lock = threading.Lock()
+        self._splitter = RecursiveCharacterTextSplitter(
+            separators=self.DEFAULT_SEPARATORS, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+            length_function=self.count_tokens
+        )
+
+    def _encode(self, text):
+        # Same arguments as from_tiktoken_encoder, so special tokens are rejected the same way
+        return self._encoding.encode(text, allowed_special=set(), disallowed_special="all")
+
+    def _remember(self, counts):
+        with self._lock:
+            if len(self._token_counts) + len(counts) > self.max_cached_counts:
+                self._token_counts.clear()
+            self._token_counts.update(counts)
+
+    def count_tokens(self, text):
+        """
+        Count the tokens of a text.
+
+        :param text: The text.
+        :return: Number of tokens.
+        """
+        count = self._token_counts.get(text)
+        if count is None:
+            count = len(self._encode(text))
+            self._remember({text: count})
+        return count
+
+    def count_tokens_batch(self, texts):
+        """
+        Count the tokens of many texts, encoding each distinct new text once.
+
+        :param texts: List of texts.
+        :return: List of token counts, in the order of texts.
+        """
+        new_texts = [text for text in dict.fromkeys(texts) if text not in self._token_counts]
+        if len(new_texts) >= self.min_batch_for_threads:
+            encoded = self._encoding.encode_batch(new_texts, num_threads=self.batch_threads,
+                                                  allowed_special=set(), disallowed_special="all")
+        else:
+            encoded = [self._encode(text) for text in new_texts]
+        counts = {text: len(tokens) for text, tokens in zip(new_texts, encoded)}
+        self._remember(counts)
+
+        return [counts[text] if text in counts else self.count_tokens(text) for text in texts]
+
+    def _first_level_pieces(self, text):
+        """
+        Return the pieces the splitter starts from: the text split on the first separator it
+        contains, each separator kept at the start of the following piece.
+        """
+        for separator in self.DEFAULT_SEPARATORS[:-1]:
+            if separator in text:
+                parts = text.split(separator)
+                return [piece for piece in [parts[0]] + [separator + part for part in parts[1:]] if piece]
+        return [text]
+
+    def split_text(self, text):
+        """
+        Split a text into token-bounded chunks.
+
+        :param text: The text.
+        :return: List of chunks.
+        """
+        self.count_tokens_batch(self._first_level_pieces(text))
+        return self._splitter.split_text(text)
+
+    def split_documents(self, documents):
+        """
+        Split documents into token-bounded chunks, keeping their metadata.
+
+        :param documents: List of Document.
+        :return: List of Document chunks.
+        """
+        self.count_tokens_batch([piece for document in documents for piece in self._first_level_pieces(document.page_content)])
+        return self._splitter.split_documents(documents)
@@ -0,0 +1,84 @@
+import string
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# Built once at import. Produces the same output as the historical chain of
+# str.replace / str.translate / four re.sub passes in DocumentGenerator.clean_data:
+# - typographic and plain apostrophes are dropped, non-breaking spaces become spaces;
+# - brackets are dropped (their surrounding spaces are collapsed below);
+# - any other punctuation character is padded with spaces.
+_CLEAN_TABLE = str.maketrans({
+    **{key: " {0} ".format(key) for key in string.punctuation},
+    **{key: "  " for key in "()[]{}"},
+    "’": "",
+    "'": "",
+    "\xa0": " ",
+})
+# One pass that splits glued words before a capitalised word ("fooBar" -> "foo Bar") and collapses
+# runs of spaces. Both replacements are a single space, and an inserted space is always preceded by
+# a word character, so it can never create a new run of spaces. The leading lookahead lets the
+# engine skip most positions with a single character test.
+_SPACING_PATTERN = re.compile(r"(?=[A-Z ])(?: {2,}|(?<=\w)(?=[A-Z][a-z]))")
+
+
+def clean_text(text):
+    """
+    Clean a single text: drop apostrophes and brackets, pad punctuation with spaces, split glued
+    words before capitals, collapse spaces and lowercase.
+    """
+    return _SPACING_PATTERN.sub(" ", text.translate(_CLEAN_TABLE)).lower()
+
+
+def _clean_texts(texts):
+    """Clean a list of texts. Defined at module level so it can run in worker processes."""
+    return [clean_text(text) for text in texts]
+
+
+class TextCleaner:
+    """
+    Batch front-end for clean_text. Small batches are cleaned in the calling process; large ones are
+    split into chunks that are cleaned in a pool of worker processes.
+    """
+
+    def __init__(self, max_workers=None, min_texts_for_workers=64, texts_per_task=32):
+        """
+        :param max_workers: Number of worker processes (None lets the executor decide, 0 never uses workers).
+        :param min_texts_for_workers: Batches with fewer texts are cleaned in the calling process.
+        :param texts_per_task: Number of texts sent to a worker at a time.
+        """
+        self.max_workers = max_workers
+        self.min_texts_for_workers = min_texts_for_workers
+        self.texts_per_task = texts_per_task
+        self._executor = None
+
+    @staticmethod
+    def clean(text):
+        """
+        Clean a single text.
+
+        :param text: The raw text.
+        :return: The cleaned text.
+        """
+        return clean_text(text)
+
+    def clean_batch(self, texts):
+        """
+        Clean many texts in one call.
+
+        :param texts: List of raw texts.
+        :return: List of cleaned texts, in the order of texts.
+        """
+        texts = list(texts)
+        if self.max_workers == 0 or len(texts) < self.min_texts_for_workers:
+            return _clean_texts(texts)
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        chunks = [texts[start:start + self.texts_per_task] for start in range(0, len(texts), self.texts_per_task)]
+        return [cleaned for chunk in self._executor.map(_clean_texts, chunks) for cleaned in chunk]
+
+    def close(self):
+        """Shut down the worker processes, if any were started."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
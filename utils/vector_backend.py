@@ -0,0 +1,124 @@
+from abc import ABC, abstractmethod
+
+
+class VectorBackend(ABC):
+    """
+    Interface of the per-tenant vector stores the API runs on: MilvusManager (a Milvus server) and
+    EmbeddedVectorStore (in-process, for single-node and test deployments). A backend must implement the
+    abstract methods, and may override the others. All methods are blocking; the API calls them through
+    AsyncMilvusManager.
+
+    Search results are dicts with "id", "distance" (squared L2), "text" and "filename". Filter
+    expressions use the Milvus syntax; backends other than Milvus support `filename in [...]`.
+    """
+
+    @abstractmethod
+    def create_tenant_collection(self, tenant_id, fields):
+        """
+        Create the storage of a tenant.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param fields: List of FieldSchema objects defining the schema.
+        :return: The tenant id.
+        """
+
+    @abstractmethod
+    def drop_tenant_collection(self, tenant_id):
+        """Drop the storage of a tenant and all its chunks."""
+
+    @abstractmethod
+    def list_collections(self):
+        """List the collections (one per tenant, or shared) of the backend."""
+
+    @abstractmethod
+    def get_file_hash(self, tenant_id, filename):
+        """
+        Look up a stored file.
+
+        :return: Tuple of (file exists, content hash or None).
+        """
+
+    def filename_exists(self, tenant_id, filename):
+        """Check whether a file is stored for the tenant."""
+        return self.get_file_hash(tenant_id, filename)[0]
+
+    def existing_filenames(self, tenant_id, filenames):
+        """Return the subset of filenames stored for the tenant."""
+        return {filename for filename in filenames if self.filename_exists(tenant_id, filename)}
+
+    @abstractmethod
+    def insert_data(self, tenant_id, data, flush=False, content_hashes=None, file_sizes=None):
+        """
+        Insert chunks.
+
+        :param tenant_id: Unique identifier for the tenant (UUID).
+        :param data: Columns of the chunks: vectors, filenames, texts, then optionally chunk hashes, page numbers and positions.
+        :param flush: Make the chunks durable before returning.
+        :param content_hashes: Optional dict of filename -> content hash of the inserted files.
+        :param file_sizes: Optional dict of filename -> size in bytes of the inserted files.
+        :return: Primary keys of the inserted chunks, in the order of the data.
+        """
+
+    @abstractmethod
+    def has_chunk_fields(self, tenant_id):
+        """Check whether the tenant's chunks store their hash, page number and position."""
+
+    @abstractmethod
+    def get_file_chunks(self, tenant_id, filename, output_fields=("id", "chunk_hash", "page_number", "chunk_index", "text")):
+        """Read the stored chunks of a file, as a list of row dicts with the output fields."""
+
+    @abstractmethod
+    def get_vectors(self, tenant_id, ids):
+        """Read the stored vectors of chunks, as a dict of primary key -> vector."""
+
+    @abstractmethod
+    def delete_chunks(self, tenant_id, filename, ids, content_hash=None):
+        """
+        Delete some chunks of a file and record its new content hash.
+
+        :return: Number of deleted chunks.
+        """
+
+    @abstractmethod
+    def delete_file_by_filename(self, tenant_id, filename):
+        """
+        Delete all the chunks of a file.
+
+        :return: Message telling how many chunks were deleted.
+        """
+
+    @abstractmethod
+    def search_batch(self, tenant_id, query_vectors, top_k=5, search_params=None, filter_expr=None):
+        """
+        Search many query vectors in one request.
+
+        :return: One list of results per query vector, in the order of query_vectors.
+        """
+
+    def search(self, tenant_id, query_vectors, top_k=5, search_params=None):
+        """Search the query vectors, returning the results of all the queries in one list."""
+        return [hit for hits in self.search_batch(tenant_id, query_vectors, top_k, search_params) for hit in hits]
+
+    def search_with_filter(self, tenant_id, query_vectors, top_k=5, search_params=None, filter_expr=None):
+        """Search the query vectors with an optional filter expression, returning the results in one list."""
+        return [hit for hits in self.search_batch(tenant_id, query_vectors, top_k, search_params, filter_expr) for hit in hits]
+
+    @abstractmethod
+    def list_file_details(self, tenant_id):
+        """List the files of a tenant with their chunk count, size, upload time and content hash, sorted by filename."""
+
+    def list_files(self, tenant_id, limit=1000):
+        """List the unique files of a tenant."""
+        return [file["filename"] for file in self.list_file_details(tenant_id)[:limit]]
+
+    def check_health(self):
+        """Check that the backend can serve requests, raising an exception if it cannot."""
+
+    def flush(self, tenant_id):
+        """Make the tenant's inserted chunks durable."""
+
+    def flush_pending(self):
+        """Flush the inserts of all tenants, e.g. before the worker exits."""
+
+    def close(self):
+        """Release the resources of the backend."""
@@ -0,0 +1,121 @@
+import base64
+import zlib
+
+import numpy as np
+
+
+class VectorStorage:
+    """
+    How chunk vectors and texts are stored in Milvus, to shrink the memory of loaded collections.
+
+    Vectors are stored as float32 or float16 (half the memory, with a negligible effect on recall),
+    optionally reduced to their first dim dimensions and renormalized. Truncation is how reduced
+    OpenAI text-embedding-3 embeddings are computed; for other models, measure the recall with
+    tools/compact_storage_recall.py first. Texts can be stored zlib-compressed.
+
+    The settings apply to new collections. Vectors are adapted to the schema of the collection they
+    are written to or searched in, so collections created with other settings keep working, and
+    compressed texts are marked so that compressed and plain texts can be mixed.
+    """
+
+    # Vector type -> name of the pymilvus DataType of the vector field
+    VECTOR_TYPES = {"float32": "FLOAT_VECTOR", "float16": "FLOAT16_VECTOR"}
+    TEXT_COMPRESSIONS = (None, "zlib")
+    # Prefix of compressed texts. It is whitespace to str.strip, so stripped chunk texts never start with it
+    COMPRESSED_TEXT_PREFIX = "\x1f"
+
+    def __init__(self, vector_type="float32", embedding_dim=1536, dim=None, text_compression=None, text_max_length=5000):
+        """
+        :param vector_type: "float32" or "float16".
+        :param embedding_dim: Dimension of the embeddings.
+        :param dim: Number of leading dimensions stored, or None to store the embeddings whole.
+        :param text_compression: None or "zlib".
+        :param text_max_length: Maximum length in bytes of the stored texts.
+        """
+        if vector_type not in self.VECTOR_TYPES:
+            raise ValueError(f"Unknown vector type: {vector_type}")
+        if text_compression not in self.TEXT_COMPRESSIONS:
+            raise ValueError(f"Unknown text compression: {text_compression}")
+        if dim is not None and not 0 < dim <= embedding_dim:
+            raise ValueError(f"Stored dimension {dim} must be between 1 and the embedding dimension {embedding_dim}")
+        self.vector_type = vector_type
+        self.embedding_dim = embedding_dim
+        self.dim = dim or embedding_dim
+        self.text_compression = text_compression
+        self.text_max_length = text_max_length
+
+    @property
+    def bytes_per_dim(self):
+        """Bytes per stored vector dimension."""
+        return 2 if self.vector_type == "float16" else 4
+
+    def vector_field(self, name="vector"):
+        """FieldSchema of the vector field of new collections."""
+        from pymilvus import DataType, FieldSchema
+        return FieldSchema(name=name, dtype=DataType[self.VECTOR_TYPES[self.vector_type]], dim=self.dim)
+
+    def text_field(self, name="text"):
+        """FieldSchema of the text field of new collections."""
+        from pymilvus import DataType, FieldSchema
+        return FieldSchema(name=name, dtype=DataType.VARCHAR, max_length=self.text_max_length)
+
+    @staticmethod
+    def get_vector_field(schema, name="vector"):
+        """Return the FieldSchema of the vector field of a collection schema."""
+        return next(field for field in schema.fields if field.name == name)
+
+    @staticmethod
+    def encode_vectors(vectors, field):
+        """
+        Adapt vectors to a vector field: truncate and renormalize vectors longer than the field,
+        and convert them to numpy float16 arrays for FLOAT16_VECTOR fields.
+
+        :param vectors: List of vectors (lists or numpy arrays).
+        :param field: FieldSchema of the vector field.
+        :return: Vectors ready to be inserted or searched.
+        """
+        from pymilvus import DataType
+        dim = field.params["dim"]
+        is_float16 = field.dtype == DataType.FLOAT16_VECTOR
+        if not vectors or (not is_float16 and all(len(vector) == dim for vector in vectors)):
+            return vectors
+
+        encoded = []
+        for vector in vectors:
+            array = np.asarray(vector if isinstance(vector, np.ndarray) else VectorStorage.decode_vector(vector), dtype=np.float32)
+            if len(array) > dim:
+                array = array[:dim]
+                norm = np.linalg.norm(array)
+                if norm > 0:
+                    array = array / norm
+            encoded.append(array.astype(np.float16) if is_float16 else array.tolist())
+        return encoded
+
+    @staticmethod
+    def decode_vector(vector):
+        """
+        Turn a vector read from Milvus into a list of floats; float16 vectors are returned as raw bytes.
+        """
+        if isinstance(vector, (list, tuple)) and vector and isinstance(vector[0], bytes):
+            vector = b"".join(vector)
+        if isinstance(vector, bytes):
+            return np.frombuffer(vector, dtype=np.float16).astype(np.float32).tolist()
+        return list(vector)
+
+    def encode_text(self, text):
+        """
+        Encode a text for the text field, compressed when compression is enabled and saves space.
+        Texts already encoded (e.g. copied from another collection) are returned unchanged.
+        """
+        if self.text_compression == "zlib" and not text.startswith(self.COMPRESSED_TEXT_PREFIX):
+            compressed = self.COMPRESSED_TEXT_PREFIX + base64.b85encode(zlib.compress(text.encode("utf-8"), 9)).decode("ascii")
+            if len(compressed) < len(text.encode("utf-8")):
+                return compressed
+        return text
+
+    @classmethod
+    def decode_text(cls, text):
+        """Decode a text read from the text field."""
+        if text and text.startswith(cls.COMPRESSED_TEXT_PREFIX):
+            return zlib.decompress(base64.b85decode(text[len(cls.COMPRESSED_TEXT_PREFIX):])).decode("utf-8")
+        return text